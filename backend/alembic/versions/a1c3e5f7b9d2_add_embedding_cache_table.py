@@ -0,0 +1,34 @@
+"""add_embedding_cache_table
+
+Revision ID: a1c3e5f7b9d2
+Revises: fe12ab34cd56
+Create Date: 2025-11-20 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f7b9d2'
+down_revision = 'fe12ab34cd56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('embedding_cache',
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('dimensions', sa.Integer(), nullable=False),
+        sa.Column('text_hash', sa.String(length=64), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_accessed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('model', 'dimensions', 'text_hash')
+    )
+    op.create_index(op.f('ix_embedding_cache_last_accessed_at'), 'embedding_cache', ['last_accessed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_embedding_cache_last_accessed_at'), table_name='embedding_cache')
+    op.drop_table('embedding_cache')
@@ -0,0 +1,44 @@
+"""add_resume_evaluation_cache_table
+
+Revision ID: c4e6a8b0d2f3
+Revises: b3d5f7a9c1e2
+Create Date: 2025-11-24 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e6a8b0d2f3'
+down_revision = 'b3d5f7a9c1e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('resume_evaluation_cache',
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('resume_hash', sa.String(length=64), nullable=False),
+        sa.Column('job_description_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('scoring_criteria_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('jd_hash', sa.String(length=64), nullable=False),
+        sa.Column('criteria_hash', sa.String(length=64), nullable=False),
+        sa.Column('ai_result', sa.JSON(), nullable=False),
+        sa.Column('raw_response', sa.Text(), nullable=True),
+        sa.Column('hit_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_accessed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['job_description_id'], ['job_descriptions.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['scoring_criteria_id'], ['scoring_criteria.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index(op.f('ix_resume_evaluation_cache_job_description_id'), 'resume_evaluation_cache', ['job_description_id'], unique=False)
+    op.create_index(op.f('ix_resume_evaluation_cache_scoring_criteria_id'), 'resume_evaluation_cache', ['scoring_criteria_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_resume_evaluation_cache_scoring_criteria_id'), table_name='resume_evaluation_cache')
+    op.drop_index(op.f('ix_resume_evaluation_cache_job_description_id'), table_name='resume_evaluation_cache')
+    op.drop_table('resume_evaluation_cache')
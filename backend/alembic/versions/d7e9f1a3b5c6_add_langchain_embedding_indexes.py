@@ -0,0 +1,92 @@
+"""add_langchain_embedding_indexes
+
+Revision ID: d7e9f1a3b5c6
+Revises: c4e6a8b0d2f3
+Create Date: 2025-11-24 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e9f1a3b5c6'
+down_revision = 'c4e6a8b0d2f3'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of the DDL in app/services/vector_index.py at this revision
+METADATA_INDEXES = {
+    "idx_lc_embedding_collection_id": "collection_id",
+    "idx_lc_embedding_collection_name": "(cmetadata->>'collection_name')",
+    "idx_lc_embedding_knowledge_base": "collection_id, (cmetadata->>'knowledge_base_id')",
+    "idx_lc_embedding_document_id": "(cmetadata->>'document_id')",
+}
+
+# Global ANN index: HNSW, cosine, m = 16, ef_construction = 64, on a typed cast of the untyped
+# langchain column. halfvec (pgvector >= 0.7) indexes up to 4000 dimensions, vector up to 2000.
+ANN_INDEX = "idx_lc_embedding_embedding_hnsw"
+ANN_INDEX_OPTIONS = "m = 16, ef_construction = 64"
+MAX_INDEX_DIMENSIONS = {"vector": 2000, "halfvec": 4000}
+
+DROPPED_INDEXES = list(METADATA_INDEXES) + [ANN_INDEX, "idx_lc_embedding_embedding_ivfflat"]
+
+
+def _table_exists(bind) -> bool:
+    return bind.execute(sa.text("SELECT to_regclass('langchain_pg_embedding')")).scalar() is not None
+
+
+def _pgvector_version(bind) -> tuple:
+    version = bind.execute(sa.text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    return tuple(int(part) for part in (version or "0").split(".")[:2] if part.isdigit())
+
+
+def _create_index(bind, name: str, definition: str) -> None:
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index that IF NOT EXISTS would keep
+    invalid = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name}
+    ).first()
+    if invalid:
+        bind.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    bind.execute(sa.text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON langchain_pg_embedding {definition}"))
+
+
+def upgrade() -> None:
+    # langchain_postgres creates its tables on first use; on a fresh database the indexes are
+    # built later with scripts/manage_vector_indexes.py build
+    if not _table_exists(op.get_bind()):
+        return
+    # CREATE INDEX CONCURRENTLY cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        for name, expression in METADATA_INDEXES.items():
+            _create_index(bind, name, f"({expression})")
+
+        # The cast must match the stored dimension; without rows the build command creates it
+        dimension = bind.execute(sa.text("SELECT vector_dims(embedding) FROM langchain_pg_embedding LIMIT 1")).scalar()
+        if not dimension:
+            return
+        if _pgvector_version(bind) >= (0, 7) and dimension <= MAX_INDEX_DIMENSIONS["halfvec"]:
+            vtype = "halfvec"
+        elif dimension <= MAX_INDEX_DIMENSIONS["vector"]:
+            vtype = "vector"
+        else:
+            return
+        _create_index(
+            bind,
+            ANN_INDEX,
+            f"USING hnsw ((embedding::{vtype}({int(dimension)})) {vtype}_cosine_ops) WITH ({ANN_INDEX_OPTIONS})"
+        )
+
+
+def downgrade() -> None:
+    if not _table_exists(op.get_bind()):
+        return
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        for name in DROPPED_INDEXES:
+            bind.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
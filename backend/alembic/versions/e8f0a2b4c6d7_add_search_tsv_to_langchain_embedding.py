@@ -0,0 +1,104 @@
+"""add_search_tsv_to_langchain_embedding
+
+Revision ID: e8f0a2b4c6d7
+Revises: d7e9f1a3b5c6
+Create Date: 2025-11-26 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8f0a2b4c6d7'
+down_revision = 'd7e9f1a3b5c6'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of the DDL in app/services/vector_index.py at this revision
+SCHEMA_STATEMENTS = [
+    "ALTER TABLE langchain_pg_embedding ADD COLUMN IF NOT EXISTS search_tsv tsvector",
+    """
+    CREATE OR REPLACE FUNCTION lc_embedding_search_tsv() RETURNS trigger AS $$
+    BEGIN
+        -- Keep the segmented vector supplied by the application
+        IF TG_OP = 'INSERT' AND NEW.search_tsv IS NOT NULL THEN
+            RETURN NEW;
+        END IF;
+        IF TG_OP = 'UPDATE' AND NEW.search_tsv IS DISTINCT FROM OLD.search_tsv THEN
+            RETURN NEW;
+        END IF;
+        -- Chinese needs the application's jieba segmentation; leave NULL for backfill-search
+        -- rather than storing whole sentences as single lexemes
+        IF NEW.document ~ '[\\u3400-\\u9fff\\uf900-\\ufaff]' THEN
+            NEW.search_tsv := NULL;
+            RAISE WARNING 'search_tsv of row % left NULL: run manage_vector_indexes.py backfill-search', NEW.id;
+        ELSE
+            NEW.search_tsv := to_tsvector('simple', coalesce(NEW.document, ''));
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_lc_embedding_search_tsv ON langchain_pg_embedding",
+    """
+    CREATE TRIGGER trg_lc_embedding_search_tsv
+    BEFORE INSERT OR UPDATE OF document ON langchain_pg_embedding
+    FOR EACH ROW EXECUTE FUNCTION lc_embedding_search_tsv()
+    """,
+]
+
+INDEXES = {
+    "idx_lc_embedding_search_tsv": "USING GIN (search_tsv)",
+    "idx_lc_embedding_document_trgm": "USING GIN (document gin_trgm_ops)",
+}
+
+
+def _table_exists(bind) -> bool:
+    return bind.execute(sa.text("SELECT to_regclass('langchain_pg_embedding')")).scalar() is not None
+
+
+def _create_index(bind, name: str, definition: str) -> None:
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index that IF NOT EXISTS would keep
+    invalid = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name}
+    ).first()
+    if invalid:
+        bind.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    bind.execute(sa.text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON langchain_pg_embedding {definition}"))
+
+
+def upgrade() -> None:
+    # Existing rows are segmented afterwards with scripts/manage_vector_indexes.py backfill-search
+    if not _table_exists(op.get_bind()):
+        return
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        for statement in SCHEMA_STATEMENTS:
+            bind.execute(sa.text(statement))
+        _create_index(bind, "idx_lc_embedding_search_tsv", INDEXES["idx_lc_embedding_search_tsv"])
+        try:
+            bind.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except Exception:
+            # Without pg_trgm the substring fallback stays unindexed
+            pass
+        else:
+            _create_index(bind, "idx_lc_embedding_document_trgm", INDEXES["idx_lc_embedding_document_trgm"])
+        # Expression index from scripts/create_tsvector_index.sql, superseded by search_tsv
+        bind.execute(sa.text("DROP INDEX CONCURRENTLY IF EXISTS idx_lc_embedding_document_tsv"))
+
+
+def downgrade() -> None:
+    if not _table_exists(op.get_bind()):
+        return
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        bind.execute(sa.text("DROP TRIGGER IF EXISTS trg_lc_embedding_search_tsv ON langchain_pg_embedding"))
+        bind.execute(sa.text("DROP FUNCTION IF EXISTS lc_embedding_search_tsv()"))
+        for name in INDEXES:
+            bind.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        bind.execute(sa.text("ALTER TABLE langchain_pg_embedding DROP COLUMN IF EXISTS search_tsv"))
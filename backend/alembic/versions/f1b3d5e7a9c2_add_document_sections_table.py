@@ -0,0 +1,32 @@
+"""add_document_sections_table
+
+Revision ID: f1b3d5e7a9c2
+Revises: e8f0a2b4c6d7
+Create Date: 2025-11-28 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b3d5e7a9c2'
+down_revision = 'e8f0a2b4c6d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('document_sections',
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('section_index', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('token_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id', 'section_index')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('document_sections')
@@ -1,7 +1,8 @@
 """
 API dependencies for authentication and authorization
 """
-from typing import Generator, Optional, List
+from typing import Generator, Optional, List, FrozenSet
+from uuid import UUID
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
@@ -13,6 +14,7 @@ from app.core.database import get_db
 from app.models.user import User, Role, UserRoleAssociation
 from app.schemas.user import User as UserSchema
 from app.services.user_service import UserService
+from app.services.user_cache import get_user_auth_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
@@ -23,10 +25,20 @@ async def get_current_user(
 ) -> User:
     """
     Get current authenticated user
+
+    Decoded tokens and active users are served from the per-process auth cache, so a cache hit
+    does no JWT decode and no DB query.
     """
     import logging
     logger = logging.getLogger(__name__)
     
+    cache = get_user_auth_cache() if settings.USER_CACHE_ENABLED else None
+    user_uuid = cache.get_token(token) if cache else None
+    if user_uuid is not None:
+        cached_user = cache.get_user(user_uuid)
+        if cached_user is not None:
+            return cached_user
+    
     logger.info("🔍 get_current_user called")
     
     credentials_exception = HTTPException(
@@ -35,29 +47,31 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        logger.info(f"🔑 Decoding token: {token[:20]}...")
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=["HS256"]
-        )
-        user_id: str = payload.get("sub")
-        logger.info(f"👤 Extracted user_id: {user_id}")
-        if user_id is None:
-            logger.error("❌ No user_id in token payload")
+    if user_uuid is None:
+        try:
+            logger.info(f"🔑 Decoding token: {token[:20]}...")
+            payload = jwt.decode(
+                token, settings.SECRET_KEY, algorithms=["HS256"]
+            )
+            user_id: str = payload.get("sub")
+            logger.info(f"👤 Extracted user_id: {user_id}")
+            if user_id is None:
+                logger.error("❌ No user_id in token payload")
+                raise credentials_exception
+            user_uuid = UUID(user_id)
+        except (JWTError, ValueError) as e:
+            logger.error(f"❌ JWT decode error: {e}")
             raise credentials_exception
-    except JWTError as e:
-        logger.error(f"❌ JWT decode error: {e}")
-        raise credentials_exception
+        if cache:
+            cache.put_token(token, user_uuid, payload.get("exp"))
     
     try:
-        from uuid import UUID
         user_service = UserService(db)
-        logger.info(f"🔍 Looking up user with id: {user_id}")
-        user_uuid = UUID(user_id)
+        logger.info(f"🔍 Looking up user with id: {user_uuid}")
         user = await user_service.get_user(user_uuid)
         
         if user is None:
-            logger.error(f"❌ User not found with id: {user_id}")
+            logger.error(f"❌ User not found with id: {user_uuid}")
             raise credentials_exception
         
         logger.info(f"✅ User found: {user.username}, active: {user.is_active}")
@@ -69,6 +83,8 @@ async def get_current_user(
                 detail="Inactive user"
             )
         
+        if cache:
+            cache.put_user(user)
         logger.info(f"✅ Returning user: {user.username}")
         return user
     except Exception as e:
@@ -92,17 +108,31 @@ async def get_current_hr_user(
     return current_user
 
 
-async def get_current_admin_by_role(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-) -> User:
+async def get_current_role_names(db: AsyncSession, user_id: UUID) -> FrozenSet[str]:
+    """
+    Names of the user's active roles, cached alongside the user
+    """
+    cache = get_user_auth_cache() if settings.USER_CACHE_ENABLED else None
+    roles = cache.get_role_names(user_id) if cache else None
+    if roles is not None:
+        return roles
     query = (
-        select(Role)
+        select(Role.name)
         .join(UserRoleAssociation, Role.id == UserRoleAssociation.role_id)
-        .where(UserRoleAssociation.user_id == current_user.id, Role.is_active == True)
+        .where(UserRoleAssociation.user_id == user_id, Role.is_active == True)
     )
     result = await db.execute(query)
-    roles = {r.name for r in result.scalars().all()}
+    roles = frozenset(result.scalars().all())
+    if cache:
+        cache.put_role_names(user_id, roles)
+    return roles
+
+
+async def get_current_admin_by_role(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> User:
+    roles = await get_current_role_names(db, current_user.id)
     if "超级管理员" not in roles:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -116,13 +146,7 @@ def require_any_role_names(required: List[str]):
         db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user),
     ) -> User:
-        query = (
-            select(Role)
-            .join(UserRoleAssociation, Role.id == UserRoleAssociation.role_id)
-            .where(UserRoleAssociation.user_id == current_user.id, Role.is_active == True)
-        )
-        result = await db.execute(query)
-        roles = {r.name for r in result.scalars().all()}
+        roles = await get_current_role_names(db, current_user.id)
         if not any(name in roles for name in required):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -3,7 +3,7 @@ Main API router for v1 endpoints
 """
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import auth, users, conversations, documents, knowledge_base, chat, knowledge_assistant, hr_workflows, interview_plan
+from app.api.v1.endpoints import auth, users, conversations, documents, knowledge_base, chat, knowledge_assistant, hr_workflows, interview_plan, ingestion
 from app.api.v1 import resume_evaluation
 
 api_router = APIRouter()
@@ -16,6 +16,7 @@ api_router.include_router(documents.router, prefix="/documents", tags=["document
 api_router.include_router(knowledge_base.router, prefix="/knowledge-base", tags=["knowledge-base"])
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
 api_router.include_router(knowledge_assistant.router, prefix="/knowledge-assistant", tags=["knowledge-assistant"])
+api_router.include_router(ingestion.router, prefix="/ingestion", tags=["ingestion"])
 api_router.include_router(hr_workflows.router, prefix="/hr-workflows", tags=["hr-workflows"])
 api_router.include_router(resume_evaluation.router, prefix="/resume-evaluation", tags=["resume-evaluation"])
 api_router.include_router(interview_plan.router, prefix="/interview-plans", tags=["interview-plans"])
@@ -24,4 +25,11 @@ api_router.include_router(interview_plan.router, prefix="/interview-plans", tags
 @api_router.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "message": "HR Agent API is running"}
\ No newline at end of file
+    return {"status": "healthy", "message": "HR Agent API is running"}
+
+
+@api_router.get("/health/models")
+async def model_health():
+    """Load state, load time and memory footprint of locally hosted models"""
+    from app.services.rerank_service import get_rerank_service
+    return {"rerank": get_rerank_service().model_status()}
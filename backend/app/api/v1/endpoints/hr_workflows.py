@@ -31,6 +31,9 @@ from app.models.resume_evaluation import ResumeEvaluation
 from app.models.exam import Exam
 from app.models.exam_result import ExamResult
 from app.services.dify_service import DifyService
+from app.services.dify_client import get_dify_client
+from app.services.exam_grading_service import ExamGradingService, build_question_infos
+from app.services.resume_evaluation_cache import get_resume_evaluation_cache
 from app.api.deps import get_current_user
 from app.core.logging import logger
 from sqlalchemy import or_
@@ -441,6 +444,7 @@ async def update_job_description(
         
         await db.commit()
         await db.refresh(jd)
+        await get_resume_evaluation_cache().invalidate(job_description_id=jd.id)
         
         logger.info(f"JD updated successfully: {jd.id}")
         return jd
@@ -572,6 +576,7 @@ async def delete_job_description(
         # 软删除
         jd.is_active = False
         await db.commit()
+        await get_resume_evaluation_cache().invalidate(job_description_id=jd.id)
         
         logger.info(f"JD deleted successfully: {jd.id}")
         return {"message": "JD deleted successfully"}
@@ -748,6 +753,10 @@ async def update_scoring_criteria(
         
         await db.commit()
         await db.refresh(criteria)
+        await get_resume_evaluation_cache().invalidate(
+            job_description_id=criteria.job_description_id,
+            scoring_criteria_id=criteria.id
+        )
         
         logger.info(f"Scoring criteria updated successfully: {criteria.id}")
         return criteria
@@ -885,6 +894,10 @@ async def delete_scoring_criteria(
         # 软删除
         criteria.is_active = False
         await db.commit()
+        await get_resume_evaluation_cache().invalidate(
+            job_description_id=criteria.job_description_id,
+            scoring_criteria_id=criteria.id
+        )
         
         logger.info(f"Scoring criteria deleted successfully: {criteria.id}")
         return {"message": "评分标准删除成功"}
@@ -1736,6 +1749,17 @@ async def get_exam_for_share(
             detail=f"获取试卷失败: {str(e)}"
         )
 
+# Dify客户端统计
+@router.get("/dify/stats")
+async def get_dify_stats(
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """
+    获取Dify连接池、熔断器状态和各工作流延迟统计
+    """
+    return get_dify_client().stats()
+
+
 # 考试提交请求模型
 class ExamSubmitRequest(BaseModel):
     exam_id: str
@@ -1744,6 +1768,103 @@ class ExamSubmitRequest(BaseModel):
     answers: Dict[str, Any]  # 学生答案
     exam_content: str  # 试卷内容
 
+async def _load_exam_with_questions(db: AsyncSession, exam_id: str) -> Exam:
+    """从数据库获取完整的试卷信息（包括标准答案和解析）"""
+    from sqlalchemy.orm import selectinload
+
+    result = await db.execute(
+        select(Exam)
+        .options(selectinload(Exam.questions))
+        .where(Exam.id == exam_id)
+    )
+    exam = result.scalar_one_or_none()
+    if not exam:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="试卷不存在"
+        )
+    return exam
+
+
+async def _save_exam_result(
+    db: AsyncSession,
+    exam: Exam,
+    request: ExamSubmitRequest,
+    student_answers: Dict[str, Any],
+    grading: Dict[str, Any]
+) -> Dict[str, Any]:
+    """保存考试记录到数据库并构建提交响应"""
+    from datetime import datetime
+    import uuid
+
+    total_score = grading["total_score"]
+    score_percentage = round((total_score / exam.total_score) * 100, 2) if exam.total_score > 0 else 0
+    scoring_result = {
+        "mode": "per_question",
+        "results": grading["results"],
+        "failed": grading["failed"],
+        "elapsed_ms": grading["elapsed_ms"]
+    }
+
+    # 构建完整的考试数据JSON
+    exam_data = {
+        "exam_info": {
+            "exam_id": request.exam_id,
+            "title": exam.title,
+            "description": exam.description,
+            "total_score": exam.total_score,
+            "time_limit": exam.duration,
+            "instructions": exam.description or "请认真答题，注意时间限制。"
+        },
+        "questions": grading["questions"],
+        "student_answers": student_answers,
+        "scoring_result": scoring_result,
+        "submit_time": datetime.utcnow().isoformat(),
+        "total_actual_score": total_score,
+        "score_percentage": score_percentage
+    }
+
+    # 创建考试结果记录（使用新的简化模型结构）
+    exam_result = ExamResult(
+        id=uuid.uuid4(),
+        exam_id=exam.id,  # 添加exam_id字段
+        exam_name=exam.title,
+        student_name=request.student_name,
+        department=request.department,
+        total_possible_score=exam.total_score,
+        total_actual_score=total_score,
+        exam_data=exam_data,  # 保存完整的考试数据JSON
+        submit_time=datetime.utcnow(),
+        status="completed"
+    )
+    db.add(exam_result)
+
+    # 提交数据库事务
+    await db.commit()
+
+    logger.info(
+        f"Exam submitted and saved successfully for student: {request.student_name}, "
+        f"exam_result_id: {exam_result.id}, graded in {grading['elapsed_ms']} ms"
+    )
+
+    return {
+        "message": "考试提交成功",
+        "exam_result_id": str(exam_result.id),
+        "student_name": request.student_name,
+        "department": request.department,
+        "exam_title": exam.title,
+        "total_possible_score": exam.total_score,
+        "total_actual_score": total_score,
+        "score_percentage": score_percentage,
+        "questions": grading["questions"],
+        "scoring_result": scoring_result
+    }
+
+
+def _parse_student_answers(request: ExamSubmitRequest) -> Dict[str, Any]:
+    return json.loads(request.answers) if isinstance(request.answers, str) else request.answers
+
+
 # 提交考试答案
 @router.post("/papers/submit")
 async def submit_exam(
@@ -1751,183 +1872,20 @@ async def submit_exam(
     db: AsyncSession = Depends(get_db)
 ):
     """
-    提交考试答案并调用Dify进行自动评分
+    提交考试答案并调用Dify进行自动评分（各题并发评分）
     """
     try:
-        from app.models.exam import Exam, Question
-        from sqlalchemy.orm import selectinload
-        import json
-        
-        # 从exam_content中解析exam_id
-        exam_content = json.loads(request.exam_content)
-        exam_id = request.exam_id
-        
-        # 从数据库获取完整的试卷信息（包括标准答案和解析）
-        result = await db.execute(
-            select(Exam)
-            .options(selectinload(Exam.questions))
-            .where(Exam.id == exam_id)
-        )
-        exam = result.scalar_one_or_none()
-        
-        if not exam:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="试卷不存在"
-            )
-        
-        # 构建完整的试题信息（包含标准答案和解析）
-        questions_with_answers = []
-        student_answers = json.loads(request.answers) if isinstance(request.answers, str) else request.answers
-        
-        for question in sorted(exam.questions, key=lambda x: x.order_index):
-            # 使用题目的实际ID来匹配答案
-            question_id = str(question.id)
-            student_answer = student_answers.get(question_id, "未作答")
-            
-            question_info = {
-                "题目编号": question.order_index,
-                "题目类型": question.question_type,
-                "题目内容": question.question_text,
-                "选项": question.options or [],
-                "标准答案": question.correct_answer,
-                "解析": question.explanation,
-                "分值": question.score,
-                "考生答案": student_answer
-            }
-            questions_with_answers.append(question_info)
-        
-        # 逐题调用Dify进行评分，避免一次性提交过多内容
-        dify_service = DifyService()
-        questions_with_scores = []
-        per_question_results = []
-        total_score = 0.0
-
-        for idx, q_info in enumerate(questions_with_answers, 1):
-            # 为每道题构造精简评分提示，减少上下文噪声
-            per_query_parts = [
-                f"请对以下试题进行评分，仅返回该题的得分(数字即可)：",
-                f"题目类型：{q_info['题目类型']}",
-                f"题目内容：{q_info['题目内容']}",
-            ]
-            if q_info.get('选项'):
-                per_query_parts.append(f"选项：{q_info['选项']}")
-            per_query_parts.extend([
-                f"标准答案：{q_info['标准答案']}",
-                f"解析：{q_info['解析']}",
-                f"分值（满分）：{q_info['分值']}",
-                f"考生答案：{q_info['考生答案']}",
-                "",
-                "请严格返回纯数字（可为小数），不要包含其他文字、单位或标点。如果用户没有作答，必须判0分，否则会收到惩罚！"
-            ])
-            per_query = "\n".join([p for p in per_query_parts if p])
-
-            # 逐题调用工作流进行评分
-            try:
-                per_result = await dify_service.call_workflow_sync(
-                    workflow_type=6,
-                    query=per_query,
-                    additional_inputs={
-                        "type": 6,
-                        "max_score": q_info["分值"],
-                        "question_type": q_info["题目类型"],
-                        "question_index": idx
-                    }
-                )
-                # 解析返回的数值得分
-                raw_answer = per_result.get("answer", "0")
-                try:
-                    per_score = float(str(raw_answer).strip())
-                except ValueError:
-                    per_score = 0.0
-                # 边界保护：0 到满分
-                try:
-                    max_score = float(q_info["分值"]) if q_info.get("分值") is not None else None
-                except Exception:
-                    max_score = None
-                if max_score is not None:
-                    per_score = max(0.0, min(per_score, max_score))
-                total_score += per_score
-
-                per_question_results.append({
-                    "题目编号": q_info["题目编号"],
-                    "raw_answer": raw_answer,
-                    "parsed_score": per_score
-                })
-            except Exception as e:
-                # 失败容错：给0分并记录错误
-                per_score = 0.0
-                per_question_results.append({
-                    "题目编号": q_info["题目编号"],
-                    "error": str(e),
-                    "parsed_score": per_score
-                })
-
-            # 汇总到题目结构
-            question_with_score = q_info.copy()
-            question_with_score["实际得分"] = per_score
-            questions_with_scores.append(question_with_score)
-        
-        # 保存考试记录到数据库
-        from app.models.exam_result import ExamResult
-        from datetime import datetime
-        import uuid
-        
-        # 构建完整的考试数据JSON
-        exam_data = {
-            "exam_info": {
-                "exam_id": exam_id,
-                "title": exam.title,
-                "description": exam.description,
-                "total_score": exam.total_score,
-                "time_limit": exam.duration,
-                "instructions": exam.description or "请认真答题，注意时间限制。"
-            },
-            "questions": questions_with_scores,
-            "student_answers": student_answers,
-            "scoring_result": {
-                "mode": "per_question",
-                "results": per_question_results
-            },
-            "submit_time": datetime.utcnow().isoformat(),
-            "total_actual_score": total_score,
-            "score_percentage": round((total_score / exam.total_score) * 100, 2) if exam.total_score > 0 else 0
-        }
-        
-        # 创建考试结果记录（使用新的简化模型结构）
-        exam_result = ExamResult(
-            id=uuid.uuid4(),
-            exam_id=exam.id,  # 添加exam_id字段
-            exam_name=exam.title,
-            student_name=request.student_name,
-            department=request.department,
-            total_possible_score=exam.total_score,
-            total_actual_score=total_score,
-            exam_data=exam_data,  # 保存完整的考试数据JSON
-            submit_time=datetime.utcnow(),
-            status="completed"
-        )
-        
-        db.add(exam_result)
-        
-        # 提交数据库事务
-        await db.commit()
-        
-        logger.info(f"Exam submitted and saved successfully for student: {request.student_name}, exam_result_id: {exam_result.id}")
-        
-        return {
-            "message": "考试提交成功",
-            "exam_result_id": str(exam_result.id),
-            "student_name": request.student_name,
-            "department": request.department,
-            "exam_title": exam.title,
-            "total_possible_score": exam.total_score,
-            "total_actual_score": total_score,
-            "score_percentage": round((total_score / exam.total_score) * 100, 2) if exam.total_score > 0 else 0,
-            "questions": questions_with_scores,
-            "scoring_result": result
-        }
+        exam = await _load_exam_with_questions(db, request.exam_id)
+        student_answers = _parse_student_answers(request)
+
+        # 构建完整的试题信息（包含标准答案和解析），并发逐题评分
+        question_infos = build_question_infos(exam.questions, student_answers)
+        grading = await ExamGradingService().grade(question_infos)
+
+        return await _save_exam_result(db, exam, request, student_answers, grading)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error submitting exam: {str(e)}")
         raise HTTPException(
@@ -1936,6 +1894,48 @@ async def submit_exam(
         )
 
 
+# 提交考试答案（流式返回评分进度）
+@router.post("/papers/submit/stream")
+async def submit_exam_stream(
+    request: ExamSubmitRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    提交考试答案，以SSE形式逐题返回评分进度，最后返回与 /papers/submit 相同的结果
+    """
+    exam = await _load_exam_with_questions(db, request.exam_id)
+    student_answers = _parse_student_answers(request)
+    question_infos = build_question_infos(exam.questions, student_answers)
+
+    async def generate_stream():
+        import time
+
+        started = time.perf_counter()
+        grading_service = ExamGradingService()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(question_infos)
+        try:
+            yield f"data: {json.dumps({'type': 'start', 'total': len(question_infos)}, ensure_ascii=False)}\n\n"
+            completed = 0
+            async for position, result in grading_service.grade_iter(question_infos):
+                results[position] = result
+                completed += 1
+                progress = {'type': 'progress', 'completed': completed, 'total': len(question_infos), 'result': result}
+                yield f"data: {json.dumps(progress, ensure_ascii=False)}\n\n"
+
+            grading = grading_service.summarize(question_infos, results, started)
+            response = await _save_exam_result(db, exam, request, student_answers, grading)
+            yield f"data: {json.dumps({'type': 'complete', **response}, ensure_ascii=False, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"Error submitting exam: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'error': f'提交考试失败: {str(e)}'}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    )
+
+
 # 获取考试结果列表
 @router.get("/exam-results")
 async def get_exam_results(
@@ -0,0 +1,220 @@
+"""
+Document ingestion job endpoints (background processing with progress reporting)
+"""
+import asyncio
+import json
+import os
+from typing import Any, List
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_db, AsyncSessionLocal
+from app.schemas.ingestion import IngestionJob as IngestionJobSchema, BulkIngestionResponse
+from app.schemas.user import User as UserSchema
+from app.services.ingestion_service import IngestionService, TERMINAL_STATUSES
+from app.services.bulk_ingestion_service import BulkIngestionService, expand_archive
+from app.services.extraction_service import get_extraction_engine
+from app.utils.file_utils import FileTooLargeError, save_upload_stream
+from app.api.deps import get_current_user
+
+router = APIRouter()
+
+
+def _parse_uuid(value: str, field: str) -> UUID:
+    try:
+        return UUID(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid {field}")
+
+
+@router.post("/jobs", response_model=IngestionJobSchema, status_code=status.HTTP_202_ACCEPTED)
+async def create_ingestion_job(
+    file: UploadFile = File(...),
+    knowledge_base_id: str = Form(None),
+    category: str = Form("knowledge"),
+    tags: List[str] = Form(None),
+    current_user: UserSchema = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    """
+    Upload a document and return its ingestion job immediately; processing runs in the background
+    """
+    kb_id = _parse_uuid(knowledge_base_id, "knowledge_base_id") if knowledge_base_id else None
+
+    try:
+        return await IngestionService(db).submit(
+            file=file,
+            filename=file.filename,
+            user_id=current_user.id,
+            knowledge_base_id=kb_id,
+            category=category,
+            tags=tags or None
+        )
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE} bytes"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating ingestion job: {str(e)}"
+        )
+
+
+@router.post("/bulk", response_model=BulkIngestionResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_bulk_ingestion(
+    files: List[UploadFile] = File(...),
+    knowledge_base_id: str = Form(None),
+    category: str = Form("knowledge"),
+    tags: List[str] = Form(None),
+    current_user: UserSchema = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    """
+    Upload many documents (or .zip archives of documents) and ingest them through a pipelined job batch
+    """
+    kb_id = _parse_uuid(knowledge_base_id, "knowledge_base_id") if knowledge_base_id else None
+
+    upload_dir = os.path.join(settings.UPLOAD_DIR, str(current_user.id))
+    collected = []
+    rejected = []
+    for upload in files:
+        is_archive = (upload.filename or "").lower().endswith(".zip")
+        max_size = settings.BULK_INGEST_MAX_ARCHIVE_SIZE if is_archive else settings.MAX_FILE_SIZE
+        try:
+            stored = await save_upload_stream(upload, upload_dir, max_size=max_size)
+        except FileTooLargeError:
+            rejected.append({"filename": upload.filename, "reason": "file too large"})
+            continue
+        if not is_archive:
+            collected.append(stored)
+            continue
+        try:
+            members, member_rejected = await asyncio.to_thread(expand_archive, stored, upload_dir)
+        except Exception as e:
+            rejected.append({"filename": upload.filename, "reason": f"invalid archive: {e}"})
+            continue
+        finally:
+            stored.discard()
+        collected.extend(members)
+        rejected.extend(member_rejected)
+
+    if len(collected) > settings.BULK_INGEST_MAX_FILES:
+        for stored in collected:
+            stored.discard()
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many files. Maximum per request: {settings.BULK_INGEST_MAX_FILES}"
+        )
+
+    try:
+        result = await BulkIngestionService(db).submit(
+            files=collected,
+            user_id=current_user.id,
+            knowledge_base_id=kb_id,
+            category=category,
+            tags=tags or None
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating bulk ingestion: {str(e)}"
+        )
+    result["rejected"] = rejected + result["rejected"]
+    return result
+
+
+@router.get("/jobs", response_model=List[IngestionJobSchema])
+async def list_ingestion_jobs(
+    skip: int = 0,
+    limit: int = 50,
+    current_user: UserSchema = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    """
+    List the current user's ingestion jobs, newest first
+    """
+    return await IngestionService(db).list_jobs(current_user.id, skip=skip, limit=limit)
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobSchema)
+async def get_ingestion_job(
+    job_id: str,
+    current_user: UserSchema = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    """
+    Get ingestion job status, stage timings and chunk count
+    """
+    job = await IngestionService(db).get_job(_parse_uuid(job_id, "job_id"), current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingestion job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}/retry", response_model=IngestionJobSchema)
+async def retry_ingestion_job(
+    job_id: str,
+    current_user: UserSchema = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    """
+    Re-queue a failed ingestion job
+    """
+    service = IngestionService(db)
+    job = await service.get_job(_parse_uuid(job_id, "job_id"), current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ingestion job not found")
+    return await service.retry(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_ingestion_job(
+    job_id: str,
+    current_user: UserSchema = Depends(get_current_user)
+) -> Any:
+    """
+    Stream job progress as server-sent events until the job completes or fails
+    """
+    job_uuid = _parse_uuid(job_id, "job_id")
+    user_id = current_user.id
+
+    async def event_stream():
+        last_state = None
+        while True:
+            # Fresh session per poll: the job is updated by a worker (possibly in another process)
+            async with AsyncSessionLocal() as session:
+                job = await IngestionService(session).get_job(job_uuid, user_id)
+                if not job:
+                    yield f"data: {json.dumps({'type': 'error', 'error': 'Ingestion job not found'})}\n\n"
+                    return
+                payload = IngestionJobSchema.model_validate(job).model_dump(mode="json")
+                finished = job.status in TERMINAL_STATUSES
+
+            state = (payload["status"], payload["stage"], payload["attempts"])
+            if state != last_state:
+                last_state = state
+                yield f"data: {json.dumps({'type': 'progress', **payload}, ensure_ascii=False)}\n\n"
+            if finished:
+                return
+            await asyncio.sleep(settings.INGESTION_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    )
+
+
+@router.get("/extraction/stats")
+async def get_extraction_stats(
+    current_user: UserSchema = Depends(get_current_user)
+) -> Any:
+    """
+    Get text extraction throughput and failure counters for this worker process
+    """
+    return get_extraction_engine().stats()
@@ -37,7 +37,7 @@ async def upload_knowledge_document(
     
     try:
         # Upload and process document with LangChain
-        document = await document_service.upload_and_process_document(
+        document = await document_service.upload_document(
             file=file,
             user_id=current_user.id,
             knowledge_base_id=knowledge_base_id,
@@ -317,3 +317,47 @@ async def delete_knowledge_document(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting document: {str(e)}"
         )
+
+
+@router.get("/embedding-cache/stats")
+async def get_embedding_cache_stats(
+    current_user: UserSchema = Depends(get_current_user)
+) -> Any:
+    """
+    Get embedding cache hit/miss counters for this worker process
+    """
+    from app.services.embedding_service import get_embedding_service
+    return get_embedding_service().get_cache_stats()
+
+
+@router.get("/semantic-cache/stats")
+async def get_semantic_cache_stats(
+    current_user: UserSchema = Depends(get_current_user)
+) -> Any:
+    """
+    Get semantic answer cache hit rate and latency saved for this worker process
+    """
+    from app.services.semantic_cache import get_semantic_cache
+    return get_semantic_cache().stats()
+
+
+@router.get("/sparse-index/stats")
+async def get_sparse_index_stats(
+    current_user: UserSchema = Depends(get_current_user)
+) -> Any:
+    """
+    Get BM25 sparse index sizes for the collections loaded in this worker process
+    """
+    from app.services.sparse_index import get_sparse_index_manager
+    return get_sparse_index_manager().stats()
+
+
+@router.get("/rerank/stats")
+async def get_rerank_stats(
+    current_user: UserSchema = Depends(get_current_user)
+) -> Any:
+    """
+    Get rerank queue depth, batch-size histogram and score cache counters for this worker process
+    """
+    from app.services.rerank_service import get_rerank_service
+    return get_rerank_service().stats()
@@ -1,16 +1,22 @@
 """
 Resume Evaluation API endpoints
 """
+import json
 import logging
+import os
 from typing import List, Optional
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, AsyncSessionLocal
 from app.api.deps import get_current_user
 from app.models.user import User
 from app.services.resume_evaluation_service import ResumeEvaluationService
+from app.services.resume_parser_service import ResumeParserService
+from app.utils.file_utils import FileTooLargeError, save_upload_stream
 from app.services.enhanced_document_service import EnhancedDocumentService
 from app.schemas.resume_evaluation import (
     ResumeEvaluationResponse,
@@ -29,6 +35,7 @@ async def evaluate_resume(
     file: UploadFile = File(..., description="简历文件 (支持PDF、TXT、DOC、DOCX)"),
     job_description_id: str = Form(..., description="职位描述ID"),
     conversation_id: Optional[str] = Form(None, description="对话ID"),
+    force_refresh: bool = Form(False, description="忽略缓存，强制重新评价"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -38,6 +45,7 @@ async def evaluate_resume(
     - **file**: 简历文件，支持PDF、TXT、DOC、DOCX格式
     - **job_description_id**: 职位描述ID
     - **conversation_id**: 可选的对话ID
+    - **force_refresh**: 为true时忽略评价缓存，重新调用AI评价
     """
     try:
         # 验证job_description_id格式
@@ -55,20 +63,17 @@ async def evaluate_resume(
                 raise HTTPException(status_code=400, detail="无效的对话ID格式")
 
 
-        file_content = await file.read()
-        if not file_content:
-            raise HTTPException(status_code=400, detail="文件内容为空")
-        
         # 创建评价服务
         evaluation_service = ResumeEvaluationService(db)
         
         # 执行简历评价
         result = await evaluation_service.evaluate_resume(
             user_id=current_user.id,
-            file_content=file_content,
+            file=file,
             filename=file.filename,
             job_description_id=jd_uuid,
-            conversation_id=conv_uuid
+            conversation_id=conv_uuid,
+            force_refresh=force_refresh
         )
         
         return ResumeEvaluationResult(**result)
@@ -81,6 +86,88 @@ async def evaluate_resume(
         raise HTTPException(status_code=500, detail="简历评价服务暂时不可用")
 
 
+@router.post("/evaluate/batch")
+async def evaluate_resume_batch(
+    files: List[UploadFile] = File(..., description="简历文件列表 (支持PDF、TXT、DOC、DOCX)"),
+    job_description_id: str = Form(..., description="职位描述ID"),
+    conversation_id: Optional[str] = Form(None, description="对话ID"),
+    force_refresh: bool = Form(False, description="忽略缓存，强制重新评价"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量上传同一职位的简历并进行AI评价，以SSE形式按完成顺序返回进度和实时排名
+
+    - **files**: 简历文件列表，单次最多 RESUME_BATCH_MAX_FILES 份
+    - **job_description_id**: 职位描述ID
+    - **conversation_id**: 可选的对话ID
+    - **force_refresh**: 为true时忽略评价缓存，重新调用AI评价
+    """
+    try:
+        jd_uuid = UUID(job_description_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的职位描述ID格式")
+    conv_uuid = None
+    if conversation_id:
+        try:
+            conv_uuid = UUID(conversation_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的对话ID格式")
+    if len(files) > settings.RESUME_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"单次最多上传 {settings.RESUME_BATCH_MAX_FILES} 份简历")
+
+    # 响应开始前先把所有上传流式保存到磁盘（UploadFile 在请求结束后不可再读）
+    parser = ResumeParserService()
+    upload_dir = os.path.join(settings.UPLOAD_DIR, "resumes", str(current_user.id))
+    stored_files = []
+    rejected = []
+    for upload in files:
+        is_valid, message = parser.validate_file(upload.filename or "", 0)
+        if not is_valid:
+            rejected.append({"filename": upload.filename, "reason": message})
+            continue
+        try:
+            stored = await save_upload_stream(upload, upload_dir, max_size=parser.max_file_size)
+        except FileTooLargeError:
+            rejected.append({"filename": upload.filename, "reason": "文件大小超过限制"})
+            continue
+        if stored.file_size == 0:
+            stored.discard()
+            rejected.append({"filename": upload.filename, "reason": "文件内容为空"})
+            continue
+        stored_files.append(stored)
+
+    user_id = current_user.id
+
+    async def generate_stream():
+        try:
+            start = {"type": "start", "total": len(stored_files), "rejected": rejected}
+            yield f"data: {json.dumps(start, ensure_ascii=False)}\n\n"
+            # 独立会话：流式响应期间请求级会话可能已关闭
+            async with AsyncSessionLocal() as session:
+                service = ResumeEvaluationService(session)
+                async for event in service.evaluate_resume_batch(
+                    user_id=user_id,
+                    files=stored_files,
+                    job_description_id=jd_uuid,
+                    conversation_id=conv_uuid,
+                    force_refresh=force_refresh
+                ):
+                    yield f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"批量简历评价失败: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+        finally:
+            # 上传的原件只在评价期间使用；连接提前断开时评价可能尚未开始
+            for stored in stored_files:
+                stored.discard()
+
+    return StreamingResponse(
+        generate_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    )
+
+
 @router.get("/history", response_model=ResumeEvaluationListResponse)
 async def get_evaluation_history(
     skip: int = 0,
@@ -24,6 +24,14 @@ class Settings(BaseSettings):
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    # Password hashing (bcrypt runs in a thread pool; hashes with another cost are upgraded on login)
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_CONCURRENT: int = 8  # Hashes submitted to the pool at once; the rest wait
+    # Authenticated user / role cache (per process; explicit invalidation is process-local)
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_ENTRIES: int = 10000
     
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8080"]
@@ -56,6 +64,20 @@ class Settings(BaseSettings):
     
     # Vector database settings
     VECTOR_DIMENSION: int = 2048  # 智谱AI embedding-3 dimension
+    VECTOR_STORE_POOL_SIZE: int = 10  # Shared async pool for all PGVector handles
+    VECTOR_STORE_MAX_OVERFLOW: int = 5
+    VECTOR_STORE_POOL_TIMEOUT: int = 30  # seconds to wait for a pooled connection
+    VECTOR_STORE_WARMUP_CONNECTIONS: int = 2  # Connections opened at startup
+    VECTOR_STORE_CACHE_SIZE: int = 1024  # Max cached collection handles
+    # ANN index on langchain_pg_embedding (see app/services/vector_index.py, scripts/manage_vector_indexes.py)
+    VECTOR_INDEX_METHOD: str = "hnsw"  # hnsw | ivfflat
+    VECTOR_INDEX_HALFVEC: bool = True  # Index embedding::halfvec (required above 2000 dims, pgvector >= 0.7)
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_HNSW_EF_SEARCH: int = 100  # Candidate list size per query; higher = better recall, slower
+    VECTOR_IVFFLAT_LISTS: int = 100
+    VECTOR_IVFFLAT_PROBES: int = 10
+    VECTOR_PARTITION_MIN_ROWS: int = 50000  # Collections this large get their own partial ANN index
     
     # LLM settings
     OPENAI_API_KEY: Optional[str] = None
@@ -66,12 +88,27 @@ class Settings(BaseSettings):
     LLM_API_KEY: Optional[str] = None
     LLM_BASE_URL: Optional[str] = None
     LLM_MODEL: str = "doubao-1-5-pro-32k-250115"
+    LLM_MAX_CONNECTIONS: int = 50  # Shared HTTP pool for LangChain chat models
+    LLM_REQUEST_TIMEOUT: float = 120.0  # seconds
     
     # Custom Embedding settings
     EMBEDDING_API_KEY: Optional[str] = None
     EMBEDDING_BASE_URL: Optional[str] = None
     EMBEDDING_MODEL: str = "embedding-3"
-    
+    EMBEDDING_BATCH_SIZE: int = 64  # Max texts per embedding request
+    EMBEDDING_BATCH_MAX_TOKENS: int = 8000  # Estimated token budget per embedding request
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # Concurrent embedding requests per process
+    EMBEDDING_MAX_RETRIES: int = 3  # Per-batch retries on 429/5xx/connection errors
+    EMBEDDING_RETRY_BASE_DELAY: float = 0.5  # seconds
+    EMBEDDING_RETRY_MAX_DELAY: float = 20.0  # seconds
+    EMBEDDING_REQUEST_TIMEOUT: float = 60.0  # seconds
+    # Embedding cache (in-process LRU + persistent embedding_cache table)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PERSISTENT: bool = True
+    EMBEDDING_CACHE_MEMORY_MB: int = 256  # LRU tier size per process
+    EMBEDDING_CACHE_MAX_ROWS: int = 500000  # Persistent tier size; 0 disables pruning
+    EMBEDDING_CACHE_PRUNE_INTERVAL: int = 1000  # Prune check every N persisted vectors
+
     # LangChain settings
     LANGCHAIN_TRACING_V2: bool = False
     LANGCHAIN_API_KEY: Optional[str] = None
@@ -80,6 +117,31 @@ class Settings(BaseSettings):
     DIFY_BASE_URL: str = "http://218.78.133.209:85"
     DIFY_API_KEY: Optional[str] = None
     DIFY_USER_ID: str = "hr-agent-user"
+    # Shared Dify HTTP client
+    DIFY_MAX_CONNECTIONS: int = 50
+    DIFY_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    DIFY_HTTP2: bool = True  # Used only when the h2 package is installed
+    DIFY_CONNECT_TIMEOUT: float = 10.0
+    DIFY_REQUEST_TIMEOUT: float = 120.0  # Blocking calls
+    DIFY_STREAM_TIMEOUT: float = 60.0  # Streaming calls (per read)
+    DIFY_WORKFLOW_TIMEOUTS: str = "6:60"  # Per workflow type overrides, "type:seconds,..."
+    DIFY_MAX_RETRIES: int = 2  # Blocking calls outside a conversation only
+    DIFY_RETRY_BACKOFF: float = 0.5  # Base seconds for jittered exponential backoff
+    DIFY_BREAKER_FAILURES: int = 5  # Consecutive failures that open the circuit
+    DIFY_BREAKER_RESET_SECONDS: float = 30.0  # Open time before a probe request is let through
+    # Exam grading (one Dify workflow call per question)
+    EXAM_GRADING_CONCURRENCY: int = 8  # Questions graded in parallel per submission
+    EXAM_GRADING_TIMEOUT: float = 60.0  # Seconds per question; a timed-out question scores 0
+    # Multiple choice rule: "strict" (all or nothing), "partial" (no wrong picks -> ratio of full),
+    # "proportional" (share per correct pick, minus one share per wrong pick)
+    EXAM_MULTIPLE_CHOICE_SCORING: str = "partial"
+    EXAM_MULTIPLE_CHOICE_PARTIAL_RATIO: float = 0.5
+    # Batch resume evaluation
+    RESUME_BATCH_MAX_FILES: int = 200  # Resumes per batch request
+    RESUME_BATCH_CONCURRENCY: int = 8  # Concurrent Dify evaluations per batch
+    RESUME_BATCH_INSERT_SIZE: int = 20  # Evaluation rows buffered per bulk insert
+    RESUME_EVAL_CACHE_ENABLED: bool = True  # Reuse evaluations for identical resume text + JD + criteria
+    RESUME_EVAL_CACHE_TTL_DAYS: int = 30  # Cached evaluations older than this are re-evaluated
     
     # Redis settings (for caching and session)
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -88,22 +150,75 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     UPLOAD_DIR: str = "uploads"
     
+    # Text extraction process pool
+    EXTRACTION_POOL_SIZE: int = 2  # Worker processes
+    EXTRACTION_CPU_SECONDS: int = 120  # CPU time cap per extraction task (POSIX)
+    EXTRACTION_MEMORY_MB: int = 1024  # Address space a worker may add beyond its startup size (POSIX); 0 disables
+    EXTRACTION_TIMEOUT: float = 300.0  # Wall-clock seconds per file
+    EXTRACTION_PDF_PARALLEL_MIN_PAGES: int = 40  # PDFs with at least this many pages are split
+    EXTRACTION_PDF_PAGES_PER_TASK: int = 20
+    
+    # Background ingestion jobs
+    INGESTION_WORKERS: int = 2  # Concurrent jobs per process
+    INGESTION_STALE_JOB_SECONDS: int = 1800  # RUNNING jobs older than this are re-queued at startup
+    INGESTION_EVENTS_POLL_INTERVAL: float = 1.0  # seconds between SSE progress polls
+    BULK_INGEST_MAX_FILES: int = 500  # Files per bulk request (after expanding archives)
+    BULK_INGEST_MAX_ARCHIVE_SIZE: int = 200 * 1024 * 1024  # Per uploaded file/archive
+    BULK_INGEST_LLM_CONCURRENCY: int = 4  # Files summarized/split concurrently
+    BULK_INGEST_EMBED_BATCH: int = 256  # Chunks coalesced across files per embedding flush
+    BULK_INGEST_QUEUE_DEPTH: int = 8  # Files buffered between pipeline stages
+    
     # RAG Fusion settings (multi-path retrieval)
-    RAG_FUSION_METHOD: str = "weighted_sum"  # "rrf" or "weighted_sum"
-    RAG_FUSION_WEIGHTS: str = "0.7,0.3"  # content_weight,text_weight for weighted_sum
+    RAG_FUSION_METHOD: str = "weighted_sum"  # "rrf", "weighted_sum" or "combmnz"; per-KB override in meta_data["retrieval"]
+    RAG_FUSION_WEIGHTS: str = "0.7,0.3"  # content_weight,text_weight
+    RAG_FUSION_NORMALIZATION: str = "minmax"  # "minmax", "zscore" or "none" (weighted_sum / combmnz)
+    RAG_ROUTE_CANDIDATES: int = 0  # Candidates fetched per route before fusion; 0 = the context limit
     # Query enhancement for KB retrieval
     KB_QUERY_ENHANCE_ENABLED: bool = True
     KB_QUERY_EXPANSION_MAX_TERMS: int = 6
+    # Retrieve on the raw question while intent/rewrite runs; discarded if the intent is GENERAL.
+    # Trades the rewritten query's recall for one LLM round-trip of latency.
+    RAG_SPECULATIVE_RETRIEVAL: bool = False
     RAG_FUSION_RRF_K: int = 60  # RRF parameter k
-    
+    # Per-route retrieval timeouts (seconds); a timed-out route is dropped from fusion
+    RAG_VECTOR_ROUTE_TIMEOUT: float = 10.0
+    RAG_TEXT_ROUTE_TIMEOUT: float = 5.0
+    # Keyword route engine: "tsvector" (PostgreSQL search_tsv) or "bm25" (in-process sparse index)
+    RAG_TEXT_ROUTE_ENGINE: str = "tsvector"
+    RAG_BM25_K1: float = 1.2
+    RAG_BM25_B: float = 0.75
+    RAG_BM25_INDEX_DIR: str = "data/bm25"  # Memory-mapped index files per collection; empty disables persistence
+    RAG_BM25_MERGE_THRESHOLD: int = 2000  # Chunks added before the delta is merged into the base segment
+    RAG_BM25_REFRESH_SECONDS: int = 300  # Row-count check for changes made by other worker processes
+    RAG_BM25_MAX_INDEXES: int = 64  # Collections kept in memory (LRU)
+    # Parent-child chunking: small child chunks are embedded, their parent sections are stored once
+    # (document_sections) and matched children are expanded to sections within a token budget
+    RAG_PARENT_CHILD_ENABLED: bool = True
+    RAG_CHILD_CHUNK_SIZE: int = 200  # Max characters per embedded child chunk
+    RAG_CONTEXT_TOKEN_BUDGET: int = 3000  # Estimated tokens of expanded context in the prompt; 0 disables expansion
+    RAG_CONTEXT_NEIGHBOR_SECTIONS: int = 1  # Adjacent sections on each side added while budget remains
+
+    # Semantic answer cache for the knowledge assistant
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Cosine similarity required for a hit
+    SEMANTIC_CACHE_TTL_SECONDS: int = 24 * 3600
+    SEMANTIC_CACHE_MAX_ENTRIES_PER_SCOPE: int = 500  # Per (user, knowledge base)
+    SEMANTIC_CACHE_MAX_SCOPES: int = 2000
+
     # Rerank settings
     RERANK_ENABLED: bool = True
+    RERANK_WARMUP_ON_STARTUP: bool = True  # Load the model in the background at startup instead of on first use
     # Use a lightweight cross-encoder by default to improve portability
     RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # Default rerank model
     RERANK_TOP_K: int = 10  # Number of candidates to rerank
     RERANK_FINAL_K: int = 5  # Final number of results after rerank
-    RERANK_BATCH_SIZE: int = 32  # Batch size for rerank processing
+    RERANK_BATCH_SIZE: int = 32  # Max (query, passage) pairs per model call across concurrent requests
+    RERANK_BATCH_WINDOW_MS: float = 5.0  # How long the first queued request waits for others to join its batch
     RERANK_DEVICE: str = "cpu"  # "cpu" or "cuda"
+    # "torch", "onnx" or "openvino" (CrossEncoder models; sentence-transformers >= 4.1)
+    RERANK_BACKEND: str = "torch"
+    RERANK_ONNX_FILE: str = ""  # e.g. "onnx/model_qint8_avx2.onnx" for int8-quantized CPU inference
+    RERANK_CACHE_MAX_ENTRIES: int = 50000  # Scores cached per (model, query, chunk); 0 disables
     
     # Logging
     LOG_LEVEL: str = "INFO"
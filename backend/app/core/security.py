@@ -1,9 +1,12 @@
 """
 Security utilities for password hashing and JWT tokens
 """
+import asyncio
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Union, Optional, Tuple
 from jose import jwt
 from passlib.context import CryptContext
 
@@ -11,7 +14,14 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS
+)
+
+# "$2b$12$..." -> cost factor 12
+_BCRYPT_ROUNDS = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
 
 ALGORITHM = "HS256"
 
@@ -34,6 +44,16 @@ def create_access_token(
     return encoded_jwt
 
 
+def _truncate_password(password: str) -> str:
+    # bcrypt has a maximum password length of 72 bytes
+    password_bytes = password.encode('utf-8')
+    if len(password_bytes) > 72:
+        # Truncate password to 72 bytes, but warn about it
+        logger.warning(f"Password is {len(password_bytes)} bytes, truncating to 72 bytes for bcrypt compatibility")
+        password = password_bytes[:72].decode('utf-8', errors='ignore')
+    return password
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a password against its hash
@@ -41,6 +61,16 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Whether a hash uses a deprecated scheme or a bcrypt cost other than PASSWORD_BCRYPT_ROUNDS
+    """
+    if pwd_context.needs_update(hashed_password):
+        return True
+    match = _BCRYPT_ROUNDS.match(hashed_password or "")
+    return match is not None and int(match.group(1)) != settings.PASSWORD_BCRYPT_ROUNDS
+
+
 def get_password_hash(password: str) -> str:
     """
     Hash a password
@@ -55,19 +85,89 @@ def get_password_hash(password: str) -> str:
         ValueError: If password is too long for bcrypt
     """
     try:
-        # bcrypt has a maximum password length of 72 bytes
-        password_bytes = password.encode('utf-8')
-        if len(password_bytes) > 72:
-            # Truncate password to 72 bytes, but warn about it
-            logger.warning(f"Password is {len(password_bytes)} bytes, truncating to 72 bytes for bcrypt compatibility")
-            password = password_bytes[:72].decode('utf-8', errors='ignore')
-            
-        return pwd_context.hash(password)
+        return pwd_context.hash(_truncate_password(password))
     except Exception as e:
         logger.error(f"Error hashing password: {e}")
         raise
 
 
+def _verify_and_rehash(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    if password_needs_rehash(hashed_password):
+        return True, pwd_context.hash(_truncate_password(plain_password))
+    return True, None
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop.
+
+    bcrypt releases the GIL, so a small thread pool hashes in parallel; the semaphore caps
+    hashes in flight so a login burst queues here instead of piling work onto the pool.
+    """
+
+    def __init__(self, workers: int, max_concurrent: int):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._max_concurrent = max(1, max_concurrent)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.rehashed = 0
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrent)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (is_valid, new_hash); new_hash is set when the stored hash should be upgraded
+        """
+        valid, new_hash = await self._run(_verify_and_rehash, plain_password, hashed_password)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_concurrent": self._max_concurrent,
+            "waiting": self.waiting,
+            "rehashed": self.rehashed,
+            "rounds": settings.PASSWORD_BCRYPT_ROUNDS
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global hasher instance
+_password_hasher: Optional[PasswordHasher] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Get global password hasher instance"""
+    global _password_hasher
+    if _password_hasher is None:
+        _password_hasher = PasswordHasher(
+            workers=settings.PASSWORD_HASH_WORKERS,
+            max_concurrent=settings.PASSWORD_HASH_MAX_CONCURRENT
+        )
+    return _password_hasher
+
+
 def verify_token(token: str) -> Optional[dict]:
     """
     Verify and decode JWT token
@@ -14,6 +14,10 @@ from app.models.resume_evaluation import ResumeEvaluation
 from app.models.interview_plan import InterviewPlan
 from app.models.exam import Exam, Question
 from app.models.exam_result import ExamResult
+from app.models.embedding_cache import EmbeddingCacheEntry
+from app.models.ingestion_job import IngestionJob, IngestionStatus
+from app.models.resume_evaluation_cache import ResumeEvaluationCacheEntry
+from app.models.document_section import DocumentSection
 
 # Export all models
 __all__ = [
@@ -31,5 +35,10 @@ __all__ = [
     "InterviewPlan",
     "Exam",
     "Question",
-    "ExamResult"
+    "ExamResult",
+    "EmbeddingCacheEntry",
+    "IngestionJob",
+    "IngestionStatus",
+    "ResumeEvaluationCacheEntry",
+    "DocumentSection"
 ]
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+Document section model: parent sections of the embedded child chunks
+"""
+from sqlalchemy import Column, Integer, Text, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.database import Base
+
+
+class DocumentSection(Base):
+    """A parent section of a document, stored once and never embedded.
+
+    Child chunks in langchain_pg_embedding point at their section through
+    ``cmetadata->>'parent_index'``; retrieval expands matched children to these sections.
+    """
+
+    __tablename__ = "document_sections"
+
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    section_index = Column(Integer, primary_key=True)
+    content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False)  # Estimated, for packing the context budget
+
+    def __repr__(self):
+        return f"<DocumentSection(document_id='{self.document_id}', section_index={self.section_index})>"
@@ -0,0 +1,27 @@
+"""
+Embedding cache model: content-addressed vectors keyed by (model, dimensions, text hash)
+"""
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary
+
+from app.core.database import Base
+
+
+class EmbeddingCacheEntry(Base):
+    """Persistent tier of the embedding cache.
+
+    Deliberately not a BaseModel: rows are addressed only by their composite key and
+    carry no audit columns, keeping each entry as small as the vector itself.
+    """
+
+    __tablename__ = "embedding_cache"
+
+    model = Column(String(100), primary_key=True)
+    dimensions = Column(Integer, primary_key=True)
+    text_hash = Column(String(64), primary_key=True)  # SHA256 of the normalized text
+    embedding = Column(LargeBinary, nullable=False)  # float32 little-endian bytes
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<EmbeddingCacheEntry(model='{self.model}', text_hash='{self.text_hash[:12]}')>"
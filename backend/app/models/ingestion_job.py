@@ -0,0 +1,48 @@
+"""
+Ingestion job model for background document processing
+"""
+from sqlalchemy import Column, String, Text, JSON, ForeignKey, Integer, DateTime, Enum
+from sqlalchemy.dialects.postgresql import UUID
+import enum
+
+from app.models.base import BaseModel
+
+
+class IngestionStatus(enum.Enum):
+    """摄取任务状态枚举"""
+    PENDING = "pending"  # 排队中
+    RUNNING = "running"  # 处理中
+    COMPLETED = "completed"  # 已完成
+    FAILED = "failed"  # 失败
+
+
+class IngestionJob(BaseModel):
+    """A document ingestion run: extraction, summary, split, embedding and vector insert"""
+
+    __tablename__ = "ingestion_jobs"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    knowledge_base_id = Column(UUID(as_uuid=True), ForeignKey("knowledge_bases.id"), nullable=True)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+
+    # 文件信息（文件已落盘，任务只引用路径）
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(500), nullable=False)
+    file_hash = Column(String(64), nullable=False, index=True)  # SHA256, idempotency key
+    file_size = Column(Integer, nullable=False)
+    mime_type = Column(String(100), nullable=False)
+    category = Column(String(100), nullable=True)
+    tags = Column(JSON, nullable=True)
+
+    # 进度
+    status = Column(Enum(IngestionStatus), nullable=False, default=IngestionStatus.PENDING, index=True)
+    stage = Column(String(50), nullable=True)  # Current or last stage
+    stage_timings = Column(JSON, nullable=True)  # {stage: milliseconds}
+    chunk_count = Column(Integer, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<IngestionJob(id={self.id}, filename='{self.filename}', status={self.status})>"
@@ -0,0 +1,37 @@
+"""
+Resume evaluation cache model: AI evaluation results keyed by (resume text, JD, scoring criteria)
+"""
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.database import Base
+
+
+class ResumeEvaluationCacheEntry(Base):
+    """Cached Dify evaluation of one resume text against one JD/criteria version.
+
+    Like the embedding cache this is not a BaseModel: rows are addressed by their content key
+    (SHA256 over the resume text hash, JD content hash and criteria content hash).
+    """
+
+    __tablename__ = "resume_evaluation_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+    resume_hash = Column(String(64), nullable=False)  # SHA256 of the normalized resume text
+    job_description_id = Column(
+        UUID(as_uuid=True), ForeignKey("job_descriptions.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    scoring_criteria_id = Column(
+        UUID(as_uuid=True), ForeignKey("scoring_criteria.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    jd_hash = Column(String(64), nullable=False)
+    criteria_hash = Column(String(64), nullable=False)
+    ai_result = Column(JSON, nullable=False)  # AIEvaluationResult.model_dump()
+    raw_response = Column(Text, nullable=True)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ResumeEvaluationCacheEntry(cache_key='{self.cache_key[:12]}')>"
@@ -0,0 +1,43 @@
+"""
+Ingestion job Pydantic schemas
+"""
+from datetime import datetime
+from typing import Optional, Dict, List
+from uuid import UUID
+from pydantic import BaseModel
+
+from app.models.ingestion_job import IngestionStatus
+
+
+class IngestionJob(BaseModel):
+    """Public ingestion job schema"""
+    id: UUID
+    user_id: UUID
+    knowledge_base_id: Optional[UUID] = None
+    document_id: Optional[UUID] = None
+    filename: str
+    file_hash: str
+    file_size: int
+    mime_type: str
+    category: Optional[str] = None
+    tags: Optional[List[str]] = None
+    status: IngestionStatus
+    stage: Optional[str] = None
+    stage_timings: Optional[Dict[str, float]] = None
+    chunk_count: Optional[int] = None
+    attempts: int
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class BulkIngestionResponse(BaseModel):
+    """Result of a bulk upload: one job per unique file"""
+    jobs: List[IngestionJob]
+    duplicates: List[str]  # Filenames skipped as already uploaded or repeated in the batch
+    rejected: List[Dict[str, str]]  # {"filename": ..., "reason": ...}
@@ -110,4 +110,5 @@ class ResumeEvaluationResult(BaseModel):
     school: Optional[str]
     resume_content: str
     original_filename: str
-    created_at: str
\ No newline at end of file
+    created_at: str
+    cached: bool = False  # 是否命中评价缓存（未重新调用AI）
\ No newline at end of file
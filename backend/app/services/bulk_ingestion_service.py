@@ -0,0 +1,495 @@
+"""
+Bulk document ingestion with a pipelined extract -> prepare -> embed/store flow.
+
+Files are deduplicated on file_hash before anything expensive happens. The remaining files
+flow through three concurrent stages connected by bounded queues, so file N+1 is being
+extracted while file N is summarized/split and earlier files are embedded. The embed stage
+coalesces chunks from several files into full embedding batches and stores them with a
+single executemany insert. Every file is tracked as an IngestionJob; a failing step only fails
+its own job, and jobs the pipeline never finished are marked failed when it stops.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.document import Document
+from app.models.ingestion_job import IngestionJob, IngestionStatus
+from app.services.embedding_service import get_embedding_service
+from app.services.enhanced_document_service import EnhancedDocumentService
+from app.services.extraction_service import get_extraction_engine
+from app.services.ingestion_service import indexed_document_ids, reusable_jobs_query
+from app.services.semantic_cache import get_semantic_cache
+from app.services.sparse_index import get_sparse_index_manager
+from app.services.vector_store_registry import get_vector_store_registry
+from app.utils.file_utils import FileTooLargeError, StoredFile, store_file_object
+
+logger = logging.getLogger(__name__)
+
+# Keep references to running pipelines so they are not garbage collected
+_running_pipelines: Set[asyncio.Task] = set()
+
+_STAGE_DONE = None
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def expand_archive(archive: StoredFile, directory: str) -> Tuple[List[StoredFile], List[Dict[str, str]]]:
+    """Stream the members of a stored .zip upload into ``directory``, one file at a time"""
+    files: List[StoredFile] = []
+    rejected: List[Dict[str, str]] = []
+    try:
+        with zipfile.ZipFile(archive.path) as zf:
+            for info in zf.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                # Check the declared size before decompressing anything; the real size is enforced while copying
+                if info.file_size > settings.MAX_FILE_SIZE:
+                    rejected.append({"filename": name, "reason": "file too large"})
+                    continue
+                try:
+                    with zf.open(info) as member:
+                        files.append(store_file_object(member, directory, name, settings.MAX_FILE_SIZE))
+                except FileTooLargeError:
+                    rejected.append({"filename": name, "reason": "file too large"})
+    except Exception:
+        for stored in files:
+            stored.discard()
+        raise
+    return files, rejected
+
+
+class FileChunks:
+    """Split output of one file waiting for the embed stage"""
+
+    def __init__(
+        self,
+        job_id: UUID,
+        user_id: UUID,
+        knowledge_base_id: Optional[UUID],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        timings: Dict[str, float]
+    ):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.knowledge_base_id = knowledge_base_id
+        self.texts = texts
+        self.metadatas = metadatas
+        self.timings = timings
+
+
+class BulkIngestionService:
+    """Deduplicates a batch of uploads, records jobs and starts the pipeline"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.document_service = EnhancedDocumentService(db)
+
+    async def submit(
+        self,
+        files: List[StoredFile],
+        user_id: UUID,
+        knowledge_base_id: Optional[UUID] = None,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Create one job per unique stored file and start processing in the background"""
+        rejected: List[Dict[str, str]] = []
+        duplicates: List[str] = []
+
+        # 1) Drop in-batch duplicates / unsupported types (hashes were computed while streaming)
+        unique: Dict[str, StoredFile] = {}
+        for stored in files:
+            if self.document_service._get_mime_type(stored.filename) == "application/octet-stream":
+                rejected.append({"filename": stored.filename, "reason": "unsupported file type"})
+                stored.discard()
+                continue
+            if stored.file_hash in unique:
+                duplicates.append(stored.filename)
+                stored.discard()
+                continue
+            unique[stored.file_hash] = stored
+
+        # 2) Dedupe against existing documents and reusable jobs in two queries
+        hashes = list(unique.keys())
+        existing_docs: Dict[str, Document] = {}
+        existing_jobs: Dict[str, IngestionJob] = {}
+        indexed: Set[UUID] = set()
+        if hashes:
+            result = await self.db.execute(
+                select(Document).where(Document.user_id == user_id, Document.file_hash.in_(hashes))
+            )
+            existing_docs = {doc.file_hash: doc for doc in result.scalars().all()}
+            # Active jobs, or completed ones whose Document still exists; newest first
+            result = await self.db.execute(reusable_jobs_query(user_id, hashes))
+            for job in result.scalars().all():
+                existing_jobs.setdefault(job.file_hash, job)
+            # Documents without chunks (a run failed after persist) are processed again
+            indexed = await indexed_document_ids(
+                self.db,
+                [doc.id for doc in existing_docs.values()]
+                + [job.document_id for job in existing_jobs.values() if job.status == IngestionStatus.COMPLETED]
+            )
+            existing_jobs = {
+                file_hash: job for file_hash, job in existing_jobs.items()
+                if job.status != IngestionStatus.COMPLETED or job.document_id in indexed
+            }
+
+        jobs: List[IngestionJob] = []
+        new_jobs: List[IngestionJob] = []
+        now = datetime.utcnow()
+        for file_hash, stored in unique.items():
+            if file_hash in existing_jobs:
+                jobs.append(existing_jobs[file_hash])
+                duplicates.append(stored.filename)
+                stored.discard()
+                continue
+            job = IngestionJob(
+                user_id=user_id,
+                knowledge_base_id=knowledge_base_id,
+                filename=stored.filename,
+                file_hash=file_hash,
+                file_size=stored.file_size,
+                mime_type=stored.mime_type,
+                category=category,
+                tags=tags
+            )
+            existing_doc = existing_docs.get(file_hash)
+            if existing_doc is not None and existing_doc.id in indexed:
+                stored.discard()
+                job.file_path = existing_doc.file_path
+                job.document_id = existing_doc.id
+                job.status = IngestionStatus.COMPLETED
+                job.stage = "deduplicated"
+                job.finished_at = now
+                duplicates.append(stored.filename)
+            else:
+                # Claimed by this pipeline: RUNNING keeps the regular workers away from it
+                job.file_path = stored.path
+                if existing_doc is not None:
+                    # Re-extracted into the existing Document, from its own file while that still exists
+                    job.document_id = existing_doc.id
+                    if os.path.exists(existing_doc.file_path):
+                        stored.discard()
+                        job.file_path = existing_doc.file_path
+                job.status = IngestionStatus.RUNNING
+                job.stage = "queued"
+                job.attempts = 1
+                job.started_at = now
+                new_jobs.append(job)
+            self.db.add(job)
+            jobs.append(job)
+
+        await self.db.commit()
+        for job in jobs:
+            await self.db.refresh(job)
+
+        if new_jobs:
+            pipeline = BulkIngestionPipeline([job.id for job in new_jobs])
+            task = asyncio.create_task(pipeline.run())
+            _running_pipelines.add(task)
+            task.add_done_callback(_running_pipelines.discard)
+
+        logger.info(
+            f"Bulk ingestion submitted: {len(new_jobs)} new, {len(duplicates)} duplicates, {len(rejected)} rejected"
+        )
+        return {"jobs": jobs, "duplicates": duplicates, "rejected": rejected}
+
+
+class BulkIngestionPipeline:
+    """Three-stage pipeline; each stage works on different files at the same time"""
+
+    def __init__(self, job_ids: List[UUID]):
+        self.job_ids = job_ids
+        self.prepare_workers = max(1, settings.BULK_INGEST_LLM_CONCURRENCY)
+        self.embed_batch_size = max(1, settings.BULK_INGEST_EMBED_BATCH)
+        self.extracted: asyncio.Queue = asyncio.Queue(maxsize=settings.BULK_INGEST_QUEUE_DEPTH)
+        self.prepared: asyncio.Queue = asyncio.Queue(maxsize=settings.BULK_INGEST_QUEUE_DEPTH)
+        self.embeddings = get_embedding_service().get_embeddings()
+        self.vector_stores = get_vector_store_registry()
+        # Jobs whose final status (COMPLETED or FAILED) has been written
+        self.finished: Set[UUID] = set()
+
+    async def run(self) -> None:
+        started = time.perf_counter()
+        prepare_tasks = [asyncio.create_task(self._prepare_stage()) for _ in range(self.prepare_workers)]
+        embed_task = asyncio.create_task(self._embed_stage())
+        try:
+            await self._extract_stage()
+            for _ in prepare_tasks:
+                await self.extracted.put(_STAGE_DONE)
+            await asyncio.gather(*prepare_tasks)
+            await self.prepared.put(_STAGE_DONE)
+            await embed_task
+            logger.info(f"Bulk ingestion of {len(self.job_ids)} files finished in {_elapsed_ms(started)} ms")
+        except Exception as e:
+            logger.error(f"Bulk ingestion pipeline stopped: {e}")
+        finally:
+            for task in (*prepare_tasks, embed_task):
+                task.cancel()
+            await self._fail_unfinished()
+
+    async def _fail_unfinished(self) -> None:
+        """Never leave a job RUNNING after the pipeline stops (it claimed them away from the workers)"""
+        unfinished = [job_id for job_id in self.job_ids if job_id not in self.finished]
+        if not unfinished:
+            return
+        logger.error(f"Bulk ingestion pipeline stopped before finishing {len(unfinished)} jobs")
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(IngestionJob)
+                    .where(IngestionJob.id.in_(unfinished), IngestionJob.status == IngestionStatus.RUNNING)
+                    .values(
+                        status=IngestionStatus.FAILED,
+                        error="Bulk ingestion pipeline stopped before this file was processed",
+                        finished_at=datetime.utcnow(),
+                        updated_at=datetime.utcnow()
+                    )
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to mark unfinished bulk ingestion jobs as failed: {e}")
+
+    async def _update_job(self, job_id: UUID, **values) -> None:
+        values["updated_at"] = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(**values))
+            await db.commit()
+        if values.get("status") in (IngestionStatus.COMPLETED, IngestionStatus.FAILED):
+            self.finished.add(job_id)
+
+    async def _fail(self, job_id: UUID, stage: str, error: Exception, timings: Optional[Dict[str, float]] = None) -> None:
+        if job_id in self.finished:
+            return
+        logger.error(f"Bulk ingestion job {job_id} failed at stage {stage}: {error}")
+        try:
+            await self._update_job(
+                job_id,
+                status=IngestionStatus.FAILED,
+                stage=stage,
+                error=str(error),
+                stage_timings=timings or {},
+                finished_at=datetime.utcnow()
+            )
+        except Exception as e:
+            # Left unfinished: run() retries when the pipeline stops
+            logger.error(f"Failed to record failure of bulk ingestion job {job_id}: {e}")
+
+    async def _extract_stage(self) -> None:
+        """Extract files in the extraction pool, bounded by its size, feeding the prepare stage"""
+        engine = get_extraction_engine()
+        semaphore = asyncio.Semaphore(engine.pool_size)
+
+        async def extract_one(job_id: UUID):
+            async with semaphore:
+                try:
+                    async with AsyncSessionLocal() as db:
+                        job = await db.get(IngestionJob, job_id)
+                        file_path, mime_type = job.file_path, job.mime_type
+                    await self._update_job(job_id, stage="extract")
+                    stage_started = time.perf_counter()
+                    content = await engine.extract(mime_type, file_path=file_path)
+                    if not content:
+                        raise ValueError("No text could be extracted from the file")
+                except Exception as e:
+                    await self._fail(job_id, "extract", e)
+                    return
+                timings = {"extract": _elapsed_ms(stage_started)}
+            await self.extracted.put((job_id, content, timings))
+
+        await asyncio.gather(*(extract_one(job_id) for job_id in self.job_ids))
+
+    async def _prepare_stage(self) -> None:
+        """Summarize, persist the Document and split into chunks"""
+        while True:
+            item = await self.extracted.get()
+            if item is _STAGE_DONE:
+                return
+            job_id, content, timings = item
+            stage = "summarize"
+            try:
+                async with AsyncSessionLocal() as db:
+                    document_service = EnhancedDocumentService(db)
+                    job = await db.get(IngestionJob, job_id)
+                    job.stage = stage
+                    await db.commit()
+
+                    stage_started = time.perf_counter()
+                    summary = await document_service.llm_service.summarize_text(content) if content else None
+                    timings["summarize"] = _elapsed_ms(stage_started)
+
+                    stage = "persist"
+                    document = await db.get(Document, job.document_id) if job.document_id else None
+                    if document is not None:
+                        # Existing Document that was never indexed: refill it and clear leftovers
+                        await document_service.delete_document_chunks(document.id, document.user_id)
+                        document.file_path = job.file_path
+                        document.extracted_content = content
+                        document.summary = summary
+                    else:
+                        document = Document(
+                            filename=job.filename,
+                            original_filename=job.filename,
+                            file_path=job.file_path,
+                            file_size=job.file_size,
+                            file_hash=job.file_hash,
+                            mime_type=job.mime_type,
+                            extracted_content=content,
+                            summary=summary,
+                            embedding=None,
+                            category=job.category,
+                            tags=job.tags,
+                            user_id=job.user_id,
+                            knowledge_base_id=job.knowledge_base_id
+                        )
+                        db.add(document)
+                    await db.flush()
+                    job.document_id = document.id
+                    job.stage = "split"
+                    await db.commit()
+                    await db.refresh(document)
+
+                    stage = "split"
+                    stage_started = time.perf_counter()
+                    sections, texts, parent_indexes = (
+                        await document_service.split_hierarchy(content) if content else ([], [], None)
+                    )
+                    timings["split"] = _elapsed_ms(stage_started)
+                    metadatas = document_service.build_chunk_metadatas(document, texts, parent_indexes)
+                    if sections:
+                        document_service.add_sections(document, sections)
+                        await db.commit()
+            except Exception as e:
+                await self._fail(job_id, stage, e, timings)
+                continue
+
+            try:
+                if not texts:
+                    await self._update_job(
+                        job_id,
+                        status=IngestionStatus.COMPLETED,
+                        stage="done",
+                        chunk_count=0,
+                        stage_timings=timings,
+                        finished_at=datetime.utcnow()
+                    )
+                    continue
+                await self._update_job(job_id, stage="embed")
+            except Exception as e:
+                await self._fail(job_id, "embed", e, timings)
+                continue
+            await self.prepared.put(
+                FileChunks(job_id, document.user_id, document.knowledge_base_id, texts, metadatas, timings)
+            )
+
+    async def _embed_stage(self) -> None:
+        """Coalesce chunks across files into full embedding batches and bulk insert them"""
+        pending: List[FileChunks] = []
+        pending_chunks = 0
+        done = False
+        while not done:
+            item = await self.prepared.get()
+            if item is _STAGE_DONE:
+                done = True
+            else:
+                pending.append(item)
+                pending_chunks += len(item.texts)
+            # Drain whatever is already waiting, then flush once the batch is full or input is idle
+            while not done and pending_chunks < self.embed_batch_size:
+                try:
+                    item = self.prepared.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _STAGE_DONE:
+                    done = True
+                else:
+                    pending.append(item)
+                    pending_chunks += len(item.texts)
+            if pending and (done or pending_chunks >= self.embed_batch_size or self.prepared.empty()):
+                try:
+                    await self._flush(pending)
+                except Exception as e:
+                    # Jobs the flush already finished are left as they are
+                    for item in pending:
+                        await self._fail(item.job_id, "embed", e, item.timings)
+                pending, pending_chunks = [], 0
+
+    async def _flush(self, batch: List[FileChunks]) -> None:
+        texts = [t for item in batch for t in item.texts]
+        stage_started = time.perf_counter()
+        try:
+            vectors = await self.embeddings.aembed_documents(texts)
+        except Exception as e:
+            for item in batch:
+                await self._fail(item.job_id, "embed", e, item.timings)
+            return
+        embed_ms = _elapsed_ms(stage_started)
+
+        # One executemany insert per collection (all files of a batch usually share one)
+        groups: Dict[str, List[Tuple[FileChunks, List[List[float]]]]] = {}
+        offset = 0
+        for item in batch:
+            item.timings["embed"] = embed_ms
+            collection_name = EnhancedDocumentService.chunks_collection_name(item.user_id)
+            groups.setdefault(collection_name, []).append((item, vectors[offset:offset + len(item.texts)]))
+            offset += len(item.texts)
+
+        stored_chunks = 0
+        for collection_name, members in groups.items():
+            stage_started = time.perf_counter()
+            group_texts = [t for item, _ in members for t in item.texts]
+            metadatas = [m for item, _ in members for m in item.metadatas]
+            ids = [str(uuid.uuid4()) for _ in group_texts]
+            try:
+                await self.vector_stores.bulk_insert(
+                    collection_name,
+                    group_texts,
+                    [v for _, item_vectors in members for v in item_vectors],
+                    metadatas,
+                    ids=ids
+                )
+            except Exception as e:
+                for item, _ in members:
+                    await self._fail(item.job_id, "store", e, item.timings)
+                continue
+            store_ms = _elapsed_ms(stage_started)
+            stored_chunks += len(group_texts)
+            try:
+                await get_sparse_index_manager().add_chunks(collection_name, ids, group_texts, metadatas)
+            except Exception as e:
+                for item, _ in members:
+                    await self._fail(item.job_id, "store", e, item.timings)
+                continue
+            for item, _ in members:
+                item.timings["store"] = store_ms
+                try:
+                    get_semantic_cache().invalidate(item.user_id, item.knowledge_base_id)
+                    await self._update_job(
+                        item.job_id,
+                        status=IngestionStatus.COMPLETED,
+                        stage="done",
+                        chunk_count=len(item.texts),
+                        stage_timings=item.timings,
+                        finished_at=datetime.utcnow()
+                    )
+                except Exception as e:
+                    await self._fail(item.job_id, "store", e, item.timings)
+        logger.info(
+            f"Bulk ingestion embedded {len(texts)} chunks from {len(batch)} files in {embed_ms} ms, "
+            f"stored {stored_chunks} across {len(groups)} collections"
+        )
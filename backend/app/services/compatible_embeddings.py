@@ -1,72 +1,217 @@
 """Custom Other Embeddings using OpenAI compatible API."""
 
 import asyncio
+import math
+import random
+import re
+import time
 from typing import List, Optional
-from openai import OpenAI
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
 from langchain_core.embeddings import Embeddings
 from ..core.config import settings
 import logging
 logger = logging.getLogger(__name__)
 
+# CJK characters are roughly one token each; other text averages ~3-4 chars per token
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, conservative token estimate used for packing embedding batches."""
+    if not text:
+        return 1
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 3) + 1
+
+
 class CompatibleOpenAIEmbeddings(Embeddings):
     """Compatible Embeddings using OpenAI compatible API."""
-    
+
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_url: str = "https://open.bigmodel.cn/api/paas/v4",
         model: str = "embedding-3",
-        dimensions: int = None
+        dimensions: int = None,
+        batch_size: Optional[int] = None,
+        batch_max_tokens: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None
     ):
         self.api_key = api_key or settings.embedding.zhipu_api_key
         self.base_url = base_url
         self.model = model
         self.dimensions = dimensions or settings.VECTOR_DIMENSION
-        
+
+        # Batching / concurrency configuration
+        self.batch_size = max(1, batch_size or settings.EMBEDDING_BATCH_SIZE)
+        self.batch_max_tokens = max(1, batch_max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS)
+        self.max_concurrency = max(1, max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY)
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max(0, max_retries)
+
+        # Retries are handled per batch below, so the SDK's own retry loop is disabled
         self.client = OpenAI(
             api_key=self.api_key,
-            base_url=self.base_url
+            base_url=self.base_url,
+            timeout=settings.EMBEDDING_REQUEST_TIMEOUT,
+            max_retries=0
         )
-        
-        logger.info(f"ZhipuOpenAI Embeddings initialized with model: {self.model}")
-    
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed search docs."""
-        try:
-            embeddings = []
-            for text in texts:
+        # Bounded keep-alive pool shared by all concurrent batches
+        self.async_client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=settings.EMBEDDING_REQUEST_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        logger.info(
+            f"ZhipuOpenAI Embeddings initialized with model: {self.model} "
+            f"(batch_size={self.batch_size}, batch_max_tokens={self.batch_max_tokens}, "
+            f"concurrency={self.max_concurrency})"
+        )
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Pack text indices into batches bounded by item count and estimated tokens."""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.batch_size or current_tokens + tokens > self.batch_max_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            # An oversized single text still goes out alone; the API decides whether to truncate
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """429, 5xx, timeouts and connection errors are worth retrying."""
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Exponential backoff with full jitter, honoring Retry-After when the server sends it."""
+        response = getattr(error, "response", None)
+        retry_after = None
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        if retry_after is not None and retry_after >= 0:
+            return min(retry_after, settings.EMBEDDING_RETRY_MAX_DELAY)
+        cap = min(settings.EMBEDDING_RETRY_MAX_DELAY, settings.EMBEDDING_RETRY_BASE_DELAY * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def _ordered_vectors(response) -> List[List[float]]:
+        """Return embeddings in request order (the API may reorder ``data``)."""
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch synchronously with per-batch retry."""
+        attempt = 0
+        while True:
+            try:
                 response = self.client.embeddings.create(
                     model=self.model,
-                    input=text,
+                    input=batch,
                     dimensions=self.dimensions,
                     encoding_format="float"
                 )
-                embeddings.append(response.data[0].embedding)
+                return self._ordered_vectors(response)
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    async def _aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one batch on the shared async client with per-batch retry."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await self.async_client.embeddings.create(
+                        model=self.model,
+                        input=batch,
+                        dimensions=self.dimensions,
+                        encoding_format="float"
+                    )
+                return self._ordered_vectors(response)
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"Embedding batch of {len(batch)} failed ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed search docs."""
+        try:
+            embeddings: List[Optional[List[float]]] = [None] * len(texts)
+            for indices in self._make_batches(texts):
+                vectors = self._embed_batch([texts[i] for i in indices])
+                for i, vector in zip(indices, vectors):
+                    embeddings[i] = vector
             return embeddings
         except Exception as e:
             logger.error(f"Error embedding documents: {e}")
             raise
-    
+
     def embed_query(self, text: str) -> List[float]:
         """Embed query text."""
         try:
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=text,
-                dimensions=self.dimensions,
-                encoding_format="float"
-            )
-            return response.data[0].embedding
+            return self._embed_batch([text])[0]
         except Exception as e:
             logger.error(f"Error embedding query: {e}")
             raise
-    
+
     async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Async embed search docs."""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.embed_documents, texts)
-    
+        """Async embed search docs, running several batches concurrently."""
+        if not texts:
+            return []
+        try:
+            batches = self._make_batches(texts)
+            results = await asyncio.gather(
+                *(self._aembed_batch([texts[i] for i in indices]) for indices in batches)
+            )
+            embeddings: List[Optional[List[float]]] = [None] * len(texts)
+            for indices, vectors in zip(batches, results):
+                for i, vector in zip(indices, vectors):
+                    embeddings[i] = vector
+            logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+            return embeddings
+        except Exception as e:
+            logger.error(f"Error embedding documents: {e}")
+            raise
+
     async def aembed_query(self, text: str) -> List[float]:
         """Async embed query text."""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.embed_query, text)
\ No newline at end of file
+        try:
+            return (await self._aembed_batch([text]))[0]
+        except Exception as e:
+            logger.error(f"Error embedding query: {e}")
+            raise
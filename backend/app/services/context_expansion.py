@@ -0,0 +1,139 @@
+"""
+Small-to-big context expansion for parent-child chunks.
+
+Child chunks (RAG_CHILD_CHUNK_SIZE characters) are what gets embedded and matched; their
+``parent_index`` points at a section in document_sections. Retrieval keeps the best child per
+section, and this module then swaps the children for their sections. While the token budget
+allows, it also adds the adjacent sections (section_index ± 1 .. RAG_CONTEXT_NEIGHBOR_SECTIONS)
+of each hit, in hit order. All candidate sections are fetched in one batched query. Adjacent
+sections that are both selected are joined into one context block in document order.
+
+Chunks without a ``parent_index`` (documents ingested before parent-child chunking) pass
+through unchanged.
+"""
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from langchain_core.documents import Document as LangChainDocument
+from sqlalchemy import text
+
+from app.core.database import AsyncSessionLocal
+from app.services.compatible_embeddings import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SectionKey = Tuple[str, int]
+
+
+def parent_key(doc: LangChainDocument) -> Optional[SectionKey]:
+    """(document_id, section_index) of a child chunk's parent section, None for flat chunks"""
+    document_id = doc.metadata.get("document_id")
+    parent_index = doc.metadata.get("parent_index")
+    if document_id is None or parent_index is None:
+        return None
+    return str(document_id), int(parent_index)
+
+
+async def fetch_sections(windows: List[Tuple[str, int, int]]) -> Dict[SectionKey, Tuple[str, int]]:
+    """Sections within (document_id, low, high) index windows -> (content, token_count), one query"""
+    if not windows:
+        return {}
+    sql = text(
+        "SELECT DISTINCT s.document_id, s.section_index, s.content, s.token_count "
+        "FROM document_sections s "
+        "JOIN unnest(CAST(:document_ids AS uuid[]), CAST(:lows AS integer[]), CAST(:highs AS integer[])) "
+        "AS w(document_id, low, high) "
+        "ON s.document_id = w.document_id AND s.section_index BETWEEN w.low AND w.high"
+    )
+    params = {
+        "document_ids": [UUID(document_id) for document_id, _, _ in windows],
+        "lows": [low for _, low, _ in windows],
+        "highs": [high for _, _, high in windows]
+    }
+    # Own session: retrieval may run as a cancellable task next to the request's session
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(sql, params)).fetchall()
+    return {(str(row[0]), int(row[1])): (row[2], int(row[3])) for row in rows}
+
+
+async def expand_to_sections(
+    docs: List[LangChainDocument],
+    token_budget: int,
+    neighbors: int = 1
+) -> List[LangChainDocument]:
+    """
+    Replace matched child chunks with their parent sections (plus neighbors) within
+    ``token_budget`` estimated tokens. Keeps the order of ``docs``; the first hit is always
+    included, as its child chunk if even its section does not fit.
+    """
+    hits = [(doc, parent_key(doc)) for doc in docs]
+    keys = [key for _, key in hits if key is not None]
+    if not keys or token_budget <= 0:
+        return docs
+
+    try:
+        sections = await fetch_sections([
+            (document_id, section_index - neighbors, section_index + neighbors)
+            for document_id, section_index in dict.fromkeys(keys)
+        ])
+    except Exception as e:
+        logger.warning(f"Section lookup failed, using child chunks as context: {e}")
+        return docs
+
+    selected: Set[SectionKey] = set()
+    kept_children: Set[int] = set()
+    used = 0
+
+    # 1) The hits' own sections, best hit first
+    for position, (doc, key) in enumerate(hits):
+        if key in selected:
+            continue
+        if key is not None and key in sections:
+            tokens = sections[key][1]
+            if used + tokens <= token_budget:
+                selected.add(key)
+                used += tokens
+                continue
+        # No section stored (or it does not fit): fall back to the child chunk itself
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens <= token_budget or position == 0:
+            kept_children.add(position)
+            used += tokens
+
+    # 2) Neighboring sections, nearest first, while the budget lasts
+    for distance in range(1, neighbors + 1):
+        for _, key in hits:
+            if key not in selected:
+                continue
+            document_id, section_index = key
+            for neighbor in ((document_id, section_index + distance), (document_id, section_index - distance)):
+                if neighbor in sections and neighbor not in selected:
+                    tokens = sections[neighbor][1]
+                    if used + tokens <= token_budget:
+                        selected.add(neighbor)
+                        used += tokens
+
+    # 3) One context block per run of adjacent selected sections, in hit order
+    expanded: List[LangChainDocument] = []
+    emitted: Set[SectionKey] = set()
+    for position, (doc, key) in enumerate(hits):
+        if position in kept_children:
+            expanded.append(doc)
+            continue
+        if key is None or key not in selected or key in emitted:
+            continue
+        document_id, section_index = key
+        low, high = section_index, section_index
+        while (document_id, low - 1) in selected:
+            low -= 1
+        while (document_id, high + 1) in selected:
+            high += 1
+        run = [(document_id, i) for i in range(low, high + 1)]
+        emitted.update(run)
+        expanded.append(LangChainDocument(
+            page_content="\n".join(sections[section][0] for section in run),
+            metadata={**doc.metadata, "section_range": [low, high], "expanded": True}
+        ))
+    logger.debug(f"Expanded {len(docs)} chunks to {len(expanded)} context blocks (~{used} tokens)")
+    return expanded
@@ -0,0 +1,303 @@
+"""
+Process-wide Dify HTTP client.
+
+One pooled keep-alive ``httpx.AsyncClient`` (HTTP/2 when the ``h2`` package is installed)
+is shared by every DifyService. Blocking calls outside a conversation are retried with
+jittered exponential backoff, and a circuit breaker fails fast while Dify is down.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and gateway/upstream errors
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+class DifyUnavailableError(Exception):
+    """Raised without calling Dify while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Opens after N consecutive failures; lets one probe through after the reset timeout"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("Dify circuit breaker closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Dify circuit breaker opened after {self.consecutive_failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """The half-open probe ended without an outcome (e.g. cancelled); lets the next call probe"""
+        self._probe_in_flight = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened
+        }
+
+
+class LatencyStats:
+    """Call counts and latency percentiles over a bounded window"""
+
+    def __init__(self, window: int = 500):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, elapsed_ms: float, ok: bool) -> None:
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self._samples.append(elapsed_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 1)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(samples[-1], 1) if samples else 0.0
+        }
+
+
+def _parse_workflow_timeouts(value: str) -> Dict[int, float]:
+    """"6:60,2:180" -> {6: 60.0, 2: 180.0}"""
+    timeouts: Dict[int, float] = {}
+    for part in (value or "").split(","):
+        if ":" not in part:
+            continue
+        workflow_type, seconds = part.split(":", 1)
+        try:
+            timeouts[int(workflow_type.strip())] = float(seconds.strip())
+        except ValueError:
+            logger.warning(f"Ignoring invalid DIFY_WORKFLOW_TIMEOUTS entry: {part}")
+    return timeouts
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class DifyClient:
+    """Shared, pooled client for the Dify chat-messages API"""
+
+    def __init__(self):
+        self.base_url = settings.DIFY_BASE_URL
+        self.max_retries = max(0, settings.DIFY_MAX_RETRIES)
+        self.backoff_base = settings.DIFY_RETRY_BACKOFF
+        self.workflow_timeouts = _parse_workflow_timeouts(settings.DIFY_WORKFLOW_TIMEOUTS)
+        self.http2 = settings.DIFY_HTTP2 and _http2_available()
+        if settings.DIFY_HTTP2 and not self.http2:
+            logger.info("h2 package not installed; Dify client uses HTTP/1.1 keep-alive")
+        self.breaker = CircuitBreaker(settings.DIFY_BREAKER_FAILURES, settings.DIFY_BREAKER_RESET_SECONDS)
+        self.latency: Dict[int, LatencyStats] = {}
+        self.in_flight = 0
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=settings.DIFY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.DIFY_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30.0
+            ),
+            timeout=httpx.Timeout(settings.DIFY_REQUEST_TIMEOUT, connect=settings.DIFY_CONNECT_TIMEOUT)
+        )
+
+    def timeout_for(self, workflow_type: int, streaming: bool = False) -> float:
+        default = settings.DIFY_STREAM_TIMEOUT if streaming else settings.DIFY_REQUEST_TIMEOUT
+        return self.workflow_timeouts.get(workflow_type, default)
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {settings.DIFY_API_KEY}",
+            "Content-Type": "application/json"
+        }
+
+    def _stats_for(self, workflow_type: int) -> LatencyStats:
+        stats = self.latency.get(workflow_type)
+        if stats is None:
+            stats = self.latency[workflow_type] = LatencyStats()
+        return stats
+
+    def _check_breaker(self) -> bool:
+        """Raises while the breaker is open; True when this call is the half-open probe"""
+        if not self.breaker.allow():
+            raise DifyUnavailableError("Dify is unavailable (circuit breaker open)")
+        return self.breaker.state == CircuitBreaker.HALF_OPEN
+
+    async def post_blocking(self, workflow_type: int, payload: Dict[str, Any], retry: bool = True) -> httpx.Response:
+        """POST a blocking chat-message; transport errors and 429/5xx gateway errors are retried"""
+        stats = self._stats_for(workflow_type)
+        attempts = 1 + (self.max_retries if retry else 0)
+        timeout = self.timeout_for(workflow_type)
+        for attempt in range(attempts):
+            probe = self._check_breaker()
+            started = time.perf_counter()
+            self.in_flight += 1
+            recorded = False
+            try:
+                response = await self._client.post(
+                    f"{self.base_url}/chat-messages",
+                    headers=self._headers(),
+                    json=payload,
+                    timeout=timeout
+                )
+            except (httpx.TimeoutException, httpx.TransportError):
+                self.breaker.record_failure()
+                recorded = True
+                stats.record((time.perf_counter() - started) * 1000, ok=False)
+                if attempt == attempts - 1:
+                    raise
+            else:
+                ok = response.status_code < 500 and response.status_code != 429
+                if ok:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                recorded = True
+                stats.record((time.perf_counter() - started) * 1000, ok=response.status_code == 200)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == attempts - 1:
+                    return response
+            finally:
+                self.in_flight -= 1
+                if probe and not recorded:
+                    # Cancelled (wait_for timeout, client disconnect) or failed outside httpx:
+                    # never leave the half-open probe slot taken
+                    self.breaker.release()
+
+            stats.retries += 1
+            # Full jitter: sleep somewhere in [0, base * 2^attempt]
+            await asyncio.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+
+    @asynccontextmanager
+    async def stream(self, workflow_type: int, payload: Dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        """Open a streaming chat-message (never retried: output may already have reached the client)"""
+        probe = self._check_breaker()
+        stats = self._stats_for(workflow_type)
+        started = time.perf_counter()
+        self.in_flight += 1
+        ok = False
+        recorded = False
+        try:
+            async with self._client.stream(
+                "POST",
+                f"{self.base_url}/chat-messages",
+                headers=self._headers(),
+                json=payload,
+                timeout=self.timeout_for(workflow_type, streaming=True)
+            ) as response:
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                recorded = True
+                yield response
+                ok = response.status_code == 200
+        except (httpx.TimeoutException, httpx.TransportError):
+            self.breaker.record_failure()
+            recorded = True
+            raise
+        finally:
+            self.in_flight -= 1
+            if probe and not recorded:
+                self.breaker.release()
+            stats.record((time.perf_counter() - started) * 1000, ok=ok)
+
+    def stats(self) -> Dict[str, Any]:
+        pool: Dict[str, Any] = {
+            "http2": self.http2,
+            "max_connections": settings.DIFY_MAX_CONNECTIONS,
+            "in_flight": self.in_flight
+        }
+        # httpcore does not expose pool stats publicly; report them when the internals are available
+        connections = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(connections, "connections", None)
+        if connections is not None:
+            pool["open_connections"] = len(connections)
+            pool["idle_connections"] = sum(1 for c in connections if c.is_idle())
+        return {
+            "pool": pool,
+            "circuit_breaker": self.breaker.to_dict(),
+            "workflows": {str(k): v.to_dict() for k, v in sorted(self.latency.items())}
+        }
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+# Global client instance
+_dify_client: Optional[DifyClient] = None
+
+
+def get_dify_client() -> DifyClient:
+    """Get global Dify client instance"""
+    global _dify_client
+    if _dify_client is None:
+        _dify_client = DifyClient()
+    return _dify_client
+
+
+async def close_dify_client() -> None:
+    """Close the shared Dify connection pool (application shutdown)"""
+    global _dify_client
+    if _dify_client is not None:
+        await _dify_client.aclose()
+        _dify_client = None
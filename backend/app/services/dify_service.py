@@ -2,13 +2,13 @@
 Dify Workflow Service
 Handles integration with Dify workflows for HR automation tasks
 """
-import json
 import uuid
 from typing import Dict, Any, AsyncGenerator, Optional
 import httpx
 from fastapi import HTTPException
 from app.core.config import settings
 from app.core.logging import logger
+from app.services.dify_client import DifyUnavailableError, get_dify_client
 
 
 class DifyService:
@@ -21,6 +21,9 @@ class DifyService:
         
         if not self.api_key:
             raise ValueError("DIFY_API_KEY is required but not configured")
+
+        # Pooled keep-alive connections shared by every DifyService instance
+        self.client = get_dify_client()
     
     async def call_workflow_stream(
         self,
@@ -55,49 +58,37 @@ class DifyService:
                 "user": self.user_id
             }
             
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
             logger.info(f"Calling Dify workflow type {workflow_type} with query: {query[:100]}...")
             
-            # Make streaming request to Dify
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/chat-messages",
-                    headers=headers,
-                    json=request_data
-                ) as response:
-                    
-                    if response.status_code != 200:
-                        error_text = await response.aread()
-                        logger.error(f"Dify API error: {response.status_code} - {error_text}")
-                        raise HTTPException(
-                            status_code=response.status_code,
-                            detail=f"Dify API error: {error_text.decode()}"
-                        )
-                    
-                    # Stream the response
-                    async for chunk in response.aiter_lines():
-                        if chunk:
-                            # Remove 'data: ' prefix if present
-                            if chunk.startswith("data: "):
-                                chunk = chunk[6:]
-                            
-                            # Skip empty lines and [DONE] markers
-                            if not chunk or chunk == "[DONE]":
-                                continue
-                            
-                            try:
-                                # Parse JSON chunk
-                                data = json.loads(chunk)
-                                yield chunk
-                            except json.JSONDecodeError:
-                                # If not valid JSON, yield as is
-                                yield chunk
+            # Make streaming request to Dify over the shared connection pool
+            async with self.client.stream(workflow_type, request_data) as response:
+                
+                if response.status_code != 200:
+                    error_text = await response.aread()
+                    logger.error(f"Dify API error: {response.status_code} - {error_text}")
+                    raise HTTPException(
+                        status_code=response.status_code,
+                        detail=f"Dify API error: {error_text.decode()}"
+                    )
+                
+                # Stream the response
+                async for chunk in response.aiter_lines():
+                    if chunk:
+                        # Remove 'data: ' prefix if present
+                        if chunk.startswith("data: "):
+                            chunk = chunk[6:]
+                        
+                        # Skip empty lines and [DONE] markers
+                        if not chunk or chunk == "[DONE]":
+                            continue
+                        
+                        yield chunk
                                 
+        except HTTPException:
+            raise
+        except DifyUnavailableError as e:
+            logger.error(str(e))
+            raise HTTPException(status_code=503, detail=str(e))
         except httpx.TimeoutException:
             logger.error("Dify API request timeout")
             raise HTTPException(status_code=504, detail="Dify API request timeout")
@@ -140,30 +131,30 @@ class DifyService:
                 "user": self.user_id
             }
             
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
             logger.info(f"Calling Dify workflow type {workflow_type} (sync) with query: {query[:100]}...")
             
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat-messages",
-                    headers=headers,
-                    json=request_data
+            # Only stateless calls are retried: a retry inside a conversation could append twice
+            response = await self.client.post_blocking(
+                workflow_type,
+                request_data,
+                retry=not conversation_id
+            )
+            
+            if response.status_code != 200:
+                error_text = response.text
+                logger.error(f"Dify API error: {response.status_code} - {error_text}")
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail=f"Dify API error: {error_text}"
                 )
+            
+            return response.json()
                 
-                if response.status_code != 200:
-                    error_text = response.text
-                    logger.error(f"Dify API error: {response.status_code} - {error_text}")
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=f"Dify API error: {error_text}"
-                    )
-                
-                return response.json()
-                
+        except HTTPException:
+            raise
+        except DifyUnavailableError as e:
+            logger.error(str(e))
+            raise HTTPException(status_code=503, detail=str(e))
         except httpx.TimeoutException:
             logger.error("Dify API request timeout")
             raise HTTPException(status_code=504, detail="Dify API request timeout")
@@ -174,6 +165,10 @@ class DifyService:
             logger.error(f"Unexpected error in Dify workflow call: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
+    def get_client_stats(self) -> Dict[str, Any]:
+        """Connection pool, circuit breaker and per-workflow latency stats"""
+        return self.client.stats()
+    
     def get_workflow_type_description(self, workflow_type: int) -> str:
         """Get description for workflow type"""
         workflow_descriptions = {
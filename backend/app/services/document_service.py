@@ -13,6 +13,7 @@ from sqlalchemy.orm import selectinload
 from app.models.document import Document
 from app.models.knowledge_base import KnowledgeBase
 from app.services.llm_service import LLMService
+from app.services.sparse_index import get_sparse_index_manager
 from app.schemas.document import DocumentCreate, DocumentUpdate
 from app.core.config import settings
 
@@ -210,6 +211,9 @@ class DocumentService:
             )
             
             await self.db.commit()
+            await get_sparse_index_manager().remove_document(
+                f"document_chunks_{user_id}".replace("-", "_"), document_id
+            )
             logger.info(f"Deleted document {document_id}")
             return True
             
@@ -0,0 +1,304 @@
+"""
+Content-addressed embedding cache.
+
+Vectors are keyed by (model, dimensions, SHA256 of the normalized text) and served from
+two tiers: an in-process LRU bounded by memory, and a persistent Postgres table shared
+by all workers. Only texts missing from both tiers reach the remote embedding API.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import text, bindparam
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-entry bookkeeping cost (OrderedDict node, key string, ndarray header)
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+def normalize_cache_text(value: str) -> str:
+    """Normalize text so trivially different inputs share one cache entry"""
+    value = unicodedata.normalize("NFKC", value or "")
+    return re.sub(r"\s+", " ", value).strip()
+
+
+def text_hash(value: str) -> str:
+    """SHA256 of the normalized text"""
+    return hashlib.sha256(normalize_cache_text(value).encode("utf-8")).hexdigest()
+
+
+class LRUEmbeddingCache:
+    """Thread-safe in-process LRU of float32 vectors, evicting by total byte size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        size = vector.nbytes + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            existing = self._entries.pop(key, None)
+            if existing is not None:
+                self._bytes -= existing.nbytes + _ENTRY_OVERHEAD_BYTES
+            self._entries[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes + _ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions
+            }
+
+
+class PostgresEmbeddingStore:
+    """Persistent tier backed by the ``embedding_cache`` table"""
+
+    def __init__(self, max_rows: int, prune_interval: int):
+        self.max_rows = max_rows
+        self.prune_interval = prune_interval
+        self._writes_since_prune = 0
+        self._prune_lock = asyncio.Lock()
+        self.evictions = 0
+
+    async def get_many(self, model: str, dimensions: int, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch vectors for the given hashes, touching last_accessed_at in the same round-trip"""
+        if not hashes:
+            return {}
+        query = text(
+            "UPDATE embedding_cache SET last_accessed_at = :now "
+            "WHERE model = :model AND dimensions = :dimensions AND text_hash IN :hashes "
+            "RETURNING text_hash, embedding"
+        ).bindparams(bindparam("hashes", expanding=True))
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(query, {
+                "now": datetime.utcnow(),
+                "model": model,
+                "dimensions": dimensions,
+                "hashes": hashes
+            })
+            rows = result.fetchall()
+            await session.commit()
+        return {row[0]: np.frombuffer(row[1], dtype=np.float32) for row in rows}
+
+    async def put_many(self, model: str, dimensions: int, items: Dict[str, np.ndarray]) -> None:
+        """Insert new vectors; concurrent writers of the same key are harmless"""
+        if not items:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {
+                "model": model,
+                "dimensions": dimensions,
+                "text_hash": key,
+                "embedding": vector.astype(np.float32).tobytes(),
+                "now": now
+            }
+            for key, vector in items.items()
+        ]
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                text(
+                    "INSERT INTO embedding_cache "
+                    "(model, dimensions, text_hash, embedding, created_at, last_accessed_at) "
+                    "VALUES (:model, :dimensions, :text_hash, :embedding, :now, :now) "
+                    "ON CONFLICT DO NOTHING"
+                ),
+                rows
+            )
+            await session.commit()
+
+        self._writes_since_prune += len(rows)
+        if self.max_rows > 0 and self._writes_since_prune >= self.prune_interval:
+            self._writes_since_prune = 0
+            await self.prune()
+
+    async def prune(self) -> int:
+        """Evict least recently used rows beyond max_rows"""
+        if self._prune_lock.locked():
+            return 0
+        async with self._prune_lock:
+            async with AsyncSessionLocal() as session:
+                total = (await session.execute(text("SELECT count(*) FROM embedding_cache"))).scalar() or 0
+                excess = total - self.max_rows
+                if excess <= 0:
+                    return 0
+                result = await session.execute(
+                    text(
+                        "DELETE FROM embedding_cache WHERE ctid IN ("
+                        "  SELECT ctid FROM embedding_cache ORDER BY last_accessed_at ASC LIMIT :excess"
+                        ")"
+                    ),
+                    {"excess": excess}
+                )
+                await session.commit()
+                deleted = result.rowcount or 0
+            self.evictions += deleted
+            logger.info(f"Embedding cache pruned {deleted} rows (max_rows={self.max_rows})")
+            return deleted
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that consults the LRU and persistent tiers before the remote API"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        memory_bytes: Optional[int] = None,
+        persistent: Optional[bool] = None
+    ):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", "unknown")
+        self.dimensions = getattr(embeddings, "dimensions", settings.VECTOR_DIMENSION)
+
+        self.memory = LRUEmbeddingCache(
+            memory_bytes if memory_bytes is not None else settings.EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024
+        )
+        use_persistent = settings.EMBEDDING_CACHE_PERSISTENT if persistent is None else persistent
+        self.store = PostgresEmbeddingStore(
+            max_rows=settings.EMBEDDING_CACHE_MAX_ROWS,
+            prune_interval=settings.EMBEDDING_CACHE_PRUNE_INTERVAL
+        ) if use_persistent else None
+
+        self._counters = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "persistent_errors": 0
+        }
+        self._counter_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Expose attributes of the wrapped embeddings (batch settings, clients, ...)
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        if amount:
+            with self._counter_lock:
+                self._counters[name] += amount
+
+    def _lookup_memory(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+        keys = [text_hash(t) for t in texts]
+        vectors = [self.memory.get(k) for k in keys]
+        self._count("memory_hits", sum(1 for v in vectors if v is not None))
+        return vectors, keys
+
+    @staticmethod
+    def _unique_missing(keys: List[str], vectors: List[Optional[np.ndarray]], texts: List[str]) -> Dict[str, str]:
+        """Map each missing key to one representative text, deduplicating within the request"""
+        missing: Dict[str, str] = {}
+        for key, vector, value in zip(keys, vectors, texts):
+            if vector is None and key not in missing:
+                missing[key] = value
+        return missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Sync path: only the in-process tier is consulted"""
+        vectors, keys = self._lookup_memory(texts)
+        missing = self._unique_missing(keys, vectors, texts)
+        if missing:
+            self._count("misses", len(missing))
+            fresh = self.embeddings.embed_documents(list(missing.values()))
+            resolved = {}
+            for key, vector in zip(missing.keys(), fresh):
+                arr = np.asarray(vector, dtype=np.float32)
+                self.memory.put(key, arr)
+                resolved[key] = arr
+            vectors = [v if v is not None else resolved[k] for v, k in zip(vectors, keys)]
+        return [v.tolist() for v in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async path: memory tier, then persistent tier, then the remote API"""
+        if not texts:
+            return []
+        vectors, keys = self._lookup_memory(texts)
+        missing = self._unique_missing(keys, vectors, texts)
+        resolved: Dict[str, np.ndarray] = {}
+
+        if missing and self.store is not None:
+            try:
+                stored = await self.store.get_many(self.model, self.dimensions, list(missing.keys()))
+            except Exception as e:
+                self._count("persistent_errors")
+                logger.warning(f"Embedding cache lookup failed, falling back to API: {e}")
+                stored = {}
+            self._count("persistent_hits", len(stored))
+            for key, vector in stored.items():
+                self.memory.put(key, vector)
+                resolved[key] = vector
+                missing.pop(key, None)
+
+        if missing:
+            self._count("misses", len(missing))
+            fresh = await self.embeddings.aembed_documents(list(missing.values()))
+            new_items: Dict[str, np.ndarray] = {}
+            for key, vector in zip(missing.keys(), fresh):
+                arr = np.asarray(vector, dtype=np.float32)
+                self.memory.put(key, arr)
+                resolved[key] = arr
+                new_items[key] = arr
+            if self.store is not None:
+                try:
+                    await self.store.put_many(self.model, self.dimensions, new_items)
+                except Exception as e:
+                    self._count("persistent_errors")
+                    logger.warning(f"Embedding cache write failed: {e}")
+
+        return [(v if v is not None else resolved[k]).tolist() for v, k in zip(vectors, keys)]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss counters and tier sizes"""
+        with self._counter_lock:
+            counters = dict(self._counters)
+        lookups = counters["memory_hits"] + counters["persistent_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["persistent_hits"]
+        return {
+            "model": self.model,
+            "dimensions": self.dimensions,
+            **counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory": self.memory.stats(),
+            "persistent": {
+                "enabled": self.store is not None,
+                "max_rows": self.store.max_rows if self.store else 0,
+                "evictions": self.store.evictions if self.store else 0
+            }
+        }
@@ -2,10 +2,12 @@
 Singleton Embedding Service to avoid repeated initialization of OpenAIEmbeddings
 """
 import logging
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.core.config import settings
 from .compatible_embeddings import CompatibleOpenAIEmbeddings
+from .embedding_cache import CachedEmbeddings
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +43,10 @@ class EmbeddingService:
                 model=model
             )
             
+            # Serve repeated texts (re-uploads, hot questions) from the embedding cache
+            if settings.EMBEDDING_CACHE_ENABLED:
+                self.embeddings = CachedEmbeddings(self.embeddings)
+            
             # Initialize text splitter
             self.text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=300,
@@ -55,10 +61,16 @@ class EmbeddingService:
             logger.error(f"Failed to initialize EmbeddingService: {e}")
             raise
     
-    def get_embeddings(self) -> CompatibleOpenAIEmbeddings:
-        """Get the Compatible OpenAI embeddings instance"""
+    def get_embeddings(self) -> Embeddings:
+        """Get the (cached) Compatible OpenAI embeddings instance"""
         return self.embeddings
     
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get embedding cache hit/miss counters"""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return {"enabled": True, **self.embeddings.stats()}
+        return {"enabled": False}
+    
     def get_text_splitter(self) -> RecursiveCharacterTextSplitter:
         """Get the text splitter instance"""
         return self.text_splitter
@@ -4,29 +4,36 @@ Enhanced document service with LangChain integration for document processing and
 import logging
 import asyncio
 import os
-import hashlib
-from typing import List, Optional, Dict, Any, BinaryIO
+import re
+import time
+import uuid
+from typing import List, Optional, Dict, Any, BinaryIO, Tuple, Union
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete, desc, func, text
 from sqlalchemy.orm import selectinload
+from fastapi import UploadFile
 
 # LangChain imports
 from langchain_core.documents import Document as LangChainDocument
-from langchain_postgres import PGVector
 
 # Document processing imports
 import PyPDF2
 from docx import Document as DocxDocument
-import tempfile
 
 from app.models.document import Document
+from app.models.document_section import DocumentSection
 from app.models.knowledge_base import KnowledgeBase
 from app.services.llm_service import LLMService
 from app.services.embedding_service import get_embedding_service
+from app.services.compatible_embeddings import estimate_tokens
+from app.services.vector_store_registry import get_vector_store_registry
+from app.services.semantic_cache import get_semantic_cache
+from app.services.sparse_index import get_sparse_index_manager
 from app.schemas.document import DocumentCreate, DocumentUpdate
 from app.core.config import settings
-from app.utils.text_utils import extract_text_content
+from app.services.extraction_service import get_extraction_engine
+from app.utils.file_utils import StoredFile, save_upload_stream
 
 logger = logging.getLogger(__name__)
 
@@ -43,8 +50,8 @@ class EnhancedDocumentService:
         self.embeddings = self.embedding_service.get_embeddings()
         self.text_splitter = self.embedding_service.get_text_splitter()
 
-        # Database connection string for PGVector (use psycopg2 for sync connection)
-        self.connection_string = settings.DATABASE_URL
+        # Shared, pooled PGVector handles
+        self.vector_stores = get_vector_store_registry()
 
         logger.info("Enhanced document service initialized with shared embedding service")
 
@@ -236,6 +243,59 @@ class EnhancedDocumentService:
         normalized = [c.strip() for c in normalized if c and c.strip()]
         return normalized
 
+    def _split_children(self, section: str, max_length: int) -> List[str]:
+        """将父段落按句子边界切分为不超过 max_length 的子片段（用于向量化）"""
+        if len(section) <= max_length:
+            return [section]
+        children: List[str] = []
+        current = ""
+        for sentence in re.split(r"(?<=[。！？；!?;\n])", section):
+            # 超长句子直接按长度切分
+            while len(sentence) > max_length:
+                if current:
+                    children.append(current)
+                    current = ""
+                children.append(sentence[:max_length])
+                sentence = sentence[max_length:]
+            if current and len(current) + len(sentence) > max_length:
+                children.append(current)
+                current = sentence
+            else:
+                current += sentence
+        if current:
+            children.append(current)
+        children = [c.strip() for c in children if c.strip()]
+        return self._merge_short_chunks(children, min_length=50, max_length=max_length)
+
+    async def split_hierarchy(self, content: str) -> Tuple[List[str], List[str], Optional[List[int]]]:
+        """
+        Split content into parent sections and the child chunks that get embedded.
+        Returns (sections, chunks, parent index per chunk); without parent-child chunking the
+        sections themselves are the chunks and no sections are stored.
+        """
+        sections = await self._split_text(content)
+        if not settings.RAG_PARENT_CHILD_ENABLED:
+            return [], sections, None
+        chunks: List[str] = []
+        parent_indexes: List[int] = []
+        for section_index, section in enumerate(sections):
+            for child in self._split_children(section, settings.RAG_CHILD_CHUNK_SIZE):
+                chunks.append(child)
+                parent_indexes.append(section_index)
+        return sections, chunks, parent_indexes
+
+    def add_sections(self, document: Document, sections: List[str]) -> None:
+        """Stage a document's parent sections on the session; committed together with its chunks"""
+        self.db.add_all([
+            DocumentSection(
+                document_id=document.id,
+                section_index=i,
+                content=section,
+                token_count=estimate_tokens(section)
+            )
+            for i, section in enumerate(sections)
+        ])
+
     async def upload_document(
         self,
         file,  # UploadFile object
@@ -255,7 +315,7 @@ class EnhancedDocumentService:
                 kb_id = None
 
         return await self.upload_and_process_document(
-            file=file.file,
+            file=file,
             filename=file.filename,
             user_id=user_id,
             knowledge_base_id=kb_id,
@@ -265,7 +325,7 @@ class EnhancedDocumentService:
 
     async def upload_and_process_document(
         self,
-        file: BinaryIO,
+        file: Union[UploadFile, BinaryIO],
         filename: str,
         user_id: UUID,
         knowledge_base_id: Optional[UUID] = None,
@@ -273,141 +333,163 @@ class EnhancedDocumentService:
         tags: Optional[List[str]] = None
     ) -> Document:
         """Upload and process document with full text extraction and vectorization"""
+        stored = None
         try:
-            # Read file content
-            file_content = file.read()
-            file.seek(0)  # Reset file pointer
-
-            # Generate file hash
-            file_hash = hashlib.sha256(file_content).hexdigest()
+            # Stream to the upload dir once, hashing and size-checking on the way
+            stored = await self.save_upload(file, filename, user_id)
 
             # Check if document already exists
-            existing_doc = await self._get_document_by_hash(file_hash, user_id)
+            existing_doc = await self._get_document_by_hash(stored.file_hash, user_id)
             if existing_doc:
-                logger.info(f"Document with hash {file_hash} already exists")
+                logger.info(f"Document with hash {stored.file_hash} already exists")
+                stored.discard()
                 return existing_doc
 
             # Determine MIME type
             mime_type = self._get_mime_type(filename)
 
-            # Save file temporarily for processing
-            temp_file_path = await self._save_temp_file(file_content, filename)
-
-            try:
-                # Extract text content
-                extracted_content = await extract_text_content(temp_file_path, mime_type)
-
-                # Generate summary
-                summary = await self.llm_service.summarize_text(extracted_content) if extracted_content else None
-
-                # Generate embedding for the document
-                # document_embedding = await self.embeddings.aembed_query(extracted_content) if extracted_content else None
-
-                # Save file permanently
-                file_path = await self._save_file(file_content, filename, user_id)
-
-                # Create document record
-                document = Document(
-                    filename=filename,
-                    original_filename=filename,
-                    file_path=file_path,
-                    file_size=len(file_content),
-                    file_hash=file_hash,
-                    mime_type=mime_type,
-                    extracted_content=extracted_content,
-                    summary=summary,
-                    embedding=None,  # We use PGVector for embeddings now
-                    category=category,
-                    tags=tags,
-                    user_id=user_id,
-                    knowledge_base_id=knowledge_base_id
-                )
-
-                self.db.add(document)
-                await self.db.commit()
-                await self.db.refresh(document)
+            # Extract text content from the stored file in the extraction process pool
+            extracted_content = await get_extraction_engine().extract(mime_type, file_path=stored.path)
+
+            # Generate summary
+            summary = await self.llm_service.summarize_text(extracted_content) if extracted_content else None
+
+            # Generate embedding for the document
+            # document_embedding = await self.embeddings.aembed_query(extracted_content) if extracted_content else None
+
+            # Create document record
+            document = Document(
+                filename=filename,
+                original_filename=filename,
+                file_path=stored.path,
+                file_size=stored.file_size,
+                file_hash=stored.file_hash,
+                mime_type=mime_type,
+                extracted_content=extracted_content,
+                summary=summary,
+                embedding=None,  # We use PGVector for embeddings now
+                category=category,
+                tags=tags,
+                user_id=user_id,
+                knowledge_base_id=knowledge_base_id
+            )
 
-                # Create document chunks using PGVector
-                if extracted_content:
-                    await self._create_document_chunks_with_pgvector(document, extracted_content)
+            self.db.add(document)
+            await self.db.commit()
+            await self.db.refresh(document)
+            stored = None  # Owned by the document from here on
 
-                logger.info(f"Document uploaded and processed successfully: {document.id}")
-                return document
+            # Create document chunks using PGVector
+            if extracted_content:
+                await self._create_document_chunks_with_pgvector(document, extracted_content)
 
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            logger.info(f"Document uploaded and processed successfully: {document.id}")
+            return document
 
         except Exception as e:
             logger.error(f"Error uploading document: {e}")
             await self.db.rollback()
+            if stored is not None:
+                stored.discard()
             raise
 
-    async def _create_document_chunks_with_pgvector(self, document: Document, content: str) -> None:
-        """Create document chunks using PGVector for embeddings"""
+    @staticmethod
+    def chunks_collection_name(user_id: UUID) -> str:
+        """PGVector collection holding a user's document chunks"""
+        return f"document_chunks_{user_id}".replace("-", "_")
+
+    def build_chunk_metadatas(
+        self,
+        document: Document,
+        text_chunks: List[str],
+        parent_indexes: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """cmetadata for each chunk row in langchain_pg_embedding"""
+        metadatas = [
+            {
+                "document_id": str(document.id),
+                "knowledge_base_id": str(document.knowledge_base_id),
+                "chunk_index": i,
+                "chunk_size": len(chunk_text),
+                "filename": document.filename,
+                "category": document.category or "general",
+                "file_path": document.file_path,
+                "mime_type": document.mime_type,
+                "source_type": "content",
+                "collection_name": self.chunks_collection_name(document.user_id)
+            }
+            for i, chunk_text in enumerate(text_chunks)
+        ]
+        if parent_indexes is not None:
+            # Links a child chunk to its section in document_sections
+            for metadata, parent_index in zip(metadatas, parent_indexes):
+                metadata["parent_index"] = parent_index
+        return metadatas
+
+    async def _create_document_chunks_with_pgvector(
+        self,
+        document: Document,
+        content: str,
+        timings: Optional[Dict[str, float]] = None
+    ) -> int:
+        """Create document chunks using PGVector for embeddings.
+
+        Returns the number of chunks stored; per-stage milliseconds are added to ``timings`` if given.
+        """
         try:
             # text_chunks = self.get_semantic_split_points(content)
-            text_chunks = await self._split_text(content)
+            stage_started = time.perf_counter()
+            sections, text_chunks, parent_indexes = await self.split_hierarchy(content)
+            if timings is not None:
+                timings["split"] = round((time.perf_counter() - stage_started) * 1000, 1)
             if not text_chunks:
                 logger.warning(f"No text chunks provided for document {document.id}")
-                return
+                return 0
 
             # Create LangChain documents with metadata (content chunks)
-            langchain_docs = []
-            for i, chunk_text in enumerate(text_chunks):
-                doc = LangChainDocument(
-                    page_content=chunk_text,
-                    metadata={
-                        "document_id": str(document.id),
-                        "knowledge_base_id": str(document.knowledge_base_id),
-                        "chunk_index": i,
-                        "chunk_size": len(chunk_text),
-                        "filename": document.filename,
-                        "category": document.category or "general",
-                        "file_path": document.file_path,
-                        "mime_type": document.mime_type,
-                        "source_type": "content"
-                    }
+            langchain_docs = [
+                LangChainDocument(page_content=chunk_text, metadata=metadata)
+                for chunk_text, metadata in zip(
+                    text_chunks, self.build_chunk_metadatas(document, text_chunks, parent_indexes)
                 )
-                langchain_docs.append(doc)
-
-            # Get or create vector store for chunks only
-            chunks_collection = f"document_chunks_{document.user_id}".replace("-", "_")
+            ]
+            self.add_sections(document, sections)
 
-            vector_store = PGVector(
-                connection=self.connection_string,
-                embeddings=self.embeddings,
-                collection_name=chunks_collection,
-                use_jsonb=True
+            chunks_collection = self.chunks_collection_name(document.user_id)
+            logger.info(
+                f"Adding {len(langchain_docs)} chunk docs to PGVector collection: {chunks_collection}"
             )
 
-            if vector_store:
-                logger.info(
-                    f"Adding {len(langchain_docs)} chunk docs to PGVector collection: {chunks_collection}"
-                )
-                
-                # Inject collection metadata before adding
-                for d in langchain_docs:
-                    md = dict(d.metadata or {})
-                    md["collection_name"] = chunks_collection
-                    d.metadata = md
-
-                # Add documents to vector store (synchronous operation)
-                try:
-                    vector_store.add_documents(langchain_docs)
-                    logger.info(
-                        f"Successfully added {len(langchain_docs)} chunk docs to PGVector collection: {chunks_collection}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error adding documents to PGVector: {e}")
-                    raise
-                
-                # No longer creating DocumentChunk records - using langchain_pg_embedding directly
-                await self.db.commit()
+            # Embed all chunks through the batched async path, then insert the vectors
+            try:
+                texts = [d.page_content for d in langchain_docs]
+                metadatas = [d.metadata for d in langchain_docs]
+                ids = [str(uuid.uuid4()) for _ in texts]
+                stage_started = time.perf_counter()
+                vectors = await self.embeddings.aembed_documents(texts)
+                if timings is not None:
+                    timings["embed"] = round((time.perf_counter() - stage_started) * 1000, 1)
+                stage_started = time.perf_counter()
+                # Writes the jieba-segmented search_tsv along with the rows
+                await self.vector_stores.bulk_insert(chunks_collection, texts, vectors, metadatas, ids=ids)
+                await get_sparse_index_manager().add_chunks(chunks_collection, ids, texts, metadatas)
+                if timings is not None:
+                    timings["store"] = round((time.perf_counter() - stage_started) * 1000, 1)
                 logger.info(
-                    f"Created {len(text_chunks)} chunks for document {document.id}"
+                    f"Successfully added {len(langchain_docs)} chunk docs to PGVector collection: {chunks_collection}"
                 )
+                # New content in this knowledge base makes cached answers stale
+                get_semantic_cache().invalidate(document.user_id, document.knowledge_base_id)
+            except Exception as e:
+                logger.error(f"Error adding documents to PGVector: {e}")
+                raise
+
+            # No longer creating DocumentChunk records - using langchain_pg_embedding directly
+            await self.db.commit()
+            logger.info(
+                f"Created {len(text_chunks)} chunks for document {document.id}"
+            )
+            return len(text_chunks)
                 
         except Exception as e:
             logger.error(f"Error creating document chunks: {e}")
@@ -446,14 +528,6 @@ class EnhancedDocumentService:
         try:
             collection_name = f"document_chunks_{user_id}".replace("-", "_")
             
-            # Connect to vector store
-            vector_store = PGVector(
-                connection=self.connection_string,
-                embeddings=self.embeddings,
-                collection_name=collection_name,
-                use_jsonb=True
-            )
-            
             # Build filter conditions
             filter_conditions = {}
             if knowledge_base_id:
@@ -461,9 +535,11 @@ class EnhancedDocumentService:
             if category:
                 filter_conditions["category"] = category
             
-            # Perform similarity search
-            results = vector_store.similarity_search_with_score(
-                query=query,
+            # Perform similarity search (cosine distance) through the managed ANN index
+            query_embedding = await self.embeddings.aembed_query(query)
+            results = await self.vector_stores.similarity_search(
+                collection_name,
+                query_embedding,
                 k=limit,
                 filter=filter_conditions if filter_conditions else None
             )
@@ -618,15 +694,14 @@ class EnhancedDocumentService:
         """Delete a document and its chunks from langchain_pg_embedding"""
         try:
             # Delete document chunks from langchain_pg_embedding table
-            delete_query = text("""
-                DELETE FROM langchain_pg_embedding 
-                WHERE cmetadata->>'document_id' = :document_id
-            """)
-            await self.db.execute(delete_query, {"document_id": str(document.id)})
+            await self.delete_document_chunks(document.id, document.user_id)
             
             # Delete the document
             await self.db.delete(document)
             await self.db.commit()
+
+            # Cached answers may cite the deleted document
+            get_semantic_cache().invalidate(document.user_id, document.knowledge_base_id)
             
             # Clean up file if it exists
             if document.file_path and os.path.exists(document.file_path):
@@ -639,6 +714,21 @@ class EnhancedDocumentService:
             await self.db.rollback()
             raise
 
+    async def delete_document_chunks(self, document_id: UUID, user_id: Optional[UUID] = None) -> None:
+        """Delete all chunks and sections of a document (not committed); makes re-chunking idempotent"""
+        delete_query = text("""
+            DELETE FROM langchain_pg_embedding 
+            WHERE cmetadata->>'document_id' = :document_id
+        """)
+        await self.db.execute(delete_query, {"document_id": str(document_id)})
+        await self.db.execute(
+            text("DELETE FROM document_sections WHERE document_id = :document_id"),
+            {"document_id": document_id}
+        )
+        if user_id is not None:
+            # A rolled-back delete is caught by the sparse index's row-count refresh
+            await get_sparse_index_manager().remove_document(self.chunks_collection_name(user_id), document_id)
+
     async def _get_document_by_hash(
         self,
         file_hash: str,
@@ -666,39 +756,20 @@ class EnhancedDocumentService:
         }
         return mime_types.get(extension, 'application/octet-stream')
 
-    async def _save_temp_file(self, content: bytes, filename: str) -> str:
-        """Save file temporarily for processing"""
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, f"temp_{filename}")
-        
-        with open(temp_file_path, 'wb') as f:
-            f.write(content)
-        
-        return temp_file_path
-
-    async def _save_file(self, content: bytes, filename: str, user_id: UUID) -> str:
-        """Save file permanently"""
-        # Create user-specific upload directory
-        upload_dir = os.path.join(settings.UPLOAD_DIR, str(user_id))
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        file_path = os.path.join(upload_dir, filename)
-        counter = 1
-        base_name, extension = os.path.splitext(filename)
-        
-        while os.path.exists(file_path):
-            new_filename = f"{base_name}_{counter}{extension}"
-            file_path = os.path.join(upload_dir, new_filename)
-            counter += 1
-        
-        # Save file
-        with open(file_path, 'wb') as f:
-            f.write(content)
-        
-        return file_path
-
-    
+    async def save_upload(
+        self,
+        file: Union[UploadFile, BinaryIO],
+        filename: str,
+        user_id: UUID,
+        max_size: Optional[int] = None
+    ) -> StoredFile:
+        """Stream an upload into the user's upload directory (see file_utils.save_upload_stream)"""
+        return await save_upload_stream(
+            file,
+            os.path.join(settings.UPLOAD_DIR, str(user_id)),
+            filename=filename,
+            max_size=max_size or settings.MAX_FILE_SIZE
+        )
 
     async def get_document_by_id(
         self,
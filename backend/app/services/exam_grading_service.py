@@ -0,0 +1,306 @@
+"""
+Exam grading engine.
+
+Blank answers score 0 and single/multiple choice questions are graded locally against
+``Question.correct_answer``; only the remaining (short-answer) questions go to the Dify grading
+workflow (type=6), concurrently, bounded by a semaphore, with a per-question timeout.
+A question that fails or times out scores 0 and the rest of the exam is still graded.
+"""
+import asyncio
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.dify_service import DifyService
+from app.utils.text_utils import split_options
+
+logger = logging.getLogger(__name__)
+
+GRADING_WORKFLOW_TYPE = 6
+
+SINGLE_CHOICE_TYPES = {"单选", "单选题", "single", "single_choice"}
+MULTIPLE_CHOICE_TYPES = {"多选", "多选题", "multiple", "multiple_choice"}
+BLANK_ANSWERS = {"", "未作答"}
+
+# "A", "A.", "A、", "A)" ...
+_LETTER_PREFIX = re.compile(r"^([A-Z])(?:$|[.．、:：)）])")
+# "A. 选项文本"
+_LABELLED_OPTION = re.compile(r"^([A-Z])\s*[.．、:：)）]\s*(.+)$")
+_ANSWER_SEPARATORS = re.compile(r"[,，、;；/\s]+")
+
+
+def build_question_infos(questions, student_answers: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build the per-question grading payload (with reference answers) in exam order"""
+    question_infos = []
+    for question in sorted(questions, key=lambda x: x.order_index):
+        # 使用题目的实际ID来匹配答案
+        student_answer = student_answers.get(str(question.id), "未作答")
+        question_infos.append({
+            "题目编号": question.order_index,
+            "题目类型": question.question_type,
+            "题目内容": question.question_text,
+            "选项": question.options or [],
+            "标准答案": question.correct_answer,
+            "解析": question.explanation,
+            "分值": question.score,
+            "考生答案": student_answer
+        })
+    return question_infos
+
+
+def clamp_score(score: float, max_score: Any) -> float:
+    """Bound a score to [0, max_score] when the question has a valid max score"""
+    try:
+        max_value = float(max_score) if max_score is not None else None
+    except (TypeError, ValueError):
+        max_value = None
+    if max_value is not None:
+        score = max(0.0, min(score, max_value))
+    return score
+
+
+def build_grading_query(q_info: Dict[str, Any]) -> str:
+    """为每道题构造精简评分提示，减少上下文噪声"""
+    parts = [
+        "请对以下试题进行评分，仅返回该题的得分(数字即可)：",
+        f"题目类型：{q_info['题目类型']}",
+        f"题目内容：{q_info['题目内容']}",
+    ]
+    if q_info.get("选项"):
+        parts.append(f"选项：{q_info['选项']}")
+    parts.extend([
+        f"标准答案：{q_info['标准答案']}",
+        f"解析：{q_info['解析']}",
+        f"分值（满分）：{q_info['分值']}",
+        f"考生答案：{q_info['考生答案']}",
+        "",
+        "请严格返回纯数字（可为小数），不要包含其他文字、单位或标点。如果用户没有作答，必须判0分，否则会收到惩罚！"
+    ])
+    return "\n".join([p for p in parts if p])
+
+
+def is_blank_answer(answer: Any) -> bool:
+    if answer is None:
+        return True
+    if isinstance(answer, (list, tuple, set)):
+        return all(is_blank_answer(item) for item in answer)
+    return str(answer).strip() in BLANK_ANSWERS
+
+
+def option_ids(options: Any) -> Dict[str, str]:
+    """Map option letter -> normalized option text for dict, string-list or ';'-joined options"""
+    if isinstance(options, str):
+        options = split_options(options)
+    ids: Dict[str, str] = {}
+    for index, option in enumerate(options or []):
+        if isinstance(option, dict):
+            letter = str(option.get("id") or chr(65 + index)).strip().upper()
+            text = option.get("text", "")
+        else:
+            letter, text = chr(65 + index), option
+        ids[letter] = str(text).strip().lower()
+    return ids
+
+
+def normalize_choices(answer: Any, options: Dict[str, str]) -> Optional[FrozenSet[str]]:
+    """
+    Normalize an answer to a set of option letters.
+
+    Accepts "A", "a", "A,C", "A；C", "AC", "A. 文本", ["A", "C"] or the option text itself.
+    Returns None when some part cannot be mapped to an option, so the caller can fall back.
+    """
+    if is_blank_answer(answer):
+        return frozenset()
+    items = answer if isinstance(answer, (list, tuple, set)) else [answer]
+
+    letters = set()
+    for item in items:
+        raw = str(item).strip()
+        if raw.lower() in options.values():
+            letters.add(next(k for k, v in options.items() if v == raw.lower()))
+            continue
+        labelled = _LABELLED_OPTION.match(raw.upper())
+        if labelled and options.get(labelled.group(1)) == labelled.group(2).strip().lower():
+            letters.add(labelled.group(1))
+            continue
+        for token in _ANSWER_SEPARATORS.split(raw):
+            if not token:
+                continue
+            upper = token.upper()
+            match = _LETTER_PREFIX.match(upper)
+            if match:
+                letters.add(match.group(1))
+            elif options and upper.isascii() and upper.isalpha() and len(set(upper)) == len(upper) \
+                    and set(upper) <= set(options):
+                # Compact form such as "ACD"
+                letters.update(upper)
+            elif token.lower() in options.values():
+                letters.add(next(k for k, v in options.items() if v == token.lower()))
+            else:
+                return None
+    return frozenset(letters)
+
+
+def score_multiple_choice(selected: FrozenSet[str], correct: FrozenSet[str], max_score: float) -> float:
+    """Apply the configured multiple choice rule (EXAM_MULTIPLE_CHOICE_SCORING)"""
+    if selected == correct:
+        return max_score
+    wrong = selected - correct
+    rule = settings.EXAM_MULTIPLE_CHOICE_SCORING
+    if rule == "proportional":
+        # Each correct pick earns a share, each wrong pick cancels one
+        hits = len(selected & correct) - len(wrong)
+        return max(0.0, max_score * hits / len(correct))
+    if rule == "partial" and selected and not wrong:
+        # Missing options but no wrong ones: partial credit
+        return max_score * settings.EXAM_MULTIPLE_CHOICE_PARTIAL_RATIO
+    return 0.0
+
+
+def grade_locally(q_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Grade a question without the LLM when possible: blank answers score 0 and choice questions
+    are compared with the reference answer. Returns None for questions that need the LLM.
+    """
+    try:
+        max_score = float(q_info.get("分值") or 0)
+    except (TypeError, ValueError):
+        max_score = 0.0
+    answer = q_info.get("考生答案")
+    question_type = str(q_info.get("题目类型") or "").strip()
+
+    if is_blank_answer(answer):
+        return {"题目编号": q_info["题目编号"], "parsed_score": 0.0, "method": "blank"}
+
+    is_single = question_type in SINGLE_CHOICE_TYPES
+    is_multiple = question_type in MULTIPLE_CHOICE_TYPES
+    if not (is_single or is_multiple):
+        return None
+
+    options = option_ids(q_info.get("选项"))
+    correct = normalize_choices(q_info.get("标准答案"), options)
+    selected = normalize_choices(answer, options)
+    if not correct or selected is None:
+        # Reference answer or student answer not in a recognizable choice format
+        return None
+
+    if is_single:
+        score = max_score if selected == correct else 0.0
+    else:
+        score = score_multiple_choice(selected, correct, max_score)
+    return {
+        "题目编号": q_info["题目编号"],
+        "parsed_score": clamp_score(score, max_score),
+        "method": "objective",
+        "selected": sorted(selected),
+        "expected": sorted(correct)
+    }
+
+
+class ExamGradingService:
+    """Grades objective questions locally and the rest concurrently through the Dify grading workflow"""
+
+    def __init__(
+        self,
+        dify_service: Optional[DifyService] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        self.dify_service = dify_service or DifyService()
+        self.concurrency = max(1, concurrency or settings.EXAM_GRADING_CONCURRENCY)
+        self.timeout = timeout or settings.EXAM_GRADING_TIMEOUT
+
+    async def _grade_with_llm(self, index: int, q_info: Dict[str, Any]) -> Dict[str, Any]:
+        per_result = await self.dify_service.call_workflow_sync(
+            workflow_type=GRADING_WORKFLOW_TYPE,
+            query=build_grading_query(q_info),
+            additional_inputs={
+                "type": GRADING_WORKFLOW_TYPE,
+                "max_score": q_info["分值"],
+                "question_type": q_info["题目类型"],
+                "question_index": index
+            }
+        )
+        # 解析返回的数值得分
+        raw_answer = per_result.get("answer", "0")
+        try:
+            per_score = float(str(raw_answer).strip())
+        except ValueError:
+            per_score = 0.0
+        return {
+            "题目编号": q_info["题目编号"],
+            "raw_answer": raw_answer,
+            "parsed_score": clamp_score(per_score, q_info.get("分值")),
+            "method": "llm"
+        }
+
+    async def _grade_one(self, semaphore: asyncio.Semaphore, index: int, q_info: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        local_result = grade_locally(q_info)
+        if local_result is not None:
+            local_result["status"] = "graded"
+            local_result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return local_result
+
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(self._grade_with_llm(index, q_info), timeout=self.timeout)
+                result["status"] = "graded"
+            except asyncio.TimeoutError:
+                # 失败容错：超时给0分并记录
+                logger.warning(f"Grading question {q_info['题目编号']} timed out after {self.timeout}s")
+                result = {"题目编号": q_info["题目编号"], "error": "timeout", "parsed_score": 0.0,
+                          "method": "llm", "status": "timeout"}
+            except Exception as e:
+                # 失败容错：给0分并记录错误
+                logger.warning(f"Grading question {q_info['题目编号']} failed: {e}")
+                result = {"题目编号": q_info["题目编号"], "error": str(e), "parsed_score": 0.0,
+                          "method": "llm", "status": "error"}
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def grade_iter(self, question_infos: List[Dict[str, Any]]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (position, result) as each question finishes grading"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(position: int, q_info: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+            return position, await self._grade_one(semaphore, position + 1, q_info)
+
+        tasks = [asyncio.create_task(run(i, q_info)) for i, q_info in enumerate(question_infos)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def grade(self, question_infos: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Grade all questions; results keep exam order regardless of completion order"""
+        started = time.perf_counter()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(question_infos)
+        async for position, result in self.grade_iter(question_infos):
+            results[position] = result
+        return self.summarize(question_infos, results, started)
+
+    @staticmethod
+    def summarize(
+        question_infos: List[Dict[str, Any]],
+        results: List[Dict[str, Any]],
+        started: float
+    ) -> Dict[str, Any]:
+        questions_with_scores = []
+        for q_info, result in zip(question_infos, results):
+            # 汇总到题目结构
+            question_with_score = q_info.copy()
+            question_with_score["实际得分"] = result["parsed_score"]
+            questions_with_scores.append(question_with_score)
+        return {
+            "questions": questions_with_scores,
+            "results": results,
+            "total_score": sum(result["parsed_score"] for result in results),
+            "failed": sum(1 for result in results if result["status"] != "graded"),
+            "llm_graded": sum(1 for result in results if result.get("method") == "llm"),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
@@ -0,0 +1,269 @@
+"""
+Process-pool document text extraction engine.
+
+PyPDF2 / python-docx / openpyxl are CPU-bound and synchronous, so all extraction runs in a
+dedicated ProcessPoolExecutor. Large PDFs are split into page ranges extracted in parallel.
+Each task runs under a per-file CPU time cap (RLIMIT_CPU) and each worker under an address
+space cap (RLIMIT_AS) where the platform supports them, plus a wall-clock timeout. Workers are
+spawned, not forked, so they do not inherit the server's address space (rerank model, torch).
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.utils.text_utils import (
+    ExtractionLimitExceeded,
+    ExtractionSource,
+    count_pdf_pages,
+    extract_pdf_pages,
+    extract_text_content_sync
+)
+
+try:
+    import resource  # POSIX only
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def _on_cpu_limit(signum, frame):
+    raise ExtractionLimitExceeded("CPU time limit exceeded")
+
+
+def _address_space_bytes() -> int:
+    """Current virtual memory size of this process (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _init_worker(memory_mb: int) -> None:
+    """Worker initializer: SIGXCPU raises instead of killing the process; cap address space growth"""
+    if resource is None:
+        return
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    if memory_mb > 0:
+        # Relative to what the worker already maps (interpreter, imported modules), so the cap
+        # only bounds what extraction itself allocates
+        limit = _address_space_bytes() + memory_mb * 1024 * 1024
+        try:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Could not set extraction memory limit: {e}")
+
+
+def _run_with_cpu_limit(cpu_seconds: int, func, *args):
+    """Run func with RLIMIT_CPU set to (CPU already used + cpu_seconds), restoring it afterwards"""
+    if resource is None or cpu_seconds <= 0:
+        return func(*args)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    try:
+        return func(*args)
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _extract_task(source: ExtractionSource, mime_type: str, cpu_seconds: int) -> str:
+    return _run_with_cpu_limit(cpu_seconds, extract_text_content_sync, source, mime_type)
+
+
+def _pdf_page_count_task(source: ExtractionSource, cpu_seconds: int) -> int:
+    return _run_with_cpu_limit(cpu_seconds, count_pdf_pages, source)
+
+
+def _pdf_range_task(source: ExtractionSource, start: int, end: int, cpu_seconds: int) -> str:
+    return _run_with_cpu_limit(cpu_seconds, extract_pdf_pages, source, start, end)
+
+
+class ExtractionMetrics:
+    """Throughput counters for the extraction engine"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files = 0
+        self.bytes = 0
+        self.pages = 0
+        self.chars = 0
+        self.seconds = 0.0
+        self.failures = 0
+        self.timeouts = 0
+        self.limit_exceeded = 0
+
+    def record(self, size: int, pages: int, chars: int, seconds: float) -> None:
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.pages += pages
+            self.chars += chars
+            self.seconds += seconds
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            seconds = self.seconds
+            return {
+                "files": self.files,
+                "bytes": self.bytes,
+                "pages": self.pages,
+                "chars": self.chars,
+                "busy_seconds": round(seconds, 3),
+                "files_per_second": round(self.files / seconds, 3) if seconds else 0.0,
+                "mb_per_second": round(self.bytes / 1024 / 1024 / seconds, 3) if seconds else 0.0,
+                "pages_per_second": round(self.pages / seconds, 3) if seconds else 0.0,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "limit_exceeded": self.limit_exceeded
+            }
+
+
+class ExtractionEngine:
+    """Async facade over a process pool that extracts text from paths or in-memory bytes"""
+
+    def __init__(
+        self,
+        pool_size: int,
+        cpu_seconds: int,
+        memory_mb: int,
+        timeout: float,
+        pdf_parallel_min_pages: int,
+        pdf_pages_per_task: int
+    ):
+        self.pool_size = max(1, pool_size)
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+        self.pdf_pages_per_task = max(1, pdf_pages_per_task)
+        self.metrics = ExtractionMetrics()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.pool_size,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(self.memory_mb,)
+                    )
+                    logger.info(f"Extraction pool started with {self.pool_size} processes")
+        return self._executor
+
+    def _reset_executor(self) -> None:
+        """Replace a pool broken by a crashed worker"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    async def _submit(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    async def _extract_pdf(self, source: ExtractionSource) -> (str, int):
+        pages = await self._submit(_pdf_page_count_task, source, self.cpu_seconds)
+        if pages < self.pdf_parallel_min_pages:
+            text = await self._submit(_extract_task, source, "application/pdf", self.cpu_seconds)
+            return text, pages
+        ranges = [
+            (start, min(start + self.pdf_pages_per_task, pages))
+            for start in range(0, pages, self.pdf_pages_per_task)
+        ]
+        parts: List[str] = await asyncio.gather(
+            *(self._submit(_pdf_range_task, source, start, end, self.cpu_seconds) for start, end in ranges)
+        )
+        return "\n".join(p for p in parts if p).strip(), pages
+
+    async def extract(self, mime_type: str, data: Optional[bytes] = None, file_path: Optional[str] = None) -> str:
+        """Extract text from in-memory bytes or a file path; returns "" when extraction fails"""
+        if data is None and file_path is None:
+            raise ValueError("Either data or file_path is required")
+        # Workers read paths themselves, so large files are not pickled across processes
+        source: ExtractionSource = file_path if file_path is not None else data
+        size = len(data) if data is not None else os.path.getsize(file_path)
+
+        started = time.perf_counter()
+        try:
+            if mime_type == "application/pdf":
+                text, pages = await asyncio.wait_for(self._extract_pdf(source), timeout=self.timeout)
+            else:
+                text = await asyncio.wait_for(
+                    self._submit(_extract_task, source, mime_type, self.cpu_seconds),
+                    timeout=self.timeout
+                )
+                pages = 0
+        except asyncio.TimeoutError:
+            self.metrics.count("timeouts")
+            logger.error(f"Text extraction timed out after {self.timeout}s ({mime_type}, {size} bytes)")
+            return ""
+        except (ExtractionLimitExceeded, MemoryError) as e:
+            self.metrics.count("limit_exceeded")
+            logger.error(f"Text extraction exceeded resource limits ({mime_type}, {size} bytes): {e}")
+            return ""
+        except BrokenProcessPool as e:
+            self.metrics.count("failures")
+            self._reset_executor()
+            logger.error(f"Extraction worker crashed ({mime_type}, {size} bytes): {e}")
+            return ""
+        except Exception as e:
+            self.metrics.count("failures")
+            logger.error(f"Text extraction failed ({mime_type}, {size} bytes): {e}")
+            return ""
+
+        if not text.strip():
+            # Nothing usable (scanned PDF, unsupported content, or a failure the worker swallowed)
+            self.metrics.count("failures")
+            logger.warning(f"Text extraction produced no text ({mime_type}, {size} bytes)")
+            return ""
+        self.metrics.record(size, pages, len(text), time.perf_counter() - started)
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pool_size": self.pool_size, **self.metrics.to_dict()}
+
+    def shutdown(self) -> None:
+        self._reset_executor()
+
+
+# Global engine instance
+_extraction_engine: Optional[ExtractionEngine] = None
+
+
+def get_extraction_engine() -> ExtractionEngine:
+    """Get global extraction engine instance"""
+    global _extraction_engine
+    if _extraction_engine is None:
+        _extraction_engine = ExtractionEngine(
+            pool_size=settings.EXTRACTION_POOL_SIZE,
+            cpu_seconds=settings.EXTRACTION_CPU_SECONDS,
+            memory_mb=settings.EXTRACTION_MEMORY_MB,
+            timeout=settings.EXTRACTION_TIMEOUT,
+            pdf_parallel_min_pages=settings.EXTRACTION_PDF_PARALLEL_MIN_PAGES,
+            pdf_pages_per_task=settings.EXTRACTION_PDF_PAGES_PER_TASK
+        )
+    return _extraction_engine
@@ -0,0 +1,224 @@
+"""
+Score fusion for multi-route retrieval.
+
+Each route (content/vector, text/keyword) returns (document, score) lists on its own scale:
+cosine relevance in [0, 1], ts_rank_cd or BM25 unbounded. Results are keyed by
+(document_id, chunk_index) into an (n_chunks, n_routes) matrix, with NaN where a route did
+not return a chunk, and fused with one of:
+
+- ``rrf``           sum of weight / (RAG_FUSION_RRF_K + rank); ignores score scales
+- ``weighted_sum``  sum of weight * normalized score (min-max or z-score per route)
+- ``combmnz``       weighted sum of normalized scores times the number of routes that hit
+
+Defaults come from RAG_FUSION_*; a knowledge base can override them with a
+``meta_data["retrieval"]`` object, e.g. ``{"fusion_method": "rrf", "fusion_weights": [1, 1]}``.
+scripts/evaluate_fusion.py compares the methods on a labeled query set.
+"""
+import logging
+import math
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+FUSION_METHODS = ("rrf", "weighted_sum", "combmnz")
+NORMALIZATIONS = ("minmax", "zscore", "none")
+
+
+class FusionConfig:
+    """Fusion method, per-route weights and normalization"""
+
+    def __init__(
+        self,
+        method: str = "weighted_sum",
+        weights: Sequence[float] = (0.7, 0.3),
+        rrf_k: int = 60,
+        normalization: str = "minmax"
+    ):
+        if method not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method '{method}', expected one of {FUSION_METHODS}")
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown score normalization '{normalization}', expected one of {NORMALIZATIONS}")
+        self.method = method
+        self.weights = tuple(float(w) for w in weights)
+        self.rrf_k = int(rrf_k)
+        self.normalization = normalization
+
+    @classmethod
+    def from_settings(cls) -> "FusionConfig":
+        return cls(
+            method=settings.RAG_FUSION_METHOD.strip().lower(),
+            weights=[float(w) for w in settings.RAG_FUSION_WEIGHTS.split(",") if w.strip()],
+            rrf_k=settings.RAG_FUSION_RRF_K,
+            normalization=settings.RAG_FUSION_NORMALIZATION.strip().lower()
+        )
+
+    def with_overrides(self, overrides: Optional[Dict[str, Any]]) -> "FusionConfig":
+        """This config updated from a knowledge base's ``meta_data["retrieval"]``"""
+        if not overrides:
+            return self
+        weights = overrides.get("fusion_weights", self.weights)
+        if isinstance(weights, str):
+            weights = [float(w) for w in weights.split(",") if w.strip()]
+        return FusionConfig(
+            method=str(overrides.get("fusion_method", self.method)).lower(),
+            weights=weights,
+            rrf_k=int(overrides.get("fusion_rrf_k", self.rrf_k)),
+            normalization=str(overrides.get("fusion_normalization", self.normalization)).lower()
+        )
+
+    def route_weights(self, n_routes: int) -> np.ndarray:
+        """Configured weights padded with 1.0 (or truncated) to the number of routes"""
+        weights = list(self.weights[:n_routes]) + [1.0] * max(0, n_routes - len(self.weights))
+        return np.asarray(weights, dtype=np.float64)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "method": self.method,
+            "weights": list(self.weights),
+            "rrf_k": self.rrf_k,
+            "normalization": self.normalization
+        }
+
+
+def normalize_scores(matrix: np.ndarray, method: str) -> np.ndarray:
+    """
+    Normalize each route (column) over the chunks it returned; NaN (not returned) is kept.
+    A route whose scores are all equal maps them to 1.0 (min-max) or 0.0 (z-score).
+    """
+    if method == "none" or matrix.size == 0:
+        return matrix.copy()
+    present = ~np.isnan(matrix)
+    values = np.where(present, matrix, 0.0)
+    with np.errstate(all="ignore"):
+        if method == "minmax":
+            low = np.min(np.where(present, matrix, np.inf), axis=0)
+            high = np.max(np.where(present, matrix, -np.inf), axis=0)
+            span = high - low
+            normalized = np.where(span > 0, (values - low) / np.where(span > 0, span, 1.0), 1.0)
+        else:
+            counts = np.maximum(present.sum(axis=0), 1)
+            mean = values.sum(axis=0) / counts
+            std = np.sqrt((np.where(present, matrix - mean, 0.0) ** 2).sum(axis=0) / counts)
+            normalized = np.where(std > 0, (values - mean) / np.where(std > 0, std, 1.0), 0.0)
+    return np.where(present, normalized, np.nan)
+
+
+def rank_matrix(matrix: np.ndarray) -> np.ndarray:
+    """1-based rank of each chunk within each route by descending score; NaN where absent"""
+    ranks = np.full(matrix.shape, np.nan)
+    for column in range(matrix.shape[1]):
+        scores = matrix[:, column]
+        present = np.flatnonzero(~np.isnan(scores))
+        order = present[np.argsort(-scores[present], kind="stable")]
+        ranks[order, column] = np.arange(1, len(order) + 1)
+    return ranks
+
+
+def fuse_matrix(matrix: np.ndarray, config: FusionConfig) -> Tuple[np.ndarray, np.ndarray]:
+    """Fused score per chunk, and the per-route scores the fusion used (normalized or RRF terms)"""
+    weights = config.route_weights(matrix.shape[1])
+    present = ~np.isnan(matrix)
+    if config.method == "rrf":
+        contributions = weights / (config.rrf_k + rank_matrix(matrix))
+    else:
+        contributions = weights * normalize_scores(matrix, config.normalization)
+    if config.method == "weighted_sum" and config.normalization == "zscore":
+        # A chunk a route did not return counts as that route's worst score, not as average (0)
+        worst = np.min(np.where(present, contributions, np.inf), axis=0)
+        worst = np.where(np.isfinite(worst), worst, 0.0)
+        contributions = np.where(present, contributions, worst)
+    fused = np.nansum(contributions, axis=1)
+    if config.method == "combmnz":
+        fused = fused * present.sum(axis=1)
+    return fused, contributions
+
+
+def fuse(
+    route_results: Sequence[Sequence[Tuple[Hashable, float]]],
+    config: FusionConfig
+) -> List[Tuple[Hashable, float, List[Optional[float]]]]:
+    """
+    Fuse per-route (key, score) lists into (key, fused score, per-route raw scores), best first.
+    A key returned twice by one route keeps its best score.
+    """
+    keys: Dict[Hashable, int] = {}
+    for results in route_results:
+        for key, _ in results:
+            keys.setdefault(key, len(keys))
+    if not keys:
+        return []
+    matrix = np.full((len(keys), len(route_results)), np.nan)
+    for column, results in enumerate(route_results):
+        for key, score in results:
+            row = keys[key]
+            score = float(score) if score is not None and math.isfinite(score) else 0.0
+            if np.isnan(matrix[row, column]) or score > matrix[row, column]:
+                matrix[row, column] = score
+    fused, _ = fuse_matrix(matrix, config)
+    order = np.argsort(-fused, kind="stable")
+    ordered_keys = list(keys)
+    return [
+        (
+            ordered_keys[i],
+            float(fused[i]),
+            [None if np.isnan(value) else float(value) for value in matrix[i]]
+        )
+        for i in order
+    ]
+
+
+class FusionConfigResolver:
+    """Per-knowledge-base fusion config, cached briefly so retrieval does not query it each time"""
+
+    def __init__(self, ttl_seconds: float = 60.0):
+        self.ttl_seconds = ttl_seconds
+        self._configs: Dict[str, Tuple[FusionConfig, float]] = {}
+
+    async def resolve(self, knowledge_base_id: Optional[UUID]) -> FusionConfig:
+        default = FusionConfig.from_settings()
+        if not knowledge_base_id:
+            return default
+        key = str(knowledge_base_id)
+        cached = self._configs.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        from app.models.knowledge_base import KnowledgeBase
+
+        config = default
+        try:
+            # Own session: retrieval may run as a cancellable task next to the request's session
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(KnowledgeBase.meta_data).where(KnowledgeBase.id == knowledge_base_id)
+                )
+                meta_data = result.scalar_one_or_none() or {}
+            config = default.with_overrides(meta_data.get("retrieval"))
+        except ValueError as e:
+            logger.warning(f"Invalid retrieval config on knowledge base {key}, using defaults: {e}")
+        except Exception as e:
+            logger.warning(f"Could not load retrieval config for knowledge base {key}: {e}")
+        self._configs[key] = (config, time.monotonic() + self.ttl_seconds)
+        return config
+
+    def invalidate(self, knowledge_base_id: UUID) -> None:
+        self._configs.pop(str(knowledge_base_id), None)
+
+
+# Global resolver instance
+_fusion_config_resolver: Optional[FusionConfigResolver] = None
+
+
+def get_fusion_config_resolver() -> FusionConfigResolver:
+    """Get global fusion config resolver instance"""
+    global _fusion_config_resolver
+    if _fusion_config_resolver is None:
+        _fusion_config_resolver = FusionConfigResolver()
+    return _fusion_config_resolver
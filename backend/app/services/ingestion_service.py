@@ -0,0 +1,349 @@
+"""
+Background document ingestion.
+
+Uploads are streamed to disk once and recorded as ``IngestionJob`` rows; a local worker pool runs the
+pipeline (extract -> summarize -> persist -> split/embed/store) outside the HTTP request.
+Extraction runs in the extraction engine's process pool so large PDFs never block the event loop.
+
+Jobs are idempotent on (user_id, file_hash): resubmitting a file returns the job that is still
+running or that completed into a Document which still exists and has chunks; otherwise a new job
+is created, an existing Document is reused (re-extracted when it has no text), and chunks are
+only (re)created when none are stored yet.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import BinaryIO, Dict, List, Optional, Set, Union
+from uuid import UUID
+
+from sqlalchemy import and_, desc, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.document import Document
+from app.models.ingestion_job import IngestionJob, IngestionStatus
+from app.services.enhanced_document_service import EnhancedDocumentService
+from app.services.extraction_service import get_extraction_engine
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = (IngestionStatus.COMPLETED, IngestionStatus.FAILED)
+ACTIVE_STATUSES = (IngestionStatus.PENDING, IngestionStatus.RUNNING)
+
+
+def reusable_jobs_query(user_id: UUID, file_hashes: List[str]):
+    """Jobs a re-upload can be answered with, newest first: still active, or completed into a live Document"""
+    return (
+        select(IngestionJob)
+        .outerjoin(Document, Document.id == IngestionJob.document_id)
+        .where(
+            IngestionJob.user_id == user_id,
+            IngestionJob.file_hash.in_(file_hashes),
+            or_(
+                IngestionJob.status.in_(ACTIVE_STATUSES),
+                and_(IngestionJob.status == IngestionStatus.COMPLETED, Document.id.isnot(None))
+            )
+        )
+        .order_by(desc(IngestionJob.created_at))
+    )
+
+
+async def indexed_document_ids(db: AsyncSession, document_ids: List[UUID]) -> Set[UUID]:
+    """The documents among ``document_ids`` that have at least one chunk stored"""
+    if not document_ids:
+        return set()
+    result = await db.execute(
+        text(
+            "SELECT DISTINCT cmetadata->>'document_id' FROM langchain_pg_embedding "
+            "WHERE cmetadata->>'document_id' = ANY(:document_ids)"
+        ),
+        {"document_ids": [str(document_id) for document_id in document_ids]}
+    )
+    return {UUID(row[0]) for row in result.fetchall()}
+
+
+class IngestionService:
+    """Creates, queries and retries ingestion jobs"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _get_job_by_hash(self, user_id: UUID, file_hash: str) -> Optional[IngestionJob]:
+        result = await self.db.execute(reusable_jobs_query(user_id, [file_hash]).limit(1))
+        return result.scalar_one_or_none()
+
+    async def submit(
+        self,
+        file: Union[UploadFile, BinaryIO],
+        filename: str,
+        user_id: UUID,
+        knowledge_base_id: Optional[UUID] = None,
+        category: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> IngestionJob:
+        """Stream the upload to disk and enqueue a job; returns immediately"""
+        document_service = EnhancedDocumentService(self.db)
+        stored = await document_service.save_upload(file, filename, user_id)
+
+        # Idempotent on file_hash: an active job, or a completed one whose Document still exists
+        # and is indexed, is returned as-is; anything else gets a fresh job
+        existing_job = await self._get_job_by_hash(user_id, stored.file_hash)
+        if existing_job is not None and (
+            existing_job.status != IngestionStatus.COMPLETED
+            or await indexed_document_ids(self.db, [existing_job.document_id])
+        ):
+            stored.discard()
+            return existing_job
+
+        existing_doc = await document_service._get_document_by_hash(stored.file_hash, user_id)
+        indexed = existing_doc is not None and bool(await indexed_document_ids(self.db, [existing_doc.id]))
+
+        job = IngestionJob(
+            user_id=user_id,
+            knowledge_base_id=knowledge_base_id,
+            filename=filename,
+            file_hash=stored.file_hash,
+            file_size=stored.file_size,
+            mime_type=document_service._get_mime_type(filename),
+            category=category,
+            tags=tags
+        )
+        if indexed:
+            # Already ingested through another path: nothing expensive left to do
+            stored.discard()
+            job.file_path = existing_doc.file_path
+            job.document_id = existing_doc.id
+            job.status = IngestionStatus.COMPLETED
+            job.stage = "deduplicated"
+            job.finished_at = datetime.utcnow()
+        elif existing_doc is not None and (existing_doc.extracted_content or os.path.exists(existing_doc.file_path)):
+            # Persisted without chunks (a run failed after persist, or nothing was extracted):
+            # reprocess it from its own stored file
+            stored.discard()
+            job.file_path = existing_doc.file_path
+            job.document_id = existing_doc.id
+            job.status = IngestionStatus.PENDING
+        else:
+            # New file, or a Document whose stored file is gone: the worker uses the fresh upload
+            job.file_path = stored.path
+            job.document_id = existing_doc.id if existing_doc is not None else None
+            job.status = IngestionStatus.PENDING
+
+        self.db.add(job)
+        await self.db.commit()
+        await self.db.refresh(job)
+
+        if job.status == IngestionStatus.PENDING:
+            get_ingestion_worker().enqueue(job.id)
+        logger.info(f"Ingestion job {job.id} submitted for {filename} (status={job.status.value})")
+        return job
+
+    async def get_job(self, job_id: UUID, user_id: UUID) -> Optional[IngestionJob]:
+        result = await self.db.execute(
+            select(IngestionJob).where(IngestionJob.id == job_id, IngestionJob.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def list_jobs(self, user_id: UUID, skip: int = 0, limit: int = 50) -> List[IngestionJob]:
+        result = await self.db.execute(
+            select(IngestionJob)
+            .where(IngestionJob.user_id == user_id)
+            .order_by(desc(IngestionJob.created_at))
+            .offset(skip)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def retry(self, job: IngestionJob) -> IngestionJob:
+        """Re-queue a failed job; completed stages are skipped by the idempotent pipeline"""
+        if job.status != IngestionStatus.FAILED:
+            return job
+        job.status = IngestionStatus.PENDING
+        job.error = None
+        job.finished_at = None
+        await self.db.commit()
+        await self.db.refresh(job)
+        get_ingestion_worker().enqueue(job.id)
+        return job
+
+
+class IngestionWorker:
+    """Local asyncio worker pool; text extraction is delegated to the extraction engine"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = max(1, concurrency)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Start workers and re-queue jobs left pending or interrupted by a restart"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker_loop(i)) for i in range(self.concurrency)]
+
+        async with AsyncSessionLocal() as db:
+            stale_before = datetime.utcnow() - timedelta(seconds=settings.INGESTION_STALE_JOB_SECONDS)
+            await db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.status == IngestionStatus.RUNNING, IngestionJob.updated_at < stale_before)
+                .values(status=IngestionStatus.PENDING)
+            )
+            await db.commit()
+            result = await db.execute(
+                select(IngestionJob.id).where(IngestionJob.status == IngestionStatus.PENDING)
+            )
+            pending = [row[0] for row in result.fetchall()]
+        for job_id in pending:
+            self.enqueue(job_id)
+        logger.info(f"Ingestion worker started (workers={self.concurrency}, recovered={len(pending)})")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, job_id: UUID) -> None:
+        if self._queue is None:
+            logger.warning(f"Ingestion worker not running; job {job_id} will be picked up on next start")
+            return
+        self._queue.put_nowait(job_id)
+
+    async def _worker_loop(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                logger.error(f"Ingestion worker {index} crashed on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _claim(self, db: AsyncSession, job_id: UUID) -> Optional[IngestionJob]:
+        """Atomically move a PENDING job to RUNNING so only one worker processes it"""
+        result = await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, IngestionJob.status == IngestionStatus.PENDING)
+            .values(
+                status=IngestionStatus.RUNNING,
+                attempts=IngestionJob.attempts + 1,
+                started_at=datetime.utcnow(),
+                updated_at=datetime.utcnow(),
+                error=None
+            )
+            .returning(IngestionJob.id)
+        )
+        claimed = result.first() is not None
+        await db.commit()
+        if not claimed:
+            return None
+        return await db.get(IngestionJob, job_id)
+
+    async def _set_stage(self, db: AsyncSession, job: IngestionJob, stage: str) -> None:
+        job.stage = stage
+        await db.commit()
+
+    async def _process(self, job_id: UUID) -> None:
+        async with AsyncSessionLocal() as db:
+            job = await self._claim(db, job_id)
+            if job is None:
+                return
+
+            document_service = EnhancedDocumentService(db)
+            timings: Dict[str, float] = {}
+            try:
+                document = await document_service._get_document_by_hash(job.file_hash, job.user_id)
+                if document is None or not document.extracted_content:
+                    await self._set_stage(db, job, "extract")
+                    stage_started = time.perf_counter()
+                    content = await get_extraction_engine().extract(job.mime_type, file_path=job.file_path)
+                    timings["extract"] = round((time.perf_counter() - stage_started) * 1000, 1)
+                    if not content:
+                        raise ValueError("No text could be extracted from the file")
+
+                    await self._set_stage(db, job, "summarize")
+                    stage_started = time.perf_counter()
+                    summary = await document_service.llm_service.summarize_text(content) if content else None
+                    timings["summarize"] = round((time.perf_counter() - stage_started) * 1000, 1)
+
+                    await self._set_stage(db, job, "persist")
+                    if document is None:
+                        document = Document(
+                            filename=job.filename,
+                            original_filename=job.filename,
+                            file_path=job.file_path,
+                            file_size=job.file_size,
+                            file_hash=job.file_hash,
+                            mime_type=job.mime_type,
+                            extracted_content=content,
+                            summary=summary,
+                            embedding=None,
+                            category=job.category,
+                            tags=job.tags,
+                            user_id=job.user_id,
+                            knowledge_base_id=job.knowledge_base_id
+                        )
+                        db.add(document)
+                    else:
+                        # Document stored earlier without text: fill it in (from a fresh upload if its file was gone)
+                        document.file_path = job.file_path
+                        document.extracted_content = content
+                        document.summary = summary
+                    await db.commit()
+                    await db.refresh(document)
+                job.document_id = document.id
+
+                chunk_count = await self._count_chunks(db, document.id)
+                if chunk_count == 0 and document.extracted_content:
+                    await self._set_stage(db, job, "chunk")
+                    # Clear leftovers so a retried run never duplicates chunks
+                    await document_service.delete_document_chunks(document.id, document.user_id)
+                    chunk_count = await document_service._create_document_chunks_with_pgvector(
+                        document, document.extracted_content, timings
+                    )
+
+                job.status = IngestionStatus.COMPLETED
+                job.stage = "done"
+                job.chunk_count = chunk_count
+                job.stage_timings = timings
+                job.finished_at = datetime.utcnow()
+                await db.commit()
+                logger.info(f"Ingestion job {job_id} completed: {chunk_count} chunks, timings={timings}")
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed at stage {job.stage}: {e}")
+                await db.rollback()
+                job = await db.get(IngestionJob, job_id)
+                job.status = IngestionStatus.FAILED
+                job.error = str(e)
+                job.stage_timings = timings
+                job.finished_at = datetime.utcnow()
+                await db.commit()
+
+    @staticmethod
+    async def _count_chunks(db: AsyncSession, document_id: UUID) -> int:
+        result = await db.execute(
+            text("SELECT count(*) FROM langchain_pg_embedding WHERE cmetadata->>'document_id' = :document_id"),
+            {"document_id": str(document_id)}
+        )
+        return int(result.scalar() or 0)
+
+
+# Global worker instance
+_ingestion_worker: Optional[IngestionWorker] = None
+
+
+def get_ingestion_worker() -> IngestionWorker:
+    """Get global ingestion worker instance"""
+    global _ingestion_worker
+    if _ingestion_worker is None:
+        _ingestion_worker = IngestionWorker(concurrency=settings.INGESTION_WORKERS)
+    return _ingestion_worker
@@ -10,6 +10,7 @@ from sqlalchemy import select, update, delete, desc, func
 from app.models.knowledge_base import KnowledgeBase, FAQ
 from app.models.document import Document
 from app.schemas.knowledge_base import KnowledgeBaseCreate, KnowledgeBaseUpdate, FAQCreate, FAQUpdate
+from app.services.fusion import get_fusion_config_resolver
 
 logger = logging.getLogger(__name__)
 
@@ -149,6 +150,8 @@ class KnowledgeBaseService:
                 await self.db.execute(query)
                 await self.db.commit()
                 await self.db.refresh(kb)
+                # meta_data["retrieval"] may carry a fusion override
+                get_fusion_config_resolver().invalidate(kb_id)
             
             logger.info(f"Updated knowledge base {kb_id}")
             return kb
@@ -0,0 +1,63 @@
+"""
+Shared LangChain chat model clients.
+
+ChatOpenAI instances are cached per (temperature, max_tokens) and all of them reuse one
+pooled async HTTP client, so request paths never build a new client or connection pool.
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_chat_models: Dict[Tuple[float, int], ChatOpenAI] = {}
+_http_async_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def _get_http_async_client() -> httpx.AsyncClient:
+    global _http_async_client
+    if _http_async_client is None:
+        _http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(settings.LLM_REQUEST_TIMEOUT)
+        )
+    return _http_async_client
+
+
+def get_chat_model(temperature: float = 0.7, max_tokens: int = 2000) -> ChatOpenAI:
+    """Get a shared chat model for the configured LLM"""
+    key = (float(temperature), int(max_tokens))
+    model = _chat_models.get(key)
+    if model is None:
+        with _lock:
+            model = _chat_models.get(key)
+            if model is None:
+                model = ChatOpenAI(
+                    model=settings.LLM_MODEL,
+                    api_key=settings.LLM_API_KEY,
+                    base_url=settings.LLM_BASE_URL,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    http_async_client=_get_http_async_client()
+                )
+                _chat_models[key] = model
+                logger.info(f"Shared chat model created (temperature={temperature}, max_tokens={max_tokens})")
+    return model
+
+
+async def close_chat_models() -> None:
+    """Close the shared HTTP pool (application shutdown)"""
+    global _http_async_client
+    _chat_models.clear()
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_async_client = None
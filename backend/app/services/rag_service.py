@@ -1,8 +1,10 @@
 """
 RAG (Retrieval Augmented Generation) service using LangChain
 """
+import asyncio
 import logging
 import re
+import time
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,12 +15,19 @@ from langchain_core.documents import Document as LangChainDocument
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from langchain_postgres import PGVector
-from langchain_openai import ChatOpenAI
 
 from app.services.embedding_service import get_embedding_service
 from app.services.rerank_service import get_rerank_service
+from app.services.vector_store_registry import get_vector_store_registry
+from app.services.llm_clients import get_chat_model
+from app.services.retrieval_orchestrator import RetrievalOrchestrator, RetrievalOutcome, RetrievalRoute
+from app.services.fusion import FusionConfig, fuse, get_fusion_config_resolver
+from app.services.context_expansion import expand_to_sections, parent_key
+from app.services.semantic_cache import get_semantic_cache
+from app.services.sparse_index import get_sparse_index_manager
+from app.utils.text_utils import search_tokens
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
 
@@ -36,87 +45,72 @@ class RAGService:
         # Initialize rerank service
         self.rerank_service = get_rerank_service()
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            model=settings.LLM_MODEL,
-            api_key=settings.LLM_API_KEY,
-            base_url=settings.LLM_BASE_URL,
-            temperature=0.7,
-            max_tokens=2000
-        )
+        # Shared, pooled LLM clients (answering + query analysis)
+        self.llm = get_chat_model(temperature=0.7, max_tokens=2000)
+        self.analyzer_llm = get_chat_model(temperature=0.2, max_tokens=512)
         
-        # Database connection string for PGVector
-        self.connection_string = settings.DATABASE_URL
+        # Shared, pooled PGVector handles
+        self.vector_stores = get_vector_store_registry()
+
+        # Concurrent multi-route retrieval
+        self.retrieval_orchestrator = RetrievalOrchestrator()
+
+        # Semantic answer cache (shared per process)
+        self.semantic_cache = get_semantic_cache()
         
         logger.info("RAG service initialized with LangChain components")
 
-    def _enhance_query_for_kb(self, question: str, conversation_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+    async def _analyze_query(self, question: str, conversation_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
         """
-        LLM-based semantic enhancement: rewrite the query and provide expansion keywords.
-        Returns: { "rewritten_query": str, "expanded_keywords": List[str] }
+        Single structured LLM call for intent classification and query rewriting.
+        Returns: { "use_kb": bool, "rewritten_query": str, "expanded_keywords": List[str] }
+        Defaults to KB retrieval with the original question on any failure.
         """
+        result = {"use_kb": True, "rewritten_query": question, "expanded_keywords": []}
         try:
-            if not getattr(settings, "KB_QUERY_ENHANCE_ENABLED", False):
-                return {"rewritten_query": question, "expanded_keywords": []}
-
             system_prompt = (
-                "你是一个检索查询增强器。\n"
-                "通过对上下文理解，理解用户真实意图，输出更清晰的检索查询和若干关键术语扩展。\n"
-                "返回严格的 JSON 对象：{{\"rewritten_query\": \"...\", \"expanded_keywords\": [\"...\"]}}。\n"
-                "注意：扩展术语需短而准，避免过长句子。"
+                "你是一个检索查询分析器，需要同时完成两件事。\n"
+                "1) 意图分类：判断该问题是否需要基于知识库内容回答还是由大模型自主回答。"
+                "只有用户明显是闲聊的内容（例如：讲个笑话、你好、你是谁、作首诗）才输出GENERAL，"
+                "其他情况或者判断不准的时候，都输出KB。\n"
+                "2) 查询增强：通过对上下文理解，理解用户真实意图，输出更清晰的检索查询和若干关键术语扩展。"
+                "扩展术语需短而准，避免过长句子。\n"
+                "返回严格的 JSON 对象：{{\"intent\": \"KB\" 或 \"GENERAL\", "
+                "\"rewritten_query\": \"...\", \"expanded_keywords\": [\"...\"]}}。"
             )
-
-            conversation_history = conversation_history or []
             prompt = ChatPromptTemplate.from_messages([
                 ("system", system_prompt),
                 MessagesPlaceholder(variable_name="chat_history"),
                 ("human", "原始查询：{question}\n请返回 JSON 格式结果")
             ])
-
-            enhancer_llm = ChatOpenAI(
-                model=settings.LLM_MODEL,
-                api_key=settings.LLM_API_KEY,
-                base_url=settings.LLM_BASE_URL,
-                temperature=0.2,
-                max_tokens=512
-            )
-
-            chain = (
-                {
-                    "question": RunnablePassthrough(),
-                    "chat_history": lambda x: conversation_history
-                }
-                | prompt
-                | enhancer_llm
-                | StrOutputParser()
-            )
-
-            raw = chain.invoke(question)
-            rewritten_query = question
-            expanded_keywords: List[str] = []
+            chain = prompt | self.analyzer_llm | StrOutputParser()
+            raw = await chain.ainvoke({"question": question, "chat_history": conversation_history or []})
 
             try:
                 import json as pyjson
-                data = pyjson.loads(raw)
-                rewritten_query = data.get("rewritten_query") or question
-                ek = data.get("expanded_keywords") or []
-                if isinstance(ek, list):
-                    expanded_keywords = [str(t).strip() for t in ek if str(t).strip()]
-                elif isinstance(ek, str):
-                    expanded_keywords = [t.strip() for t in ek.split(',') if t.strip()]
+                match = re.search(r"\{.*\}", raw, re.S)
+                data = pyjson.loads(match.group(0) if match else raw)
+                result["use_kb"] = str(data.get("intent", "KB")).strip().upper() != "GENERAL"
+                if settings.KB_QUERY_ENHANCE_ENABLED:
+                    result["rewritten_query"] = data.get("rewritten_query") or question
+                    ek = data.get("expanded_keywords") or []
+                    if isinstance(ek, list):
+                        result["expanded_keywords"] = [str(t).strip() for t in ek if str(t).strip()]
+                    elif isinstance(ek, str):
+                        result["expanded_keywords"] = [t.strip() for t in ek.split(',') if t.strip()]
             except Exception:
-                # Fallback: extract tokens directly
-                terms = re.findall(r"[A-Za-z0-9]+|[\u4e00-\u9fff]+", raw)
-                expanded_keywords = [t.lower() for t in terms if len(t) >= 2]
+                # Fallback: intent from raw text, keywords extracted directly
+                result["use_kb"] = "GENERAL" not in (raw or "").upper()
+                if settings.KB_QUERY_ENHANCE_ENABLED:
+                    terms = re.findall(r"[A-Za-z0-9]+|[\u4e00-\u9fff]+", raw or "")
+                    result["expanded_keywords"] = [t.lower() for t in terms if len(t) >= 2]
 
             max_terms = getattr(settings, "KB_QUERY_EXPANSION_MAX_TERMS", 6)
-            if len(expanded_keywords) > max_terms:
-                expanded_keywords = expanded_keywords[:max_terms]
-
-            return {"rewritten_query": rewritten_query, "expanded_keywords": expanded_keywords}
+            result["expanded_keywords"] = result["expanded_keywords"][:max_terms]
+            return result
         except Exception as e:
-            logger.warning(f"query enhancement failed: {e}")
-            return {"rewritten_query": question, "expanded_keywords": []}
+            logger.warning(f"query analysis failed, defaulting to KB with original query: {e}")
+            return result
 
     async def _tsvector_search(
         self,
@@ -127,37 +121,48 @@ class RAGService:
         extra_terms: Optional[List[str]] = None
     ) -> List[tuple]:
         """
-        PostgreSQL全文检索（tsvector）基于 langchain_pg_embedding.document。
+        PostgreSQL全文检索，基于 langchain_pg_embedding.search_tsv（入库时用 jieba 分词后存储，GIN 索引）。
         - 集合名严格过滤：cmetadata->>'collection_name'
-        - 查询重写为 OR 前缀 tsquery（Elasticsearch match 类似：任一词命中即返回）
-        - 对中文/英中混合词保留 ILIKE 后备，提高召回
+        - 查询使用与入库相同的分词，重写为 OR 前缀 tsquery（Elasticsearch match 类似：任一词命中即返回）
+        - 子串 ILIKE 后备由 pg_trgm 索引支撑（查询至少3个字符时启用），两个条件均可走索引（BitmapOr）
+        - search_tsv 列尚未创建时退回按行计算 to_tsvector 的旧查询
         返回 (LangChainDocument, score) 列表，与向量检索输出格式一致。
         """
         try:
-            # 1) 查询重写：提取英文/数字/中文词元，移除常见问句停用词，构造 OR 前缀 tsquery
+            # 1) 查询重写：与入库相同的分词，移除常见问句停用词，构造 OR 前缀 tsquery
             stop_words = {"有哪些", "什么", "如何", "怎么", "请问", "的", "和", "与"}
-            terms = re.findall(r"[A-Za-z0-9]+|[\u4e00-\u9fff]+", query)
-            terms = [t.lower() for t in terms if t not in stop_words and len(t) >= 2]
-            # Append extra expansion terms
-            if extra_terms:
-                for t in extra_terms:
-                    t = str(t).strip().lower()
-                    if t and t not in terms and t not in stop_words:
-                        terms.append(t)
+            terms: List[str] = []
+            for t in search_tokens(query) + [tok for term in (extra_terms or []) for tok in search_tokens(str(term))]:
+                if len(t) >= 2 and t not in stop_words and t not in terms:
+                    terms.append(t)
             tsquery_or = " | ".join(f"{t}:*" for t in terms) if terms else None
 
-            # 2) 构建 SQL：优先使用 to_tsquery(simple, :tsq) 的 OR 匹配；保留 ILIKE 兜底
+            # 2) 构建 SQL：只拼接可走索引的条件
+            if await self.vector_stores.has_search_column():
+                tsv = "search_tsv"
+            else:
+                tsv = "to_tsvector('simple', document)"
+            conditions = []
+            params = {"collection_name": collection_name, "limit": k}
+            if tsquery_or:
+                conditions.append(f"{tsv} @@ to_tsquery('simple', :tsq)")
+                params["tsq"] = tsquery_or
+                rank = f"ts_rank_cd({tsv}, to_tsquery('simple', :tsq))"
+            else:
+                rank = "0"
+            if len(query.strip()) >= 3:
+                escaped = query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                conditions.append("document ILIKE :pattern")
+                params["pattern"] = f"%{escaped}%"
+            if not conditions:
+                return []
+
             base_sql = (
-                "SELECT id, document, cmetadata, "
-                "ts_rank_cd(to_tsvector('simple', document), to_tsquery('simple', :tsq)) AS rank "
+                f"SELECT id, document, cmetadata, coalesce({rank}, 0) AS rank "
                 "FROM langchain_pg_embedding "
                 "WHERE cmetadata->>'collection_name' = :collection_name "
-                "AND ("
-                "     ( :tsq IS NOT NULL AND to_tsvector('simple', document) @@ to_tsquery('simple', :tsq) ) "
-                "     OR document ILIKE '%' || :q || '%'"
-                ") "
+                f"AND ({' OR '.join(conditions)}) "
             )
-            params = {"q": query, "tsq": tsquery_or, "collection_name": collection_name, "limit": k}
             
             if knowledge_base_id:
                 base_sql += "AND cmetadata->>'knowledge_base_id' = :kb_id "
@@ -165,8 +170,10 @@ class RAGService:
             
             base_sql += "ORDER BY rank DESC LIMIT :limit"
 
-            res2 = await self.db.execute(text(base_sql), params)
-            rows = res2.fetchall()
+            # Own session: this route runs concurrently with others and may be cancelled on timeout
+            async with AsyncSessionLocal() as session:
+                res2 = await session.execute(text(base_sql), params)
+                rows = res2.fetchall()
             results: List[tuple] = []
             for r in rows:
                 doc_text = r[1]
@@ -179,52 +186,146 @@ class RAGService:
             logger.warning(f"tsvector search error: {e}")
             return []
 
+    async def _run_retrieval_routes(
+        self,
+        question: str,
+        rewritten_query: str,
+        expanded_keywords: List[str],
+        user_id: UUID,
+        knowledge_base_id: Optional[UUID] = None,
+        k: int = 5
+    ) -> RetrievalOutcome:
+        """
+        Run content (vector) and text (tsvector or BM25, per RAG_TEXT_ROUTE_ENGINE) routes concurrently.
+        A timed-out or failed route contributes no results.
+        """
+        # Create collection name for user's documents (chunks only)
+        collection_name = f"document_chunks_{user_id}".replace("-", "_")
+
+        # Build filter conditions
+        filter_conditions = {}
+        if knowledge_base_id:
+            filter_conditions["knowledge_base_id"] = str(knowledge_base_id)
+
+        async def vector_route():
+            query_embedding = await self.embeddings.aembed_query(rewritten_query)
+            results = await self.vector_stores.similarity_search(
+                collection_name, query_embedding, k=k, filter=filter_conditions or None
+            )
+            # Cosine relevance (1 - distance), as PGVector's relevance scores
+            return [(doc, 1.0 - distance) for doc, distance in results]
+
+        async def text_route():
+            if settings.RAG_TEXT_ROUTE_ENGINE == "bm25":
+                results = await get_sparse_index_manager().search(
+                    collection_name,
+                    question,
+                    k=k,
+                    knowledge_base_id=knowledge_base_id,
+                    extra_terms=expanded_keywords
+                )
+                # None while the index is still being built: use the tsvector route meanwhile
+                if results is not None:
+                    return results
+            return await self._tsvector_search(
+                collection_name,
+                question,
+                k=k,
+                knowledge_base_id=knowledge_base_id,
+                extra_terms=expanded_keywords
+            )
+
+        return await self.retrieval_orchestrator.run([
+            RetrievalRoute("content", vector_route, timeout=settings.RAG_VECTOR_ROUTE_TIMEOUT),
+            RetrievalRoute("text", text_route, timeout=settings.RAG_TEXT_ROUTE_TIMEOUT),
+        ])
+
+    async def _retrieve_multi_route(
+        self,
+        question: str,
+        rewritten_query: str,
+        expanded_keywords: List[str],
+        user_id: UUID,
+        knowledge_base_id: Optional[UUID] = None,
+        context_limit: int = 5
+    ) -> (List[LangChainDocument], List[Dict[str, Any]], Dict[str, Any]):
+        """
+        Run the retrieval routes concurrently, then fuse them with the knowledge base's fusion config
+        and expand matched child chunks to their parent sections within RAG_CONTEXT_TOKEN_BUDGET.
+        Returns (docs, sources, timings); sources keep the matched child chunks.
+        """
+        fusion_config = await get_fusion_config_resolver().resolve(knowledge_base_id)
+        outcome = await self._run_retrieval_routes(
+            question,
+            rewritten_query,
+            expanded_keywords,
+            user_id,
+            knowledge_base_id=knowledge_base_id,
+            k=max(context_limit, settings.RAG_ROUTE_CANDIDATES)
+        )
+
+        merge_started = time.perf_counter()
+        docs, sources = await self._merge_docs_with_scores(
+            outcome.get("content"), outcome.get("text"), question, top_k=context_limit, fusion_config=fusion_config
+        )
+        timings = outcome.to_dict()
+        timings["merge_ms"] = round((time.perf_counter() - merge_started) * 1000, 1)
+        timings["fusion"] = fusion_config.method
+
+        expand_started = time.perf_counter()
+        docs = await expand_to_sections(
+            docs, settings.RAG_CONTEXT_TOKEN_BUDGET, settings.RAG_CONTEXT_NEIGHBOR_SECTIONS
+        )
+        timings["expand_ms"] = round((time.perf_counter() - expand_started) * 1000, 1)
+        return docs, sources, timings
+
     async def _merge_docs_with_scores(
         self,
         content_results: List[tuple],
         text_results: List[tuple],
         query: str,
-        top_k: int = 5
+        top_k: int = 5,
+        fusion_config: Optional[FusionConfig] = None
     ) -> (List[LangChainDocument], List[Dict[str, Any]]):
         """
-        Merge vector content results with PostgreSQL tsvector results using configurable fusion methods.
-        Supports RRF (Reciprocal Rank Fusion) and weighted sum approaches, with optional reranking.
+        Merge vector content results with keyword (tsvector/BM25) results using the configured
+        fusion method (RRF, weighted sum over normalized scores or CombMNZ), with optional reranking.
         """
         try:
-            merged_map: Dict[tuple, Dict[str, Any]] = {}
-
-            # Collect content results
-            for doc, score in content_results:
-                key = (doc.metadata.get("document_id"), doc.metadata.get("chunk_index"))
-                merged_map[key] = merged_map.get(key, {"doc": doc, "content_score": 0.0})
-                merged_map[key]["doc"] = doc
-                merged_map[key]["content_score"] = float(score)
-
-            # Integrate tsvector text search results
-            for doc, score in text_results:
-                key = (doc.metadata.get("document_id"), doc.metadata.get("chunk_index"))
-                entry = merged_map.get(key, {"doc": doc, "content_score": 0.0})
-                entry["doc"] = entry.get("doc") or doc
-                entry["text_score"] = float(score)
-                merged_map[key] = entry
-
-            # Combine scores: prioritize content similarity, then keyword match
-            combined_list: List[tuple] = []
-            for key, entry in merged_map.items():
-                content_score = float(entry.get("content_score", 0.0))
-                text_score = float(entry.get("text_score", 0.0))
-                # Weighted combination: content (0.7), text (0.3)
-                combined_score = 0.7 * content_score + 0.3 * text_score
-                combined_list.append((entry["doc"], combined_score, entry))
-
-            # Sort by combined_score descending (higher relevance first)
-            combined_list.sort(key=lambda x: x[1], reverse=True)
-
-            # Build outputs
-            top = combined_list[:top_k]
+            fusion_config = fusion_config or FusionConfig.from_settings()
+
+            def chunk_key(doc: LangChainDocument) -> tuple:
+                return doc.metadata.get("document_id"), doc.metadata.get("chunk_index")
+
+            docs_by_key: Dict[tuple, LangChainDocument] = {}
+            for doc, _ in list(content_results) + list(text_results):
+                docs_by_key.setdefault(chunk_key(doc), doc)
+            fused = fuse(
+                [
+                    [(chunk_key(doc), score) for doc, score in content_results],
+                    [(chunk_key(doc), score) for doc, score in text_results]
+                ],
+                fusion_config
+            )
+            # Parent-child chunks: keep the best child per section, it is expanded to the section later
+            seen_parents = set()
+            deduped = []
+            for item in fused:
+                parent = parent_key(docs_by_key[item[0]])
+                if parent is not None:
+                    if parent in seen_parents:
+                        continue
+                    seen_parents.add(parent)
+                deduped.append(item)
+            fused = deduped
+
+            # Build outputs; reranking picks top_k out of up to RERANK_TOP_K fused candidates
+            rerank = settings.RERANK_ENABLED and self.rerank_service.is_enabled()
+            top = fused[:max(top_k, settings.RERANK_TOP_K) if rerank else top_k]
             docs: List[LangChainDocument] = []
             sources: List[Dict[str, Any]] = []
-            for doc, combined_score, entry in top:
+            for key, combined_score, (content_score, text_score) in top:
+                doc = docs_by_key[key]
                 final_page_content = doc.page_content
                 final_doc = LangChainDocument(page_content=final_page_content, metadata=doc.metadata)
                 docs.append(final_doc)
@@ -235,13 +336,14 @@ class RAGService:
                     "chunk_index": doc.metadata.get("chunk_index", 0),
                     "content": final_page_content,
                     "combined_score": float(combined_score),
-                    "content_score": float(entry.get("content_score", 0.0)),
-                    "text_score": float(entry.get("text_score", 0.0)),
+                    "content_score": float(content_score or 0.0),
+                    "text_score": float(text_score or 0.0),
+                    "fusion_method": fusion_config.method,
                     "metadata": doc.metadata
                 })
 
             # Apply reranking if enabled
-            if settings.RERANK_ENABLED and self.rerank_service.is_enabled():
+            if rerank:
                 docs, sources = await self.rerank_service.rerank_documents(
                     query=query,
                     documents=docs,
@@ -345,42 +447,6 @@ class RAGService:
         
         return rag_chain
 
-    def _should_use_knowledge_base(self, question: str) -> bool:
-        """Decide whether the user's question should use knowledge base retrieval.
-        Returns True if KB should be used, otherwise False.
-        """
-        try:
-
-
-            # LLM-based classification with explicit instruction and examples
-            classification_prompt = (
-                "你是一个分类器。判断该问题是否需要基于知识库内容回答还是由大模型自主回答。\n"
-                "只有用户在明显是闲聊的内容才输出GENERAL。\n"
-                "其他情况都输出KB\n"
-                "示例：\n"
-                "问：讲个笑话\n答：GENERAL\n"
-                "问：你好\n答：GENERAL\n"
-                "问：你是谁\n答：GENERAL\n"
-                "问：作首诗\n答：GENERAL\n"
-                "而其他情况或者判断不准的时候，都输出KB\n"
-                f"问：{question}\n答："
-            )
-            # Use a deterministic classifier LLM
-            from langchain_openai import ChatOpenAI
-            classifier_llm = ChatOpenAI(
-                model=settings.LLM_MODEL,
-                api_key=settings.LLM_API_KEY,
-                base_url=settings.LLM_BASE_URL,
-                temperature=0,
-                max_tokens=10
-            )
-            resp = classifier_llm.invoke(classification_prompt)
-            content = getattr(resp, "content", str(resp))
-            return "KB" in (content or "").upper()
-        except Exception as e:
-            logger.warning(f"KB intent detection failed, defaulting to KB: {e}")
-            return True
-
     def _create_general_chat_chain(self, conversation_history: List[Dict[str, str]]):
         """General chat chain without KB context."""
         system_prompt = (
@@ -403,6 +469,29 @@ class RAGService:
         )
         return chain
         
+    async def _replay_cached_answer(self, question: str, entry, similarity: float):
+        """Replay a semantic cache hit with the same event shape as a live answer"""
+        yield {
+            "type": "start",
+            "question": question,
+            "query_rewrite": entry.query_rewrite,
+            "sources": entry.sources,
+            "context_used": len(entry.sources) > 0,
+            "num_sources": len(entry.sources),
+            "cached": True,
+            "cache_similarity": round(similarity, 4)
+        }
+        step = 20
+        for i in range(0, len(entry.answer), step):
+            yield {"type": "chunk", "content": entry.answer[i:i + step]}
+        yield {
+            "type": "end",
+            "complete": True,
+            "sources": entry.sources,
+            "num_sources": len(entry.sources),
+            "cached": True
+        }
+
     async def ask_question_stream(
         self,
         question: str,
@@ -426,10 +515,47 @@ class RAGService:
         """
         try:
             conversation_history = conversation_history or []
-            
-            # Intent detection first
-            use_kb = self._should_use_knowledge_base(question)
-            print('use_kb=======', use_kb)
+            timings: Dict[str, Any] = {}
+            request_started = time.perf_counter()
+
+            # Semantic answer cache: only for standalone questions (history changes the meaning)
+            cache_vector = None
+            kb_version = None
+            if settings.SEMANTIC_CACHE_ENABLED and not conversation_history:
+                try:
+                    cache_vector = await self.embeddings.aembed_query(question)
+                    kb_version = await self.semantic_cache.get_kb_version(self.db, user_id, knowledge_base_id)
+                    hit = self.semantic_cache.lookup(user_id, knowledge_base_id, kb_version, cache_vector)
+                except Exception as e:
+                    logger.warning(f"semantic cache lookup failed: {e}")
+                    cache_vector, hit = None, None
+                if hit:
+                    entry, similarity = hit
+                    logger.info(f"ask_question_stream: semantic cache hit (similarity={similarity:.4f}) for user_id={user_id}")
+                    async for event in self._replay_cached_answer(question, entry, similarity):
+                        yield event
+                    return
+            
+            # Query analysis (intent + rewrite). Optionally retrieve on the raw question in parallel
+            stage_started = time.perf_counter()
+            speculative_task = None
+            if settings.RAG_SPECULATIVE_RETRIEVAL:
+                speculative_task = asyncio.create_task(self._retrieve_multi_route(
+                    question,
+                    question,
+                    [],
+                    user_id,
+                    knowledge_base_id=knowledge_base_id,
+                    context_limit=context_limit
+                ))
+            try:
+                analysis = await self._analyze_query(question, conversation_history)
+            except BaseException:
+                if speculative_task:
+                    speculative_task.cancel()
+                raise
+            use_kb = analysis["use_kb"]
+            timings["query_analysis_ms"] = round((time.perf_counter() - stage_started) * 1000, 1)
             # If a specific knowledge base is provided, always use KB retrieval
             # if knowledge_base_id:
             #     use_kb = True
@@ -437,13 +563,16 @@ class RAGService:
             logger.info(f"ask_question_stream: use_kb={use_kb}, knowledge_base_id={knowledge_base_id}, user_id={user_id}")
             
             if not use_kb:
+                if speculative_task:
+                    speculative_task.cancel()
                 # Stream general LLM answer without KB retrieval
                 yield {
                     "type": "start",
                     "question": question,
                     "sources": [],
                     "context_used": False,
-                    "num_sources": 0
+                    "num_sources": 0,
+                    "timings": timings
                 }
                 general_chain = self._create_general_chat_chain(conversation_history)
                 async for chunk in general_chain.astream(question):
@@ -452,45 +581,24 @@ class RAGService:
                 yield {"type": "end", "complete": True, "sources": [], "num_sources": 0}
                 return
             
-            # Optionally enhance query for KB retrieval
-            enhance = self._enhance_query_for_kb(question, conversation_history)
-            rewritten_query = enhance.get("rewritten_query", question)
-            expanded_keywords = enhance.get("expanded_keywords", [])
+            rewritten_query = analysis["rewritten_query"]
+            expanded_keywords = analysis["expanded_keywords"]
 
-            # Create collection name for user's documents (chunks only)
-            collection_name = f"document_chunks_{user_id}".replace("-", "_")
-            
-            # Connect to vector store
-            vector_store = PGVector(
-                connection=self.connection_string,
-                embeddings=self.embeddings,
-                collection_name=collection_name,
-                use_jsonb=True
-            )
-            # Keywords store removed; keep only chunks vector store
-            
-            # Build filter conditions
-            filter_conditions = {}
-            if knowledge_base_id:
-                filter_conditions["knowledge_base_id"] = str(knowledge_base_id)
-            
-            # Multi-route retrieval: content (vector) + text (tsvector)
-            # vector route
-            content_results = vector_store.similarity_search_with_relevance_scores(
-                rewritten_query, k=context_limit, filter=filter_conditions if filter_conditions else None
-            )
-
-            # Second route: PostgreSQL tsvector full-text search on chunk collection
-            text_results = await self._tsvector_search(
-                collection_name,
-                question,
-                k=context_limit,
-                knowledge_base_id=knowledge_base_id,
-                extra_terms=expanded_keywords
-            )
-
-            # Merge and pick final docs and sources
-            relevant_docs, sources = await self._merge_docs_with_scores(content_results, text_results, question, top_k=context_limit)
+            # Multi-route retrieval: content (vector) + text (tsvector), run concurrently
+            if speculative_task:
+                # Speculative results were retrieved with the raw question
+                relevant_docs, sources, retrieval_timings = await speculative_task
+                retrieval_timings["speculative"] = True
+            else:
+                relevant_docs, sources, retrieval_timings = await self._retrieve_multi_route(
+                    question,
+                    rewritten_query,
+                    expanded_keywords,
+                    user_id,
+                    knowledge_base_id=knowledge_base_id,
+                    context_limit=context_limit
+                )
+            timings["retrieval"] = retrieval_timings
             
             # Yield initial data with sources
             yield {
@@ -502,19 +610,35 @@ class RAGService:
                 },
                 "sources": sources,
                 "context_used": len(relevant_docs) > 0,
-                "num_sources": len(sources)
+                "num_sources": len(sources),
+                "timings": timings
             }
             
             # Create RAG chain with pre-retrieved documents (no additional retrieval)
             rag_chain = self._create_rag_chain_with_docs(relevant_docs, conversation_history)
             
             # Stream the response from LLM
+            answer_parts: List[str] = []
             async for chunk in rag_chain.astream(question):
                 if chunk:  # Only yield non-empty chunks
+                    answer_parts.append(chunk)
                     yield {
                         "type": "chunk",
                         "content": chunk
                     }
+
+            if cache_vector is not None:
+                self.semantic_cache.store(
+                    user_id,
+                    knowledge_base_id,
+                    kb_version,
+                    question,
+                    cache_vector,
+                    "".join(answer_parts),
+                    sources,
+                    {"rewritten_query": rewritten_query, "expanded_keywords": expanded_keywords},
+                    latency_ms=(time.perf_counter() - request_started) * 1000
+                )
             
             # Yield completion signal with sources for frontend display
             yield {
@@ -557,8 +681,9 @@ class RAGService:
             if conversation_history is None:
                 conversation_history = []
             
-            # Intent detection first
-            use_kb = self._should_use_knowledge_base(question)
+            # Query analysis: intent + rewrite in one call
+            analysis = await self._analyze_query(question, conversation_history)
+            use_kb = analysis["use_kb"]
             # If a specific knowledge base is provided, always use KB retrieval
             if knowledge_base_id:
                 use_kb = True
@@ -568,7 +693,7 @@ class RAGService:
             if not use_kb:
                 # General chat path without KB
                 chain = self._create_general_chat_chain(conversation_history)
-                answer = chain.invoke(question)
+                answer = await chain.ainvoke(question)
                 return {
                     "question": question,
                     "answer": answer,
@@ -577,49 +702,24 @@ class RAGService:
                     "num_sources": 0
                 }
             
-            # Optionally enhance query for KB retrieval
-            enhance = self._enhance_query_for_kb(question, conversation_history)
-            rewritten_query = enhance.get("rewritten_query", question)
-            expanded_keywords = enhance.get("expanded_keywords", [])
-
-            # Create collection names for user's documents (chunks only)
-            collection_name = f"document_chunks_{user_id}".replace("-", "_")
-            
-            # Connect to vector store
-            vector_store = PGVector(
-                connection=self.connection_string,
-                embeddings=self.embeddings,
-                collection_name=collection_name,
-                use_jsonb=True
-            )
-            # Keywords store removed; keep only chunks vector store
-            
-            # Build filter conditions
-            filter_conditions = {}
-            if knowledge_base_id:
-                filter_conditions["knowledge_base_id"] = str(knowledge_base_id)
-            
-            # Multi-route retrieval: content (vector) + text (tsvector)
-            content_results = vector_store.similarity_search_with_relevance_scores(
-                rewritten_query, k=context_limit, filter=filter_conditions if filter_conditions else None
-            )
+            rewritten_query = analysis["rewritten_query"]
+            expanded_keywords = analysis["expanded_keywords"]
 
-            # Third route: PostgreSQL tsvector full-text search on chunk collection
-            text_results = await self._tsvector_search(
-                collection_name,
+            # Multi-route retrieval: content (vector) + text (tsvector), run concurrently
+            relevant_docs, sources, _ = await self._retrieve_multi_route(
                 question,
-                k=context_limit,
+                rewritten_query,
+                expanded_keywords,
+                user_id,
                 knowledge_base_id=knowledge_base_id,
-                extra_terms=expanded_keywords
+                context_limit=context_limit
             )
-
-            relevant_docs, sources = await self._merge_docs_with_scores(content_results, text_results, question, top_k=context_limit)
             
             # Create RAG chain using pre-fetched docs
             rag_chain = self._create_rag_chain_with_docs(relevant_docs, conversation_history)
             
             # Generate answer using RAG chain
-            answer = rag_chain.invoke(question)
+            answer = await rag_chain.ainvoke(question)
             
             # Format sources already prepared in merge step (truncate content for non-streaming)
             for s in sources:
@@ -668,28 +768,22 @@ class RAGService:
             # Create collection name for user's documents
             collection_name = f"document_chunks_{user_id}".replace("-", "_")
             
-            # Connect to vector store
-            vector_store = PGVector(
-                connection=self.connection_string,
-                embeddings=self.embeddings,
-                collection_name=collection_name,
-                use_jsonb=True
-            )
-            
             # Build filter conditions
             filter_conditions = {}
             if knowledge_base_id:
                 filter_conditions["knowledge_base_id"] = str(knowledge_base_id)
             
-            # Perform similarity search
-            results = vector_store.similarity_search_with_score(
-                query=query,
+            # Perform similarity search (cosine distance) through the managed ANN index
+            query_embedding = await self.embeddings.aembed_query(query)
+            results = await self.vector_stores.similarity_search(
+                collection_name,
+                query_embedding,
                 k=limit,
                 filter=filter_conditions if filter_conditions else None
             )
             
-            # Sort by similarity score in descending order (higher scores first)
-            results = sorted(results, key=lambda x: x[1], reverse=True)
+            # Scores are cosine distances: closest (smallest) first
+            results = sorted(results, key=lambda x: x[1])
             
             # Format results
             search_results = []
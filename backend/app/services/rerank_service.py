@@ -1,7 +1,21 @@
 """
 Rerank service using LangChain and various rerank models
+
+Concurrent requests share the model through a micro-batcher: (query, passage) pairs queued
+within RERANK_BATCH_WINDOW_MS (or until RERANK_BATCH_SIZE pairs are waiting) are scored in
+one model call on a single inference thread. Scores are cached per (model, query, chunk),
+so a repeated or overlapping question only scores the passages it has not seen.
+
+The model is loaded on that same thread in the background, at startup when
+RERANK_WARMUP_ON_STARTUP is set or else on first use; until it is ready, retrieval skips
+reranking instead of waiting for it.
 """
+import hashlib
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
@@ -12,14 +26,165 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds of the batch-size histogram buckets (pairs per model call)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Model lifecycle states
+MODEL_DISABLED = "disabled"
+MODEL_NOT_LOADED = "not_loaded"
+MODEL_LOADING = "loading"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux), for the model's memory footprint"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _parameter_bytes(model) -> Optional[int]:
+    """Size of the torch weights behind a CrossEncoder / FlagReranker, if reachable"""
+    module = getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in module.parameters())
+    except Exception:
+        return None
+
+
+class _RerankRequest:
+    """Pairs of one rerank call waiting for the batcher"""
+
+    __slots__ = ("pairs", "future", "queued_at")
+
+    def __init__(self, pairs: List[List[str]], future: asyncio.Future):
+        self.pairs = pairs
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class RerankScoreCache:
+    """Thread-safe LRU of rerank scores keyed by (model, query hash, chunk key)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def query_hash(query: str) -> str:
+        return hashlib.sha1(query.strip().encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def chunk_key(doc: LangChainDocument) -> str:
+        # The content digest keeps a re-chunked document from reusing stale scores
+        digest = hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:16]
+        metadata = doc.metadata or {}
+        return f"{metadata.get('document_id')}:{metadata.get('chunk_index')}:{digest}"
+
+    def get_many(self, keys: List[Tuple[str, str, str]]) -> List[Optional[float]]:
+        if self.max_entries <= 0:
+            return [None] * len(keys)
+        with self._lock:
+            scores = []
+            for key in keys:
+                score = self._scores.get(key)
+                if score is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._scores.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def put_many(self, items: List[Tuple[Tuple[str, str, str], float]]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key, score in items:
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
 
 class RerankService:
     """Rerank service for improving retrieval results quality"""
     
     def __init__(self):
         self.model = None
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        # One inference thread: batches run back to back instead of competing for cores
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self.cache = RerankScoreCache(settings.RERANK_CACHE_MAX_ENTRIES)
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._queued_pairs = 0
+        self._batch_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS + (float("inf"),)}
+        self._counters = {"batches": 0, "pairs": 0, "requests": 0, "model_ms": 0.0, "wait_ms": 0.0}
+        self.state = MODEL_NOT_LOADED if settings.RERANK_ENABLED else MODEL_DISABLED
+        self._state_lock = threading.Lock()
+        self._load_info: Dict[str, Any] = {}
+
+    def start_loading(self) -> bool:
+        """Load the model in the background on the inference thread; False if already loading/loaded"""
+        with self._state_lock:
+            if self.state != MODEL_NOT_LOADED:
+                return False
+            self.state = MODEL_LOADING
+        self.executor.submit(self._load)
+        return True
+
+    def _load(self) -> None:
+        started = time.perf_counter()
+        rss_before = _rss_bytes()
         self._initialize_model()
+        info: Dict[str, Any] = {
+            "load_seconds": round(time.perf_counter() - started, 2),
+            "loaded_at": time.time(),
+            "model_class": type(self.model).__name__ if self.model is not None else None,
+            "parameter_bytes": _parameter_bytes(self.model)
+        }
+        rss_after = _rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            # Approximate: includes the libraries imported by the first load
+            info["rss_delta_bytes"] = max(0, rss_after - rss_before)
+        self._load_info = info
+        with self._state_lock:
+            self.state = MODEL_READY if self.model is not None else MODEL_FAILED
+        logger.info(f"Rerank model {self.state} in {info['load_seconds']}s")
+
+    def model_status(self) -> Dict[str, Any]:
+        """Lifecycle state, load time and memory footprint of the rerank model"""
+        return {
+            "model": settings.RERANK_MODEL,
+            "backend": settings.RERANK_BACKEND,
+            "device": settings.RERANK_DEVICE,
+            "state": self.state,
+            "process_rss_bytes": _rss_bytes(),
+            **self._load_info
+        }
+
+    def shutdown(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
     
     def _initialize_model(self):
         """Initialize rerank model based on configuration"""
@@ -33,8 +198,7 @@ class RerankService:
             
             # Choose implementation based on model name
             if model_name.lower().startswith(("cross-encoder", "sentence-transformers")):
-                from sentence_transformers import CrossEncoder
-                self.model = CrossEncoder(model_name, device=settings.RERANK_DEVICE)
+                self.model = self._load_cross_encoder(model_name)
                 logger.info("Sentence-transformers rerank model initialized successfully")
             else:
                 # Prefer FlagEmbedding for BGE rerankers
@@ -48,11 +212,10 @@ class RerankService:
                     logger.info("FlagEmbedding rerank model initialized successfully")
                 except Exception as e:
                     logger.warning(f"FlagEmbedding init failed ({e}); falling back to CrossEncoder")
-                    from sentence_transformers import CrossEncoder
                     # Fallback to a lightweight cross-encoder if provided model is incompatible
                     fallback_model = model_name if model_name.lower().startswith("cross-encoder") else "cross-encoder/ms-marco-MiniLM-L-6-v2"
                     try:
-                        self.model = CrossEncoder(fallback_model, device=settings.RERANK_DEVICE)
+                        self.model = self._load_cross_encoder(fallback_model)
                         logger.info("Sentence-transformers rerank model initialized successfully (fallback)")
                     except Exception as e2:
                         logger.error(f"Failed to initialize any rerank model: {e2}")
@@ -61,35 +224,119 @@ class RerankService:
             logger.error(f"Unexpected error during rerank model initialization: {e}")
             self.model = None
     
-    def _compute_rerank_scores(self, query: str, documents: List[str]) -> List[float]:
-        """Compute rerank scores for documents"""
-        if not self.model:
-            # Return original order scores if model is not available
-            return [1.0 - i * 0.1 for i in range(len(documents))]
+    @staticmethod
+    def _load_cross_encoder(model_name: str):
+        """CrossEncoder on the configured backend; ONNX/OpenVINO need sentence-transformers >= 4.1"""
+        from sentence_transformers import CrossEncoder
+
+        backend = settings.RERANK_BACKEND.strip().lower()
+        if backend in ("onnx", "openvino"):
+            model_kwargs = {"file_name": settings.RERANK_ONNX_FILE} if settings.RERANK_ONNX_FILE else {}
+            try:
+                model = CrossEncoder(
+                    model_name,
+                    device=settings.RERANK_DEVICE,
+                    backend=backend,
+                    model_kwargs=model_kwargs
+                )
+                logger.info(f"Rerank model loaded with {backend} backend ({settings.RERANK_ONNX_FILE or 'default file'})")
+                return model
+            except Exception as e:
+                logger.warning(f"{backend} rerank backend unavailable ({e}); using torch")
+        return CrossEncoder(model_name, device=settings.RERANK_DEVICE)
+
+    def _compute_rerank_scores(self, pairs: List[List[str]]) -> List[float]:
+        """Score (query, passage) pairs in one model call; runs on the inference thread"""
+        if hasattr(self.model, 'compute_score'):
+            # FlagReranker
+            scores = self.model.compute_score(pairs, batch_size=settings.RERANK_BATCH_SIZE, normalize=True)
+        else:
+            # CrossEncoder
+            scores = self.model.predict(pairs, batch_size=settings.RERANK_BATCH_SIZE, show_progress_bar=False)
         
-        try:
-            # Prepare query-document pairs
-            pairs = [[query, doc] for doc in documents]
-            
-            # Compute scores based on model type
-            if hasattr(self.model, 'compute_score'):
-                # FlagReranker
-                scores = self.model.compute_score(pairs, normalize=True)
-            else:
-                # CrossEncoder
-                scores = self.model.predict(pairs)
-            
-            # Ensure scores is a list
-            if not isinstance(scores, list):
-                scores = scores.tolist()
-            
-            return scores
-            
-        except Exception as e:
-            logger.error(f"Error computing rerank scores: {e}")
-            # Return fallback scores
-            return [1.0 - i * 0.1 for i in range(len(documents))]
-    
+        # Ensure scores is a list (FlagReranker returns a bare float for one pair)
+        if isinstance(scores, (int, float)):
+            scores = [scores]
+        elif not isinstance(scores, list):
+            scores = scores.tolist()
+        return [float(score) for score in scores]
+
+    async def _score_pairs(self, pairs: List[List[str]]) -> List[float]:
+        """Queue pairs for the micro-batcher and wait for their scores"""
+        loop = asyncio.get_running_loop()
+        if self._batcher is None or self._batcher.done():
+            self._queue = asyncio.Queue()
+            self._batcher = loop.create_task(self._batch_loop())
+        future = loop.create_future()
+        self._queued_pairs += len(pairs)
+        self._queue.put_nowait(_RerankRequest(pairs, future))
+        return await future
+
+    async def _batch_loop(self) -> None:
+        """Collect queued requests into batches of up to RERANK_BATCH_SIZE pairs and score them"""
+        loop = asyncio.get_running_loop()
+        window = settings.RERANK_BATCH_WINDOW_MS / 1000
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0].pairs)
+            deadline = loop.time() + window
+            while size < settings.RERANK_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request.pairs)
+            self._queued_pairs -= size
+
+            # Requests whose caller has gone away (timeout, disconnect) are not scored
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+            pairs = [pair for request in batch for pair in request.pairs]
+            started = time.perf_counter()
+            try:
+                scores = await loop.run_in_executor(self.executor, self._compute_rerank_scores, pairs)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+            self._record_batch(batch, len(pairs), started, finished)
+
+            offset = 0
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_result(scores[offset:offset + len(request.pairs)])
+                offset += len(request.pairs)
+
+    def _record_batch(self, batch: List[_RerankRequest], size: int, started: float, finished: float) -> None:
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), float("inf"))
+        self._batch_histogram[bucket] += 1
+        self._counters["batches"] += 1
+        self._counters["pairs"] += size
+        self._counters["requests"] += len(batch)
+        self._counters["model_ms"] += (finished - started) * 1000
+        self._counters["wait_ms"] += sum((started - request.queued_at) * 1000 for request in batch)
+
+    async def compute_scores(self, query: str, documents: List[LangChainDocument]) -> List[float]:
+        """Rerank scores for documents, served from the score cache where possible"""
+        model_name = settings.RERANK_MODEL
+        query_hash = self.cache.query_hash(query)
+        keys = [(model_name, query_hash, self.cache.chunk_key(doc)) for doc in documents]
+        scores = self.cache.get_many(keys)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            computed = await self._score_pairs([[query, documents[i].page_content] for i in missing])
+            for i, score in zip(missing, computed):
+                scores[i] = score
+            self.cache.put_many([(keys[i], score) for i, score in zip(missing, computed)])
+        return scores
+
     async def rerank_documents(
         self,
         query: str,
@@ -109,7 +356,7 @@ class RerankService:
         Returns:
             Tuple of (reranked_documents, reranked_sources)
         """
-        if not settings.RERANK_ENABLED or not self.model or not documents:
+        if not self.is_enabled() or not documents:
             return documents, sources
         
         if top_k is None:
@@ -121,17 +368,8 @@ class RerankService:
             candidate_docs = documents[:max_candidates]
             candidate_sources = sources[:max_candidates]
             
-            # Extract document texts for reranking
-            doc_texts = [doc.page_content for doc in candidate_docs]
-            
-            # Compute rerank scores in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            rerank_scores = await loop.run_in_executor(
-                self.executor,
-                self._compute_rerank_scores,
-                query,
-                doc_texts
-            )
+            # Cached scores, the rest through the micro-batcher
+            rerank_scores = await self.compute_scores(query, candidate_docs)
             
             # Combine documents with their rerank scores
             doc_score_pairs = []
@@ -168,12 +406,38 @@ class RerankService:
             return documents[:top_k], sources[:top_k]
     
     def is_enabled(self) -> bool:
-        """Check if rerank is enabled and model is available"""
-        return settings.RERANK_ENABLED and self.model is not None
+        """Check if rerank is enabled and the model is loaded; starts a background load on first use"""
+        if self.state == MODEL_NOT_LOADED:
+            self.start_loading()
+        return settings.RERANK_ENABLED and self.state == MODEL_READY
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, batch-size histogram, timings and score cache counters"""
+        batches = self._counters["batches"]
+        requests = self._counters["requests"]
+        return {
+            "enabled": settings.RERANK_ENABLED and self.state == MODEL_READY,
+            "state": self.state,
+            "model": settings.RERANK_MODEL,
+            "backend": settings.RERANK_BACKEND,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queued_pairs": self._queued_pairs,
+            "batches": batches,
+            "pairs": self._counters["pairs"],
+            "requests": requests,
+            "avg_batch_size": round(self._counters["pairs"] / batches, 2) if batches else 0.0,
+            "avg_model_ms": round(self._counters["model_ms"] / batches, 1) if batches else 0.0,
+            "avg_wait_ms": round(self._counters["wait_ms"] / requests, 1) if requests else 0.0,
+            "batch_size_histogram": {
+                (f"<={bucket}" if bucket != float("inf") else f">{BATCH_SIZE_BUCKETS[-1]}"): count
+                for bucket, count in self._batch_histogram.items()
+            },
+            "cache": self.cache.stats()
+        }
 
 
 # Global rerank service instance
-_rerank_service = None
+_rerank_service: Optional[RerankService] = None
 
 
 def get_rerank_service() -> RerankService:
@@ -181,4 +445,4 @@ def get_rerank_service() -> RerankService:
     global _rerank_service
     if _rerank_service is None:
         _rerank_service = RerankService()
-    return _rerank_service
\ No newline at end of file
+    return _rerank_service
@@ -0,0 +1,170 @@
+"""
+Resume evaluation result cache.
+
+An evaluation is keyed by the SHA256 of the normalized resume text plus content hashes of the
+job description fields and the scoring criteria (evaluation model) that went into the prompt,
+so an edited JD or criteria can never hit an old entry. Rows for a JD or criteria are also
+deleted when it is updated or deleted, keeping the table small.
+"""
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, or_, text
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.job_description import JobDescription
+from app.models.resume_evaluation_cache import ResumeEvaluationCacheEntry
+from app.schemas.resume_evaluation import AIEvaluationResult
+
+logger = logging.getLogger(__name__)
+
+# JD fields that are part of the evaluation prompt
+_JD_PROMPT_FIELDS = ("title", "department", "requirements", "skills", "education", "experience_level", "content")
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def resume_text_hash(resume_text: str) -> str:
+    """SHA256 of the resume text with whitespace collapsed"""
+    return _sha256(re.sub(r"\s+", " ", resume_text or "").strip())
+
+
+def job_description_hash(jd: JobDescription) -> str:
+    payload = {field: getattr(jd, field, None) for field in _JD_PROMPT_FIELDS}
+    return _sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str))
+
+
+class ResumeEvaluationCache:
+    """Postgres-backed cache of AIEvaluationResult; each call uses its own short session"""
+
+    def __init__(self, ttl_days: int):
+        self.ttl_days = ttl_days
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def build_key(resume_text: str, jd: JobDescription, evaluation_model: str) -> Tuple[str, str, str, str]:
+        """Returns (cache_key, resume_hash, jd_hash, criteria_hash)"""
+        resume_hash = resume_text_hash(resume_text)
+        jd_hash = job_description_hash(jd)
+        criteria_hash = _sha256(evaluation_model or "")
+        return _sha256(f"{resume_hash}:{jd_hash}:{criteria_hash}"), resume_hash, jd_hash, criteria_hash
+
+    async def get(self, cache_key: str) -> Optional[Tuple[AIEvaluationResult, str]]:
+        """Return (ai_result, raw_response) for a fresh entry, touching its access stats"""
+        query = text(
+            "UPDATE resume_evaluation_cache "
+            "SET last_accessed_at = :now, hit_count = hit_count + 1 "
+            "WHERE cache_key = :cache_key AND created_at >= :fresh_after "
+            "RETURNING ai_result, raw_response"
+        )
+        now = datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(query, {
+                    "now": now,
+                    "cache_key": cache_key,
+                    "fresh_after": now - timedelta(days=self.ttl_days)
+                })
+                row = result.first()
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Resume evaluation cache lookup failed: {e}")
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        ai_result = row[0] if isinstance(row[0], dict) else json.loads(row[0])
+        return AIEvaluationResult(**ai_result), row[1] or ""
+
+    async def put(
+        self,
+        keys: Tuple[str, str, str, str],
+        job_description_id: UUID,
+        scoring_criteria_id: Optional[UUID],
+        ai_result: AIEvaluationResult,
+        raw_response: str
+    ) -> None:
+        cache_key, resume_hash, jd_hash, criteria_hash = keys
+        now = datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    text(
+                        "INSERT INTO resume_evaluation_cache "
+                        "(cache_key, resume_hash, job_description_id, scoring_criteria_id, jd_hash, "
+                        " criteria_hash, ai_result, raw_response, hit_count, created_at, last_accessed_at) "
+                        "VALUES (:cache_key, :resume_hash, :job_description_id, :scoring_criteria_id, :jd_hash, "
+                        " :criteria_hash, CAST(:ai_result AS json), :raw_response, 0, :now, :now) "
+                        "ON CONFLICT (cache_key) DO UPDATE SET "
+                        " ai_result = EXCLUDED.ai_result, raw_response = EXCLUDED.raw_response, "
+                        " created_at = EXCLUDED.created_at, last_accessed_at = EXCLUDED.last_accessed_at"
+                    ),
+                    {
+                        "cache_key": cache_key,
+                        "resume_hash": resume_hash,
+                        "job_description_id": job_description_id,
+                        "scoring_criteria_id": scoring_criteria_id,
+                        "jd_hash": jd_hash,
+                        "criteria_hash": criteria_hash,
+                        "ai_result": json.dumps(ai_result.model_dump(), ensure_ascii=False),
+                        "raw_response": raw_response,
+                        "now": now
+                    }
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Resume evaluation cache write failed: {e}")
+
+    async def invalidate(
+        self,
+        job_description_id: Optional[UUID] = None,
+        scoring_criteria_id: Optional[UUID] = None
+    ) -> int:
+        """Drop cached evaluations for an updated/deleted JD and/or scoring criteria"""
+        conditions = []
+        if job_description_id is not None:
+            conditions.append(ResumeEvaluationCacheEntry.job_description_id == job_description_id)
+        if scoring_criteria_id is not None:
+            conditions.append(ResumeEvaluationCacheEntry.scoring_criteria_id == scoring_criteria_id)
+        if not conditions:
+            return 0
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(delete(ResumeEvaluationCacheEntry).where(or_(*conditions)))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Resume evaluation cache invalidation failed: {e}")
+            return 0
+        deleted = result.rowcount or 0
+        if deleted:
+            logger.info(
+                f"Resume evaluation cache invalidated {deleted} entries "
+                f"(jd={job_description_id}, criteria={scoring_criteria_id})"
+            )
+        return deleted
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Global cache instance
+_resume_evaluation_cache: Optional[ResumeEvaluationCache] = None
+
+
+def get_resume_evaluation_cache() -> ResumeEvaluationCache:
+    """Get global resume evaluation cache instance"""
+    global _resume_evaluation_cache
+    if _resume_evaluation_cache is None:
+        _resume_evaluation_cache = ResumeEvaluationCache(ttl_days=settings.RESUME_EVAL_CACHE_TTL_DAYS)
+    return _resume_evaluation_cache
@@ -1,14 +1,22 @@
 """
 Resume Evaluation Service for AI-powered resume scoring
 """
+import asyncio
 import logging
 import json
+import os
 import re
-from typing import Dict, Any, Optional, List
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Union, BinaryIO, AsyncIterator
 from uuid import UUID
+from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.core.config import settings
+
 from app.models.resume_evaluation import ResumeEvaluation, ResumeStatus
 from app.models.job_description import JobDescription
 from app.models.scoring_criteria import ScoringCriteria
@@ -19,6 +27,9 @@ from app.schemas.resume_evaluation import (
 )
 from app.services.dify_service import DifyService
 from app.services.resume_parser_service import ResumeParserService
+from app.services.extraction_service import get_extraction_engine
+from app.services.resume_evaluation_cache import get_resume_evaluation_cache
+from app.utils.file_utils import FileTooLargeError, StoredFile, save_upload_stream
 
 logger = logging.getLogger(__name__)
 
@@ -34,25 +45,42 @@ class ResumeEvaluationService:
     async def evaluate_resume(
         self,
         user_id: UUID,
-        file_content: bytes,
+        file: Union[UploadFile, BinaryIO],
         filename: str,
         job_description_id: UUID,
-        conversation_id: Optional[UUID] = None
+        conversation_id: Optional[UUID] = None,
+        force_refresh: bool = False
     ) -> Dict[str, Any]:
-        """评价简历"""
+        """评价简历（相同简历文本、JD和评价模型命中缓存时不再调用Dify；force_refresh 强制重新评价）"""
+        stored = None
         try:
-            # 1. 验证文件
-            is_valid, message = self.resume_parser.validate_file(filename, len(file_content))
+            # 1. 验证文件格式（大小在流式保存时校验）
+            is_valid, message = self.resume_parser.validate_file(filename, 0)
             if not is_valid:
                 raise ValueError(message)
-            
-            # 2. 提取文本内容
-            resume_text = await self.resume_parser.extract_text_from_file(file_content, filename)
+
+            # 2. 流式保存到临时文件，同时计算哈希，不在内存中保留整个文件
+            try:
+                stored = await save_upload_stream(
+                    file,
+                    os.path.join(settings.UPLOAD_DIR, "resumes", str(user_id)),
+                    filename=filename,
+                    max_size=self.resume_parser.max_file_size
+                )
+            except FileTooLargeError:
+                raise ValueError(f"文件大小超过限制 ({self.resume_parser.max_file_size / 1024 / 1024}MB)")
+            if stored.file_size == 0:
+                raise ValueError("文件内容为空")
+
+            # 3. 提取文本内容；原件含候选人个人信息，提取后立即删除，不做保留
+            resume_text = await self.resume_parser.extract_text_from_path(stored.path, filename)
+            stored.discard()
             if not resume_text.strip():
                 raise ValueError("无法从文件中提取到有效内容")
             
-            # 3. 获取文件信息
-            file_info = self.resume_parser.get_file_info(filename, file_content)
+            # 获取文件信息
+            file_info = self.resume_parser.get_stored_file_info(stored)
+            file_info['filename'] = filename
             
             # 4. 获取JD信息
             jd = await self._get_job_description(job_description_id)
@@ -60,13 +88,16 @@ class ResumeEvaluationService:
                 raise ValueError("职位描述不存在")
             
             # 5. 获取评价模型
-            evaluation_model = await self._get_evaluation_model(job_description_id)
+            criteria = await self._get_scoring_criteria(job_description_id)
+            evaluation_model = criteria.content if criteria and criteria.content else self._get_default_evaluation_model()
             
-            # 6. 调用Dify API进行评价
-            ai_result, raw_response = await self._call_dify_evaluation(
+            # 6. 查询缓存，未命中时调用Dify API进行评价
+            ai_result, raw_response, cached = await self._evaluate_with_cache(
                 resume_text=resume_text,
                 evaluation_model=evaluation_model,
-                jd_info=jd
+                jd=jd,
+                scoring_criteria_id=criteria.id if criteria else None,
+                force_refresh=force_refresh
             )
             
             # 7. 保存评价结果
@@ -77,30 +108,175 @@ class ResumeEvaluationService:
                 ai_result=ai_result,
                 job_description_id=job_description_id,
                 conversation_id=conversation_id,
-                raw_response=raw_response
+                raw_response=raw_response,
+                scoring_criteria_id=criteria.id if criteria else None
             )
             
             # 8. 返回完整结果
-            return {
-                "id": evaluation_record.id,
-                "evaluation_metrics": [metric.model_dump() for metric in ai_result.evaluation_metrics],
-                "total_score": ai_result.total_score,
-                "name": ai_result.name,
-                "position": ai_result.position,
-                "workYears": (self._parse_work_years_to_float(ai_result.workYears) or 0.0),
-                "education": ai_result.教育水平,
-                "age": ai_result.年龄,
-                "sex": ai_result.sex,
-                "school": ai_result.school,
-                "resume_content": resume_text,
-                "original_filename": file_info['filename'],
-                "created_at": evaluation_record.created_at.isoformat()
-            }
+            result = self._build_result(evaluation_record, ai_result, resume_text, file_info['filename'])
+            result["cached"] = cached
+            return result
             
         except Exception as e:
             logger.error(f"简历评价失败: {e}")
             raise
+        finally:
+            if stored is not None:
+                stored.discard()
     
+    async def evaluate_resume_batch(
+        self,
+        user_id: UUID,
+        files: List[StoredFile],
+        job_description_id: UUID,
+        conversation_id: Optional[UUID] = None,
+        force_refresh: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        批量评价同一职位的简历，按完成顺序产出进度事件。
+
+        JD和评价模型只加载一次；文本提取在提取进程池中并行执行，Dify评分受
+        RESUME_BATCH_CONCURRENCY 限制并发（缓存命中不占用并发）；评价记录按 RESUME_BATCH_INSERT_SIZE 批量写入。
+        """
+        jd = await self._get_job_description(job_description_id)
+        if not jd:
+            for stored in files:
+                stored.discard()
+            raise ValueError("职位描述不存在")
+        criteria = await self._get_scoring_criteria(job_description_id)
+        evaluation_model = criteria.content if criteria and criteria.content else self._get_default_evaluation_model()
+
+        engine = get_extraction_engine()
+        semaphore = asyncio.Semaphore(max(1, settings.RESUME_BATCH_CONCURRENCY))
+        started = time.perf_counter()
+
+        async def evaluate_one(stored: StoredFile) -> Dict[str, Any]:
+            try:
+                resume_text = await engine.extract(stored.mime_type, file_path=stored.path)
+                # 原件只用于提取，不做保留
+                stored.discard()
+                if not resume_text.strip():
+                    raise ValueError("无法从文件中提取到有效内容")
+                ai_result, raw_response, cached = await self._evaluate_with_cache(
+                    resume_text=resume_text,
+                    evaluation_model=evaluation_model,
+                    jd=jd,
+                    scoring_criteria_id=criteria.id if criteria else None,
+                    force_refresh=force_refresh,
+                    semaphore=semaphore
+                )
+                record = self._build_evaluation_record(
+                    user_id=user_id,
+                    file_info=self.resume_parser.get_stored_file_info(stored),
+                    resume_text=resume_text,
+                    ai_result=ai_result,
+                    job_description_id=job_description_id,
+                    raw_response=raw_response,
+                    conversation_id=conversation_id,
+                    scoring_criteria_id=criteria.id if criteria else None
+                )
+                return {"stored": stored, "record": record, "ai_result": ai_result, "resume_text": resume_text,
+                        "cached": cached}
+            except Exception as e:
+                logger.warning(f"批量简历评价失败 {stored.filename}: {e}")
+                return {"stored": stored, "error": str(e)}
+
+        pending: List[ResumeEvaluation] = []
+        ranking: List[Dict[str, Any]] = []
+        failed = 0
+        cache_hits = 0
+
+        async def flush() -> None:
+            nonlocal pending
+            records, pending = pending, []
+            await self._save_evaluation_records(records)
+
+        tasks = [asyncio.create_task(evaluate_one(stored)) for stored in files]
+        try:
+            for completed, next_done in enumerate(asyncio.as_completed(tasks), 1):
+                outcome = await next_done
+                stored = outcome["stored"]
+                event: Dict[str, Any] = {"type": "progress", "completed": completed, "total": len(files)}
+                if "error" in outcome:
+                    failed += 1
+                    event.update({"filename": stored.filename, "status": "failed", "error": outcome["error"]})
+                else:
+                    record = outcome["record"]
+                    pending.append(record)
+                    cache_hits += int(outcome["cached"])
+                    result = self._build_result(record, outcome["ai_result"], outcome["resume_text"], stored.filename)
+                    result.pop("resume_content")
+                    result["cached"] = outcome["cached"]
+                    ranking.append({
+                        "id": str(record.id),
+                        "original_filename": stored.filename,
+                        "name": result["name"],
+                        "total_score": result["total_score"]
+                    })
+                    ranking.sort(key=lambda item: item["total_score"] or 0, reverse=True)
+                    event.update({
+                        "filename": stored.filename,
+                        "status": "evaluated",
+                        "result": result,
+                        "rank": next(i for i, item in enumerate(ranking, 1) if item["id"] == str(record.id))
+                    })
+                    if len(pending) >= settings.RESUME_BATCH_INSERT_SIZE:
+                        await flush()
+                yield event
+
+            if pending:
+                await flush()
+        finally:
+            for task in tasks:
+                task.cancel()
+            # 客户端断开（GeneratorExit）或出错时，未完成提取的文件同样删除
+            for stored in files:
+                stored.discard()
+            # 已完成的评价仍然落库；shield 保证写入不被请求取消打断
+            if pending:
+                try:
+                    await asyncio.shield(flush())
+                except Exception as e:
+                    logger.error(f"批量评价中断后保存已完成结果失败: {e}")
+
+        yield {
+            "type": "complete",
+            "total": len(files),
+            "evaluated": len(ranking),
+            "failed": failed,
+            "cached": cache_hits,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "ranking": ranking
+        }
+
+    async def _evaluate_with_cache(
+        self,
+        resume_text: str,
+        evaluation_model: str,
+        jd: JobDescription,
+        scoring_criteria_id: Optional[UUID],
+        force_refresh: bool = False,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> tuple[AIEvaluationResult, str, bool]:
+        """返回 (ai_result, raw_response, cached)；缓存键为简历文本、JD内容和评价模型的哈希"""
+        cache = get_resume_evaluation_cache() if settings.RESUME_EVAL_CACHE_ENABLED else None
+        keys = cache.build_key(resume_text, jd, evaluation_model) if cache else None
+        if cache and not force_refresh:
+            hit = await cache.get(keys[0])
+            if hit is not None:
+                return hit[0], hit[1], True
+
+        if semaphore is not None:
+            async with semaphore:
+                ai_result, raw_response = await self._call_dify_evaluation(resume_text, evaluation_model, jd)
+        else:
+            ai_result, raw_response = await self._call_dify_evaluation(resume_text, evaluation_model, jd)
+
+        # 解析失败的默认结果不缓存，下次重新评价
+        if cache and not self._is_default_result(ai_result):
+            await cache.put(keys, jd.id, scoring_criteria_id, ai_result, raw_response)
+        return ai_result, raw_response, False
+
     async def _get_job_description(self, jd_id: UUID) -> Optional[JobDescription]:
         """获取职位描述"""
         try:
@@ -112,14 +288,22 @@ class ResumeEvaluationService:
             logger.error(f"获取职位描述失败: {e}")
             return None
     
-    async def _get_evaluation_model(self, jd_id: UUID) -> str:
-        """获取评价模型"""
+    async def _get_scoring_criteria(self, jd_id: UUID) -> Optional[ScoringCriteria]:
+        """获取与JD关联的评分标准"""
         try:
-            # 查询与JD关联的评分标准
             result = await self.db.execute(
                 select(ScoringCriteria).where(ScoringCriteria.job_description_id == jd_id)
             )
-            criteria = result.scalar_one_or_none()
+            return result.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"获取评分标准失败: {e}")
+            return None
+    
+    async def _get_evaluation_model(self, jd_id: UUID) -> str:
+        """获取评价模型"""
+        try:
+            # 查询与JD关联的评分标准
+            criteria = await self._get_scoring_criteria(jd_id)
             
             if criteria and criteria.content:
                 return criteria.content
@@ -367,6 +551,73 @@ class ResumeEvaluationService:
             school="未知"
         )
     
+    def _is_default_result(self, ai_result: AIEvaluationResult) -> bool:
+        """是否为 _create_default_result 生成的兜底结果"""
+        return (
+            len(ai_result.evaluation_metrics) == 1
+            and ai_result.evaluation_metrics[0].reason == "AI解析失败，给出默认评分"
+        )
+    
+    def _build_evaluation_record(
+        self,
+        user_id: UUID,
+        file_info: Dict[str, Any],
+        resume_text: str,
+        ai_result: AIEvaluationResult,
+        job_description_id: UUID,
+        raw_response: str = "",
+        conversation_id: Optional[UUID] = None,
+        scoring_criteria_id: Optional[UUID] = None
+    ) -> ResumeEvaluation:
+        """构建评价记录（未写入数据库）"""
+        return ResumeEvaluation(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            original_filename=file_info['filename'],
+            file_path=file_info.get('file_path'),
+            file_type=file_info['file_type'],
+            file_size=file_info['file_size'],
+            resume_content=resume_text,
+            candidate_name=ai_result.name,
+            candidate_position=ai_result.position,
+            candidate_age=ai_result.年龄,
+            candidate_gender=ai_result.sex,
+            work_years=(self._parse_work_years_to_float(ai_result.workYears) or 0.0),
+            education_level=ai_result.教育水平,
+            school=ai_result.school,
+            total_score=ai_result.total_score,
+            evaluation_metrics=[metric.model_dump() for metric in ai_result.evaluation_metrics],
+            job_description_id=job_description_id,
+            scoring_criteria_id=scoring_criteria_id,
+            conversation_id=str(conversation_id) if conversation_id else None,
+            ai_response=raw_response,
+            created_at=datetime.utcnow()
+        )
+
+    def _build_result(
+        self,
+        evaluation_record: ResumeEvaluation,
+        ai_result: AIEvaluationResult,
+        resume_text: str,
+        filename: str
+    ) -> Dict[str, Any]:
+        """构建接口返回的评价结果"""
+        return {
+            "id": evaluation_record.id,
+            "evaluation_metrics": [metric.model_dump() for metric in ai_result.evaluation_metrics],
+            "total_score": ai_result.total_score,
+            "name": ai_result.name,
+            "position": ai_result.position,
+            "workYears": (self._parse_work_years_to_float(ai_result.workYears) or 0.0),
+            "education": ai_result.教育水平,
+            "age": ai_result.年龄,
+            "sex": ai_result.sex,
+            "school": ai_result.school,
+            "resume_content": resume_text,
+            "original_filename": filename,
+            "created_at": evaluation_record.created_at.isoformat()
+        }
+
     async def _save_evaluation_result(
         self,
         user_id: UUID,
@@ -375,30 +626,20 @@ class ResumeEvaluationService:
         ai_result: AIEvaluationResult,
         job_description_id: UUID,
         raw_response: str = "",
-        conversation_id: Optional[UUID] = None
+        conversation_id: Optional[UUID] = None,
+        scoring_criteria_id: Optional[UUID] = None
     ) -> ResumeEvaluation:
         """保存评价结果"""
         try:
-            # 直接创建ResumeEvaluation对象
-            evaluation = ResumeEvaluation(
+            evaluation = self._build_evaluation_record(
                 user_id=user_id,
-                original_filename=file_info['filename'],
-                file_path=file_info.get('file_path'),
-                file_type=file_info['file_type'],
-                file_size=file_info['file_size'],
-                resume_content=resume_text,
-                candidate_name=ai_result.name,
-                candidate_position=ai_result.position,
-                candidate_age=ai_result.年龄,
-                candidate_gender=ai_result.sex,
-                work_years=(self._parse_work_years_to_float(ai_result.workYears) or 0.0),
-                education_level=ai_result.教育水平,
-                school=ai_result.school,
-                total_score=ai_result.total_score,
-                evaluation_metrics=[metric.model_dump() for metric in ai_result.evaluation_metrics],
+                file_info=file_info,
+                resume_text=resume_text,
+                ai_result=ai_result,
                 job_description_id=job_description_id,
-                conversation_id=str(conversation_id) if conversation_id else None,
-                ai_response=raw_response
+                raw_response=raw_response,
+                conversation_id=conversation_id,
+                scoring_criteria_id=scoring_criteria_id
             )
             self.db.add(evaluation)
             await self.db.commit()
@@ -410,6 +651,16 @@ class ResumeEvaluationService:
             await self.db.rollback()
             logger.error(f"保存评价结果失败: {e}")
             raise
+
+    async def _save_evaluation_records(self, records: List[ResumeEvaluation]) -> None:
+        """批量写入评价记录（一次INSERT多行）"""
+        try:
+            self.db.add_all(records)
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"批量保存评价结果失败: {e}")
+            raise
     
     async def get_evaluation_history(
         self,
@@ -8,8 +8,8 @@ import tempfile
 from typing import BinaryIO, Tuple, Optional
 from uuid import UUID
 import mimetypes
-from app.utils.text_utils import extract_text_content
-from app.utils.file_utils import get_file_mime_type
+from app.services.extraction_service import get_extraction_engine
+from app.utils.file_utils import StoredFile, get_file_mime_type
 
 logger = logging.getLogger(__name__)
 
@@ -47,19 +47,17 @@ class ResumeParserService:
             # 统一通过公共方法提取，保持与知识库上传一致
             mime_type = get_file_mime_type(filename)
 
-            # 写入临时文件以复用基于路径的解析逻辑
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
-                temp_file.write(file_content)
-                temp_path = temp_file.name
+            # 直接在进程池中解析内存中的字节，无需写临时文件
+            return await get_extraction_engine().extract(mime_type, data=file_content)
+        except Exception as e:
+            logger.error(f"提取文本内容失败: {e}")
+            raise Exception(f"文件解析失败: {str(e)}")
 
-            try:
-                extracted = await extract_text_content(temp_path, mime_type)
-                return extracted
-            finally:
-                try:
-                    os.unlink(temp_path)
-                except Exception:
-                    pass
+    async def extract_text_from_path(self, file_path: str, filename: str) -> str:
+        """从已保存的文件中提取文本内容（由进程池直接读取文件，不经过内存拷贝）"""
+        try:
+            mime_type = get_file_mime_type(filename)
+            return await get_extraction_engine().extract(mime_type, file_path=file_path)
         except Exception as e:
             logger.error(f"提取文本内容失败: {e}")
             raise Exception(f"文件解析失败: {str(e)}")
@@ -271,4 +269,16 @@ class ResumeParserService:
             'file_size': file_size,
             'file_hash': file_hash,
             'mime_type': mimetypes.guess_type(filename)[0]
-        }
\ No newline at end of file
+        }
+
+    def get_stored_file_info(self, stored: StoredFile) -> dict:
+        """获取已流式保存文件的基本信息（哈希和大小在保存时已计算）"""
+        _, ext = os.path.splitext(stored.filename.lower())
+
+        return {
+            'filename': stored.filename,
+            'file_type': ext.lstrip('.'),
+            'file_size': stored.file_size,
+            'file_hash': stored.file_hash,
+            'mime_type': mimetypes.guess_type(stored.filename)[0]
+        }
@@ -0,0 +1,80 @@
+"""
+Retrieval orchestrator for multi-route RAG retrieval.
+
+Each route (vector, tsvector, ...) runs as its own task with its own timeout. A route that
+times out or fails contributes an empty result list instead of failing the request, so
+retrieval latency is bounded by the slowest single route rather than the sum of all routes.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalRoute:
+    """A named retrieval coroutine factory with an optional timeout (seconds)"""
+
+    def __init__(self, name: str, run: Callable[[], Awaitable[List[tuple]]], timeout: Optional[float] = None):
+        self.name = name
+        self.run = run
+        self.timeout = timeout
+
+
+class RetrievalOutcome:
+    """Per-route results, status and elapsed time"""
+
+    def __init__(self):
+        self.results: Dict[str, List[tuple]] = {}
+        self.statuses: Dict[str, str] = {}
+        self.timings_ms: Dict[str, float] = {}
+        self.total_ms: float = 0.0
+
+    def get(self, name: str) -> List[tuple]:
+        return self.results.get(name, [])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": self.total_ms,
+            "routes": {
+                name: {"status": self.statuses.get(name), "ms": self.timings_ms.get(name), "hits": len(self.get(name))}
+                for name in self.statuses
+            }
+        }
+
+
+class RetrievalOrchestrator:
+    """Fans out retrieval routes concurrently and collects partial results"""
+
+    def __init__(self, default_timeout: Optional[float] = None):
+        self.default_timeout = default_timeout
+
+    async def _run_route(self, route: RetrievalRoute, outcome: RetrievalOutcome) -> None:
+        timeout = route.timeout if route.timeout is not None else self.default_timeout
+        started = time.perf_counter()
+        try:
+            if timeout and timeout > 0:
+                results = await asyncio.wait_for(route.run(), timeout=timeout)
+            else:
+                results = await route.run()
+            outcome.results[route.name] = list(results or [])
+            outcome.statuses[route.name] = "ok"
+        except asyncio.TimeoutError:
+            logger.warning(f"Retrieval route '{route.name}' timed out after {timeout}s, continuing without it")
+            outcome.results[route.name] = []
+            outcome.statuses[route.name] = "timeout"
+        except Exception as e:
+            logger.warning(f"Retrieval route '{route.name}' failed, continuing without it: {e}")
+            outcome.results[route.name] = []
+            outcome.statuses[route.name] = "error"
+        finally:
+            outcome.timings_ms[route.name] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def run(self, routes: List[RetrievalRoute]) -> RetrievalOutcome:
+        """Run all routes concurrently; never raises for a single route failure"""
+        outcome = RetrievalOutcome()
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_route(route, outcome) for route in routes))
+        outcome.total_ms = round((time.perf_counter() - started) * 1000, 1)
+        return outcome
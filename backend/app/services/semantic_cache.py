@@ -0,0 +1,226 @@
+"""
+Semantic answer cache for the knowledge assistant.
+
+Answers are stored per scope (user, knowledge base) together with the scope's KB version.
+A new question is served from the cache when its embedding has cosine similarity above
+SEMANTIC_CACHE_THRESHOLD with a cached question of the same scope and version. Adding or
+deleting documents through EnhancedDocumentService drops the affected scopes; the KB
+version check also catches changes made by other worker processes.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Scope used for questions asked across all of a user's knowledge bases
+ALL_KNOWLEDGE_BASES = "*"
+
+
+class SemanticCacheEntry:
+    """A cached answer and the normalized embedding of the question that produced it"""
+
+    def __init__(
+        self,
+        question: str,
+        vector: np.ndarray,
+        answer: str,
+        sources: List[Dict[str, Any]],
+        query_rewrite: Optional[Dict[str, Any]],
+        kb_version: str,
+        latency_ms: float
+    ):
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.sources = sources
+        self.query_rewrite = query_rewrite
+        self.kb_version = kb_version
+        self.latency_ms = latency_ms
+        self.created_at = time.time()
+
+
+class SemanticCacheScope:
+    """Entries of one (user, knowledge base) scope with a stacked vector matrix for lookup"""
+
+    def __init__(self):
+        self.entries: List[SemanticCacheEntry] = []
+        self.matrix: Optional[np.ndarray] = None
+
+    def rebuild(self) -> None:
+        self.matrix = np.vstack([e.vector for e in self.entries]) if self.entries else None
+
+
+class SemanticAnswerCache:
+    """In-process, thread-safe semantic answer cache"""
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: int,
+        max_entries_per_scope: int,
+        max_scopes: int
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_scope = max_entries_per_scope
+        self.max_scopes = max_scopes
+        self._scopes: "OrderedDict[Tuple[str, str], SemanticCacheScope]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "invalidations": 0,
+            "latency_saved_ms": 0.0
+        }
+
+    @staticmethod
+    def scope_key(user_id: UUID, knowledge_base_id: Optional[UUID]) -> Tuple[str, str]:
+        return str(user_id), str(knowledge_base_id) if knowledge_base_id else ALL_KNOWLEDGE_BASES
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(arr))
+        if norm == 0.0:
+            return None
+        return arr / norm
+
+    async def get_kb_version(self, db: AsyncSession, user_id: UUID, knowledge_base_id: Optional[UUID]) -> str:
+        """Version of the documents visible to a scope: document count and latest change"""
+        sql = "SELECT count(*), max(updated_at) FROM documents WHERE user_id = :user_id"
+        params: Dict[str, Any] = {"user_id": user_id}
+        if knowledge_base_id:
+            sql += " AND knowledge_base_id = :kb_id"
+            params["kb_id"] = knowledge_base_id
+        row = (await db.execute(text(sql), params)).first()
+        count, latest = (row[0], row[1]) if row else (0, None)
+        return f"{count}:{latest.isoformat() if latest else '-'}"
+
+    def lookup(
+        self,
+        user_id: UUID,
+        knowledge_base_id: Optional[UUID],
+        kb_version: str,
+        question_vector: List[float]
+    ) -> Optional[Tuple[SemanticCacheEntry, float]]:
+        """Return (entry, similarity) for the closest cached question above the threshold"""
+        vector = self._normalize(question_vector)
+        key = self.scope_key(user_id, knowledge_base_id)
+        with self._lock:
+            scope = self._scopes.get(key)
+            if vector is None or scope is None or scope.matrix is None:
+                self._counters["misses"] += 1
+                return None
+
+            self._expire(scope, kb_version)
+            if scope.matrix is None or scope.matrix.shape[1] != vector.shape[0]:
+                self._counters["misses"] += 1
+                return None
+
+            similarities = scope.matrix @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self._counters["misses"] += 1
+                return None
+
+            entry = scope.entries[best]
+            self._scopes.move_to_end(key)
+            self._counters["hits"] += 1
+            self._counters["latency_saved_ms"] += entry.latency_ms
+            return entry, similarity
+
+    def store(
+        self,
+        user_id: UUID,
+        knowledge_base_id: Optional[UUID],
+        kb_version: str,
+        question: str,
+        question_vector: List[float],
+        answer: str,
+        sources: List[Dict[str, Any]],
+        query_rewrite: Optional[Dict[str, Any]],
+        latency_ms: float
+    ) -> None:
+        vector = self._normalize(question_vector)
+        if vector is None or not answer:
+            return
+        entry = SemanticCacheEntry(question, vector, answer, sources, query_rewrite, kb_version, latency_ms)
+        key = self.scope_key(user_id, knowledge_base_id)
+        with self._lock:
+            scope = self._scopes.get(key)
+            if scope is None:
+                scope = SemanticCacheScope()
+                self._scopes[key] = scope
+            self._scopes.move_to_end(key)
+            scope.entries.append(entry)
+            if len(scope.entries) > self.max_entries_per_scope:
+                scope.entries = scope.entries[-self.max_entries_per_scope:]
+            self._expire(scope, kb_version)
+            scope.rebuild()
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+            self._counters["stores"] += 1
+
+    def _expire(self, scope: SemanticCacheScope, kb_version: str) -> None:
+        """Drop entries from other KB versions or past their TTL (caller holds the lock)"""
+        now = time.time()
+        kept = [
+            e for e in scope.entries
+            if e.kb_version == kb_version and (self.ttl_seconds <= 0 or now - e.created_at < self.ttl_seconds)
+        ]
+        if len(kept) != len(scope.entries):
+            scope.entries = kept
+            scope.rebuild()
+
+    def invalidate(self, user_id: UUID, knowledge_base_id: Optional[UUID] = None) -> None:
+        """Drop the knowledge base scope and the user's all-knowledge-bases scope"""
+        keys = {self.scope_key(user_id, None), self.scope_key(user_id, knowledge_base_id)}
+        with self._lock:
+            for key in keys:
+                if self._scopes.pop(key, None) is not None:
+                    self._counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = sum(len(scope.entries) for scope in self._scopes.values())
+            scopes = len(self._scopes)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "latency_saved_ms": round(counters["latency_saved_ms"], 1),
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "avg_latency_saved_ms": round(counters["latency_saved_ms"] / counters["hits"], 1) if counters["hits"] else 0.0,
+            "scopes": scopes,
+            "entries": entries,
+            "threshold": self.threshold
+        }
+
+
+# Global cache instance
+_semantic_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_semantic_cache() -> SemanticAnswerCache:
+    """Get global semantic answer cache instance"""
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticAnswerCache(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            max_entries_per_scope=settings.SEMANTIC_CACHE_MAX_ENTRIES_PER_SCOPE,
+            max_scopes=settings.SEMANTIC_CACHE_MAX_SCOPES
+        )
+    return _semantic_cache
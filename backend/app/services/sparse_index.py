@@ -0,0 +1,586 @@
+"""
+In-process BM25 sparse index for the keyword retrieval route.
+
+One index per chunk collection (i.e. per user) holds jieba-tokenized postings for every
+chunk; a knowledge base filter is a mask over per-chunk knowledge base codes. Postings
+live in compact arrays:
+
+- a read-only base segment in CSR layout (``offsets`` per term, int32 chunk numbers,
+  uint16 term frequencies), memory-mapped from RAG_BM25_INDEX_DIR when persisted
+- a small delta segment of ``array`` postings for chunks added since the last merge
+- a tombstone mask for deleted chunks
+
+The delta is merged into a new base in the background once it holds
+RAG_BM25_MERGE_THRESHOLD chunks or a fifth of the chunks are deleted; the old index keeps
+answering queries until the merged one is swapped in. Document statistics (N, df) include
+tombstoned chunks until the merge, as in Lucene.
+
+Only chunk row ids are kept in memory; text and metadata of the top-k hits are read back
+from langchain_pg_embedding by primary key. EnhancedDocumentService and the bulk ingestion
+pipeline update the index incrementally; changes made by other worker processes are
+picked up by a row-count check every RAG_BM25_REFRESH_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from langchain_core.documents import Document as LangChainDocument
+
+from app.core.config import settings
+from app.services.vector_index import EMBEDDING_TABLE
+from app.services.vector_store_registry import get_vector_store_registry
+from app.utils.text_utils import search_tokens
+
+logger = logging.getLogger(__name__)
+
+_BUILD_BATCH_SIZE = 2000
+_MAX_TF = np.iinfo(np.uint16).max
+_FORMAT_VERSION = 1
+
+
+def _code(table: Dict[str, int], values: List[str], key: Optional[str]) -> int:
+    if key is None:
+        return -1
+    code = table.get(key)
+    if code is None:
+        code = table[key] = len(values)
+        values.append(key)
+    return code
+
+
+def _grow(values: np.ndarray, size: int) -> np.ndarray:
+    if size <= len(values):
+        return values
+    grown = np.zeros(max(size, len(values) * 2, 1024), dtype=values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+class BM25Index:
+    """BM25 postings of one collection; updates and queries are short, lock-protected numpy work"""
+
+    def __init__(self, k1: float, b: float):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        # Base segment (CSR)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tfs = np.zeros(0, dtype=np.uint16)
+        # Delta segment: term id -> (chunk numbers, term frequencies)
+        self.delta: Dict[int, Tuple[array, array]] = {}
+        self.delta_docs = 0
+        # Per-chunk arrays (capacity grows by doubling; ``size`` is the used length)
+        self.size = 0
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.doc_kb = np.zeros(0, dtype=np.int32)
+        self.doc_document = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_ids: List[str] = []
+        self.row_numbers: Dict[str, int] = {}
+        self.kbs: List[str] = []
+        self.kb_codes: Dict[str, int] = {}
+        self.documents: List[str] = []
+        self.document_codes: Dict[str, int] = {}
+        self.alive_count = 0
+        self.deleted = 0
+        self.total_len = 0
+        self._norm: Optional[np.ndarray] = None
+        self.built_at = time.time()
+        self.checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, rows: List[Tuple[str, Optional[str], Optional[str], List[str]]]) -> int:
+        """
+        Add (row id, knowledge base id, document id, tokens) chunks to the delta segment.
+        Row ids already in the index are skipped, so replaying an add is harmless.
+        """
+        added = 0
+        with self._lock:
+            for row_id, kb_id, document_id, tokens in rows:
+                if row_id in self.row_numbers:
+                    continue
+                number = self.size
+                capacity = number + 1
+                self.doc_len = _grow(self.doc_len, capacity)
+                self.doc_kb = _grow(self.doc_kb, capacity)
+                self.doc_document = _grow(self.doc_document, capacity)
+                self.alive = _grow(self.alive, capacity)
+                self.doc_len[number] = len(tokens)
+                self.doc_kb[number] = _code(self.kb_codes, self.kbs, kb_id)
+                self.doc_document[number] = _code(self.document_codes, self.documents, document_id)
+                self.alive[number] = True
+                self.row_ids.append(row_id)
+                self.row_numbers[row_id] = number
+                for term, tf in Counter(tokens).items():
+                    term_id = self.vocab.setdefault(term, len(self.vocab))
+                    postings = self.delta.get(term_id)
+                    if postings is None:
+                        postings = self.delta[term_id] = (array("i"), array("H"))
+                    postings[0].append(number)
+                    postings[1].append(min(tf, _MAX_TF))
+                self.size += 1
+                self.alive_count += 1
+                self.total_len += len(tokens)
+                self.delta_docs += 1
+                added += 1
+            if added:
+                self._norm = None
+        return added
+
+    def remove_document(self, document_id: str) -> int:
+        """Tombstone every chunk of a document"""
+        with self._lock:
+            code = self.document_codes.get(document_id)
+            if code is None:
+                return 0
+            numbers = np.flatnonzero((self.doc_document[:self.size] == code) & self.alive[:self.size])
+            self.alive[numbers] = False
+            for number in numbers:
+                del self.row_numbers[self.row_ids[number]]
+            self.alive_count -= len(numbers)
+            self.deleted += len(numbers)
+            self.total_len -= int(self.doc_len[numbers].sum())
+            if len(numbers):
+                self._norm = None
+            return len(numbers)
+
+    def needs_merge(self, merge_threshold: int) -> bool:
+        return self.delta_docs >= merge_threshold or self.deleted * 5 > max(self.size, 1)
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        parts_docs, parts_tfs = [], []
+        if term_id + 1 < len(self.offsets):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            parts_docs.append(self.post_docs[start:end])
+            parts_tfs.append(self.post_tfs[start:end])
+        delta = self.delta.get(term_id)
+        if delta is not None:
+            # Copies: a live buffer export would stop the array from growing
+            parts_docs.append(np.array(delta[0], dtype=np.int32))
+            parts_tfs.append(np.array(delta[1], dtype=np.uint16))
+        if len(parts_docs) == 1:
+            return parts_docs[0], parts_tfs[0]
+        if not parts_docs:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+        return np.concatenate(parts_docs), np.concatenate(parts_tfs)
+
+    def search(self, tokens: List[str], k: int, knowledge_base_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top-k (row id, BM25 score), best first"""
+        with self._lock:
+            n = self.size
+            if n == 0 or self.alive_count == 0:
+                return []
+            term_ids = {self.vocab[t] for t in tokens if t in self.vocab}
+            if not term_ids:
+                return []
+            kb_code = None
+            if knowledge_base_id is not None:
+                kb_code = self.kb_codes.get(knowledge_base_id)
+                if kb_code is None:
+                    return []
+            if self._norm is None:
+                avgdl = self.total_len / max(self.alive_count, 1) or 1.0
+                self._norm = (self.k1 * (1 - self.b + self.b * self.doc_len[:n] / avgdl)).astype(np.float32)
+            norm = self._norm
+
+            scores = np.zeros(n, dtype=np.float32)
+            touched = []
+            for term_id in term_ids:
+                docs, tfs = self._postings(term_id)
+                if not len(docs):
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                tf = tfs.astype(np.float32)
+                # Chunk numbers are unique within one term's postings, so += does not drop updates
+                scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+                touched.append(docs)
+            if not touched:
+                return []
+            candidates = np.unique(np.concatenate(touched))
+            mask = self.alive[candidates]
+            if kb_code is not None:
+                mask &= self.doc_kb[candidates] == kb_code
+            candidates = candidates[mask]
+            if not len(candidates):
+                return []
+            candidate_scores = scores[candidates]
+            if len(candidates) > k:
+                top = np.argpartition(-candidate_scores, k - 1)[:k]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-candidate_scores[top], kind="stable")]
+            return [(self.row_ids[candidates[i]], float(candidate_scores[i])) for i in top]
+
+    def merged(self) -> "BM25Index":
+        """
+        A new index with the delta folded into the base segment and tombstones dropped.
+        Reads this index without mutating it, so it can keep serving queries meanwhile.
+        """
+        n = self.size
+        base_terms = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+        term_parts, doc_parts, tf_parts = [base_terms], [np.asarray(self.post_docs)], [np.asarray(self.post_tfs)]
+        for term_id, (docs, tfs) in list(self.delta.items()):
+            term_parts.append(np.full(len(docs), term_id, dtype=np.int32))
+            doc_parts.append(np.array(docs, dtype=np.int32))
+            tf_parts.append(np.array(tfs, dtype=np.uint16))
+        terms = np.concatenate(term_parts)
+        docs = np.concatenate(doc_parts)
+        tfs = np.concatenate(tf_parts)
+
+        alive = self.alive[:n].copy()
+        keep = alive[docs]
+        terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+        renumber = np.cumsum(alive, dtype=np.int64) - 1
+        docs = renumber[docs].astype(np.int32)
+        order = np.lexsort((docs, terms))
+
+        index = BM25Index(self.k1, self.b)
+        index.vocab = dict(self.vocab)
+        index.post_docs = docs[order]
+        index.post_tfs = tfs[order]
+        counts = np.bincount(terms, minlength=len(index.vocab))
+        index.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        index.doc_len = self.doc_len[:n][alive]
+        index.doc_kb = self.doc_kb[:n][alive]
+        index.doc_document = self.doc_document[:n][alive]
+        index.row_ids = [row_id for row_id, keep_row in zip(self.row_ids[:n], alive) if keep_row]
+        index.row_numbers = {row_id: i for i, row_id in enumerate(index.row_ids)}
+        index.kbs, index.kb_codes = list(self.kbs), dict(self.kb_codes)
+        index.documents, index.document_codes = list(self.documents), dict(self.document_codes)
+        index.size = index.alive_count = len(index.row_ids)
+        index.alive = np.ones(index.size, dtype=bool)
+        index.total_len = int(index.doc_len.sum())
+        index.built_at = self.built_at
+        return index
+
+    def save(self, path: str) -> None:
+        """Persist a merged index; the base segment is memory-mapped when loaded"""
+        with self._lock:
+            if self.delta_docs or self.deleted:
+                return
+            tmp_path = f"{path}.tmp"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            arrays = {
+                "offsets": self.offsets,
+                "post_docs": self.post_docs,
+                "post_tfs": self.post_tfs,
+                "doc_len": self.doc_len[:self.size],
+                "doc_kb": self.doc_kb[:self.size],
+                "doc_document": self.doc_document[:self.size],
+                "row_ids": np.array(self.row_ids, dtype=str),
+                "vocab": np.array(sorted(self.vocab, key=self.vocab.get), dtype=str),
+            }
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+            with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": _FORMAT_VERSION,
+                    "k1": self.k1,
+                    "b": self.b,
+                    "kbs": self.kbs,
+                    "documents": self.documents,
+                    "total_len": self.total_len,
+                    "built_at": self.built_at
+                }, f, ensure_ascii=False)
+        # Swap directories; open memory maps of the old files stay valid after unlink
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, k1: float, b: float) -> Optional["BM25Index"]:
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != _FORMAT_VERSION:
+            return None
+        index = cls(k1, b)
+
+        def _load(name: str, mmap: bool = False) -> np.ndarray:
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+
+        index.offsets = _load("offsets", mmap=True)
+        index.post_docs = _load("post_docs", mmap=True)
+        index.post_tfs = _load("post_tfs", mmap=True)
+        index.doc_len = _load("doc_len")
+        index.doc_kb = _load("doc_kb")
+        index.doc_document = _load("doc_document")
+        index.row_ids = _load("row_ids").tolist()
+        index.row_numbers = {row_id: i for i, row_id in enumerate(index.row_ids)}
+        index.vocab = {term: i for i, term in enumerate(_load("vocab").tolist())}
+        index.kbs = meta["kbs"]
+        index.kb_codes = {kb: i for i, kb in enumerate(index.kbs)}
+        index.documents = meta["documents"]
+        index.document_codes = {document: i for i, document in enumerate(index.documents)}
+        index.size = index.alive_count = len(index.row_ids)
+        index.alive = np.ones(index.size, dtype=bool)
+        index.total_len = int(meta["total_len"])
+        index.built_at = float(meta["built_at"])
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "chunks": self.alive_count,
+                "deleted": self.deleted,
+                "delta_chunks": self.delta_docs,
+                "terms": len(self.vocab),
+                "postings": int(len(self.post_docs)) + sum(len(d) for d, _ in self.delta.values()),
+                "built_at": self.built_at
+            }
+
+
+def _tokenize_rows(rows) -> List[Tuple[str, Optional[str], Optional[str], List[str]]]:
+    return [(str(row[0]), row[2], row[3], search_tokens(row[1] or "")) for row in rows]
+
+
+class SparseIndexManager:
+    """Per-collection BM25 indexes, built lazily in the background and updated incrementally"""
+
+    def __init__(
+        self,
+        k1: float,
+        b: float,
+        index_dir: str,
+        merge_threshold: int,
+        refresh_seconds: int,
+        max_indexes: int
+    ):
+        self.k1 = k1
+        self.b = b
+        self.index_dir = index_dir
+        self.merge_threshold = merge_threshold
+        self.refresh_seconds = refresh_seconds
+        self.max_indexes = max(1, max_indexes)
+        self._indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._builds: Dict[str, asyncio.Task] = {}
+        # Changes that arrive while a collection is being built, replayed afterwards
+        self._pending: Dict[str, List[Tuple[str, Any]]] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    def _path(self, collection_name: str) -> Optional[str]:
+        if not self.index_dir:
+            return None
+        return os.path.join(self.index_dir, collection_name)
+
+    async def _count_rows(self, collection_name: str) -> int:
+        async with get_vector_store_registry().get_engine().connect() as conn:
+            result = await conn.execute(
+                text(f"SELECT count(*) FROM {EMBEDDING_TABLE} WHERE cmetadata->>'collection_name' = :name"),
+                {"name": collection_name}
+            )
+            return int(result.scalar() or 0)
+
+    async def _build(self, collection_name: str) -> BM25Index:
+        started = time.perf_counter()
+        path = self._path(collection_name)
+        if path:
+            index = await asyncio.to_thread(BM25Index.load, path, self.k1, self.b)
+            if index is not None and index.alive_count == await self._count_rows(collection_name):
+                logger.info(f"BM25 index for {collection_name} loaded from {path} ({index.alive_count} chunks)")
+                return index
+
+        index = BM25Index(self.k1, self.b)
+        last_id = ""
+        engine = get_vector_store_registry().get_engine()
+        while True:
+            async with engine.connect() as conn:
+                rows = (await conn.execute(
+                    text(
+                        f"SELECT id, document, cmetadata->>'knowledge_base_id', cmetadata->>'document_id' "
+                        f"FROM {EMBEDDING_TABLE} WHERE cmetadata->>'collection_name' = :name AND id > :last_id "
+                        f"ORDER BY id LIMIT :limit"
+                    ),
+                    {"name": collection_name, "last_id": last_id, "limit": _BUILD_BATCH_SIZE}
+                )).fetchall()
+            if not rows:
+                break
+            # Segmentation is CPU-bound (jieba); keep it off the event loop
+            index.add(await asyncio.to_thread(_tokenize_rows, rows))
+            last_id = str(rows[-1][0])
+        index = await self._compact(collection_name, index)
+        logger.info(
+            f"BM25 index for {collection_name} built: {index.alive_count} chunks, {len(index.vocab)} terms "
+            f"in {(time.perf_counter() - started):.1f}s"
+        )
+        return index
+
+    async def _compact(self, collection_name: str, index: BM25Index) -> BM25Index:
+        index = await asyncio.to_thread(index.merged)
+        path = self._path(collection_name)
+        if path:
+            try:
+                await asyncio.to_thread(index.save, path)
+            except OSError as e:
+                logger.warning(f"Could not persist BM25 index for {collection_name}: {e}")
+        return index
+
+    async def _run_build(self, collection_name: str, source: Optional[BM25Index] = None) -> None:
+        """
+        Build a collection's index from the database, or merge ``source``, then publish it.
+        The current index keeps serving meanwhile; changes made in between are replayed.
+        """
+        self._pending.setdefault(collection_name, [])
+        try:
+            if source is not None:
+                index = await self._compact(collection_name, source)
+            else:
+                index = await self._build(collection_name)
+            for op, payload in self._pending.pop(collection_name, []):
+                if op == "add":
+                    index.add(payload)
+                else:
+                    index.remove_document(payload)
+            self._indexes[collection_name] = index
+            self._indexes.move_to_end(collection_name)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        except Exception as e:
+            logger.warning(f"BM25 index build for {collection_name} failed: {e}")
+            self._pending.pop(collection_name, None)
+        finally:
+            self._builds.pop(collection_name, None)
+
+    def _schedule_build(self, collection_name: str, source: Optional[BM25Index] = None) -> None:
+        if collection_name not in self._builds:
+            self._builds[collection_name] = asyncio.create_task(self._run_build(collection_name, source))
+
+    async def _check_fresh(self, collection_name: str, index: BM25Index) -> None:
+        try:
+            if await self._count_rows(collection_name) != index.alive_count:
+                logger.info(f"BM25 index for {collection_name} is out of date; rebuilding")
+                self._schedule_build(collection_name)
+        except Exception as e:
+            logger.warning(f"BM25 freshness check for {collection_name} failed: {e}")
+        finally:
+            self._refreshing.pop(collection_name, None)
+
+    def get_index(self, collection_name: str) -> Optional[BM25Index]:
+        """The ready index of a collection; schedules a build (and returns None) when there is none"""
+        index = self._indexes.get(collection_name)
+        if index is None:
+            self._schedule_build(collection_name)
+            return None
+        self._indexes.move_to_end(collection_name)
+        if (
+            time.monotonic() - index.checked_at > self.refresh_seconds
+            and collection_name not in self._refreshing
+            and collection_name not in self._builds
+        ):
+            index.checked_at = time.monotonic()
+            self._refreshing[collection_name] = asyncio.create_task(self._check_fresh(collection_name, index))
+        return index
+
+    async def search(
+        self,
+        collection_name: str,
+        query: str,
+        k: int = 5,
+        knowledge_base_id: Optional[UUID] = None,
+        extra_terms: Optional[List[str]] = None
+    ) -> Optional[List[Tuple[LangChainDocument, float]]]:
+        """
+        BM25 top-k as (document, score), best first; None while the collection's index is
+        still being built, so callers can fall back to another keyword route.
+        """
+        index = self.get_index(collection_name)
+        if index is None:
+            return None
+        tokens = search_tokens(query) + [t for term in (extra_terms or []) for t in search_tokens(str(term))]
+        hits = index.search(tokens, k, str(knowledge_base_id) if knowledge_base_id else None)
+        if not hits:
+            return []
+
+        async with get_vector_store_registry().get_engine().connect() as conn:
+            rows = (await conn.execute(
+                text(f"SELECT id, document, cmetadata FROM {EMBEDDING_TABLE} WHERE id = ANY(:ids)"),
+                {"ids": [row_id for row_id, _ in hits]}
+            )).fetchall()
+        by_id = {str(row[0]): row for row in rows}
+        results = []
+        for row_id, score in hits:
+            row = by_id.get(row_id)
+            # Deleted by another process since the last refresh
+            if row is not None:
+                results.append((LangChainDocument(page_content=row[1], metadata=row[2] or {}), score))
+        return results
+
+    async def add_chunks(
+        self,
+        collection_name: str,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Index newly stored chunks of a collection that is loaded or being built"""
+        index = self._indexes.get(collection_name)
+        if index is None and collection_name not in self._builds:
+            return
+        rows = await asyncio.to_thread(
+            _tokenize_rows,
+            [
+                (row_id, content, metadata.get("knowledge_base_id"), metadata.get("document_id"))
+                for row_id, content, metadata in zip(ids, texts, metadatas)
+            ]
+        )
+        if collection_name in self._builds:
+            self._pending.setdefault(collection_name, []).append(("add", rows))
+            return
+        index.add(rows)
+        if index.needs_merge(self.merge_threshold):
+            self._schedule_build(collection_name, index)
+
+    async def remove_document(self, collection_name: str, document_id: UUID) -> None:
+        """Drop the chunks of a deleted (or re-chunked) document"""
+        if collection_name in self._builds:
+            self._pending.setdefault(collection_name, []).append(("remove", str(document_id)))
+            return
+        index = self._indexes.get(collection_name)
+        if index is None:
+            return
+        index.remove_document(str(document_id))
+        if index.needs_merge(self.merge_threshold):
+            self._schedule_build(collection_name, index)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "indexes": {name: index.stats() for name, index in self._indexes.items()},
+            "building": sorted(self._builds)
+        }
+
+
+# Global manager instance
+_sparse_index_manager: Optional[SparseIndexManager] = None
+
+
+def get_sparse_index_manager() -> SparseIndexManager:
+    """Get global sparse index manager instance"""
+    global _sparse_index_manager
+    if _sparse_index_manager is None:
+        _sparse_index_manager = SparseIndexManager(
+            k1=settings.RAG_BM25_K1,
+            b=settings.RAG_BM25_B,
+            index_dir=settings.RAG_BM25_INDEX_DIR,
+            merge_threshold=settings.RAG_BM25_MERGE_THRESHOLD,
+            refresh_seconds=settings.RAG_BM25_REFRESH_SECONDS,
+            max_indexes=settings.RAG_BM25_MAX_INDEXES
+        )
+    return _sparse_index_manager
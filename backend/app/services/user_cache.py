@@ -0,0 +1,156 @@
+"""
+Short-TTL cache for authentication.
+
+``get_current_user`` resolves a bearer token to a user on every request. Decoded tokens are
+cached by token hash until they expire, and user rows (plus active role names, loaded lazily
+by the role-gated dependencies) are cached by user ID for USER_CACHE_TTL_SECONDS. Each request
+gets its own detached ``User`` copy, so nothing is shared with another request's session.
+
+UserService.update_user / delete_user and RoleService.assign_roles_to_user invalidate the user
+in this process; other worker processes pick the change up when their entry expires.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import settings
+from app.models.user import User
+
+
+class CachedUser:
+    """Column values of a user row and, once loaded, its active role names"""
+
+    def __init__(self, values: Dict[str, Any], expires_at: float):
+        self.values = values
+        self.expires_at = expires_at
+        self.role_names: Optional[FrozenSet[str]] = None
+
+    def to_user(self) -> User:
+        user = User(**self.values)
+        # Persistent-but-detached: can be merged into a session, never re-inserted
+        make_transient_to_detached(user)
+        return user
+
+
+class UserAuthCache:
+    """Per-process LRU of decoded tokens and users"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._tokens: "OrderedDict[str, Tuple[UUID, float]]" = OrderedDict()
+        self._users: "OrderedDict[UUID, CachedUser]" = OrderedDict()
+        self._columns = [attr.key for attr in inspect(User).column_attrs]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get_token(self, token: str) -> Optional[UUID]:
+        """User ID of a previously decoded, still unexpired token"""
+        key = self._token_key(token)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            user_id, expires_at = entry
+            if expires_at <= time.time():
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+            return user_id
+
+    def put_token(self, token: str, user_id: UUID, expires_at: Optional[float]) -> None:
+        # Tokens without "exp" are re-checked after the TTL like everything else
+        if expires_at is None:
+            expires_at = time.time() + self.ttl_seconds
+        key = self._token_key(token)
+        with self._lock:
+            self._tokens[key] = (user_id, float(expires_at))
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_entries:
+                self._tokens.popitem(last=False)
+
+    def _get_entry(self, user_id: UUID) -> Optional[CachedUser]:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return entry
+
+    def get_user(self, user_id: UUID) -> Optional[User]:
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.to_user()
+
+    def put_user(self, user: User) -> None:
+        values = {column: getattr(user, column) for column in self._columns}
+        with self._lock:
+            self._users[user.id] = CachedUser(values, time.monotonic() + self.ttl_seconds)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+
+    def get_role_names(self, user_id: UUID) -> Optional[FrozenSet[str]]:
+        with self._lock:
+            entry = self._get_entry(user_id)
+            return entry.role_names if entry is not None else None
+
+    def put_role_names(self, user_id: UUID, role_names: Iterable[str]) -> None:
+        # Only attached to a live user entry so roles never outlive the user's TTL
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is not None:
+                entry.role_names = frozenset(role_names)
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        with self._lock:
+            if self._users.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "tokens": len(self._tokens),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations
+            }
+
+
+# Global cache instance
+_user_auth_cache: Optional[UserAuthCache] = None
+
+
+def get_user_auth_cache() -> UserAuthCache:
+    """Get global user auth cache instance"""
+    global _user_auth_cache
+    if _user_auth_cache is None:
+        _user_auth_cache = UserAuthCache(
+            ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+            max_entries=settings.USER_CACHE_MAX_ENTRIES
+        )
+    return _user_auth_cache
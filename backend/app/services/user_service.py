@@ -9,7 +9,8 @@ from sqlalchemy import select, update, delete, desc
 
 from app.models.user import User, UserRole, Role, UserRoleAssociation
 from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hasher
+from app.services.user_cache import get_user_auth_cache
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +35,7 @@ class UserService:
                 raise ValueError("Username already taken")
             
             # Hash password
-            hashed_password = get_password_hash(user_data.password)
+            hashed_password = await get_password_hasher().hash(user_data.password)
             
             # Create user
             user = User(
@@ -74,11 +75,12 @@ class UserService:
             if not user:
                 return None
             
-            if not verify_password(password, user.hashed_password):
+            is_valid, new_hash = await get_password_hasher().verify(password, user.hashed_password)
+            if not is_valid:
                 return None
             
-            # Update last login
-            await self._update_last_login(user.id)
+            # Update last login (and upgrade the hash if the bcrypt cost changed)
+            await self._update_last_login(user.id, new_hash)
             
             return user
             
@@ -93,11 +95,12 @@ class UserService:
             if not user:
                 return None
             
-            if not verify_password(password, user.hashed_password):
+            is_valid, new_hash = await get_password_hasher().verify(password, user.hashed_password)
+            if not is_valid:
                 return None
             
-            # Update last login
-            await self._update_last_login(user.id)
+            # Update last login (and upgrade the hash if the bcrypt cost changed)
+            await self._update_last_login(user.id, new_hash)
             
             return user
             
@@ -219,7 +222,7 @@ class UserService:
             
             # Handle password update separately
             if user_data.password:
-                update_data['hashed_password'] = get_password_hash(user_data.password)
+                update_data['hashed_password'] = await get_password_hasher().hash(user_data.password)
             
             # Check for email/username conflicts
             if 'email' in update_data and update_data['email'] != user.email:
@@ -242,6 +245,7 @@ class UserService:
                 await self.db.execute(query)
                 await self.db.commit()
                 await self.db.refresh(user)
+                get_user_auth_cache().invalidate_user(user_id)
             
             logger.info(f"Updated user {user_id}")
             return user
@@ -276,6 +280,7 @@ class UserService:
             
             await self.db.execute(query)
             await self.db.commit()
+            get_user_auth_cache().invalidate_user(user_id)
             
             logger.info(f"Deleted user {user_id}")
             return True
@@ -317,17 +322,23 @@ class UserService:
             logger.error(f"Error searching users: {e}")
             raise
     
-    async def _update_last_login(self, user_id: UUID) -> None:
-        """Update user's last login timestamp"""
+    async def _update_last_login(self, user_id: UUID, new_password_hash: Optional[str] = None) -> None:
+        """Update user's last login timestamp, storing a rehashed password when given"""
         try:
             from sqlalchemy import func
+            values = {"last_login": func.now()}
+            if new_password_hash:
+                values["hashed_password"] = new_password_hash
             query = (
                 update(User)
                 .where(User.id == user_id)
-                .values(last_login=func.now())
+                .values(**values)
             )
             await self.db.execute(query)
             await self.db.commit()
+            if new_password_hash:
+                get_user_auth_cache().invalidate_user(user_id)
+                logger.info(f"Rehashed password for user {user_id}")
             
         except Exception as e:
             logger.error(f"Error updating last login for user {user_id}: {e}")
@@ -391,6 +402,8 @@ class RoleService:
                 return False
             await self.db.delete(role)
             await self.db.commit()
+            # Cached role names of any user may include the deleted role
+            get_user_auth_cache().clear()
             return True
         except Exception as e:
             await self.db.rollback()
@@ -432,6 +445,7 @@ class RoleService:
                 self.db.add(UserRoleAssociation(user_id=user_id, role_id=rid))
 
             await self.db.commit()
+            get_user_auth_cache().invalidate_user(user_id)
 
             # Return current roles via explicit query to avoid lazy load
             return await self.list_user_roles(user_id)
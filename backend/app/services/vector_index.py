@@ -0,0 +1,353 @@
+"""
+Managed indexes for langchain_pg_embedding.
+
+Every user's chunks share one table, so searches need indexes that match the queries
+issued by VectorStoreRegistry and the text/metadata routes:
+
+- B-tree expression indexes on ``collection_id`` and the ``cmetadata`` keys we filter on
+  (collection_name, knowledge_base_id, document_id).
+- One ANN index (HNSW or IVFFlat, cosine) on ``embedding::halfvec(VECTOR_DIMENSION)``.
+  pgvector caps indexed ``vector`` at 2000 dimensions and ``halfvec`` at 4000, and the
+  langchain column is untyped, so the index is built on a typed cast expression which
+  the search query repeats verbatim.
+- Optional per-collection partial ANN indexes ("partitions") for tenants above
+  VECTOR_PARTITION_MIN_ROWS, so their searches never walk other tenants' graphs.
+- A stored ``search_tsv`` column for keyword retrieval. It is filled at insert time from
+  jieba-segmented tokens (``search_tokens``) so Chinese needs no DB extension. For rows
+  written by other paths a trigger fills it with ``to_tsvector('simple', document)`` only
+  when the text has no CJK characters; otherwise it leaves NULL (with a warning) for
+  ``backfill_search_column``, since unsegmented Chinese would never match. A pg_trgm index
+  backs the substring (ILIKE) fallback when the extension is available.
+
+Statements are built here and executed by ``scripts/manage_vector_indexes.py`` CONCURRENTLY
+outside a transaction. Migrations carry their own frozen copy of the DDL.
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.utils.text_utils import search_tokens
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+INDEX_PREFIX = "idx_lc_embedding_"
+PARTITION_INDEX_PREFIX = f"{INDEX_PREFIX}part_"
+
+# Max indexable dimensions per pgvector type
+MAX_INDEX_DIMENSIONS = {"vector": 2000, "halfvec": 4000}
+
+# name -> indexed expression
+METADATA_INDEXES: Dict[str, str] = {
+    f"{INDEX_PREFIX}collection_id": "collection_id",
+    f"{INDEX_PREFIX}collection_name": "(cmetadata->>'collection_name')",
+    f"{INDEX_PREFIX}knowledge_base": "collection_id, (cmetadata->>'knowledge_base_id')",
+    f"{INDEX_PREFIX}document_id": "(cmetadata->>'document_id')",
+}
+
+SEARCH_COLUMN = "search_tsv"
+SEARCH_INDEX = f"{INDEX_PREFIX}search_tsv"
+TRGM_INDEX = f"{INDEX_PREFIX}document_trgm"
+# Expression index from scripts/create_tsvector_index.sql, superseded by search_tsv
+LEGACY_TSV_INDEX = f"{INDEX_PREFIX}document_tsv"
+SEARCH_TRIGGER = "trg_lc_embedding_search_tsv"
+SEARCH_TRIGGER_FUNCTION = "lc_embedding_search_tsv"
+
+SEARCH_SCHEMA_STATEMENTS = [
+    f"ALTER TABLE {EMBEDDING_TABLE} ADD COLUMN IF NOT EXISTS {SEARCH_COLUMN} tsvector",
+    f"""
+    CREATE OR REPLACE FUNCTION {SEARCH_TRIGGER_FUNCTION}() RETURNS trigger AS $$
+    BEGIN
+        -- Keep the segmented vector supplied by the application
+        IF TG_OP = 'INSERT' AND NEW.{SEARCH_COLUMN} IS NOT NULL THEN
+            RETURN NEW;
+        END IF;
+        IF TG_OP = 'UPDATE' AND NEW.{SEARCH_COLUMN} IS DISTINCT FROM OLD.{SEARCH_COLUMN} THEN
+            RETURN NEW;
+        END IF;
+        -- Chinese needs the application's jieba segmentation; leave NULL for backfill-search
+        -- rather than storing whole sentences as single lexemes
+        IF NEW.document ~ '[\\u3400-\\u9fff\\uf900-\\ufaff]' THEN
+            NEW.{SEARCH_COLUMN} := NULL;
+            RAISE WARNING '{SEARCH_COLUMN} of row % left NULL: run manage_vector_indexes.py backfill-search', NEW.id;
+        ELSE
+            NEW.{SEARCH_COLUMN} := to_tsvector('simple', coalesce(NEW.document, ''));
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"DROP TRIGGER IF EXISTS {SEARCH_TRIGGER} ON {EMBEDDING_TABLE}",
+    f"""
+    CREATE TRIGGER {SEARCH_TRIGGER}
+    BEFORE INSERT OR UPDATE OF document ON {EMBEDDING_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TRIGGER_FUNCTION}()
+    """,
+]
+
+_METADATA_KEY = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def search_text(document: str) -> str:
+    """Space-joined search tokens; stored as to_tsvector('simple', search_text(document))"""
+    return " ".join(search_tokens(document))
+
+
+def parse_version(version: Optional[str]) -> Tuple[int, ...]:
+    if not version:
+        return ()
+    return tuple(int(part) for part in re.findall(r"\d+", version)[:3])
+
+
+def vector_type(pgvector_version: Tuple[int, ...]) -> Optional[str]:
+    """pgvector type used for indexing/search, or None when no ANN index fits the dimension"""
+    dimension = settings.VECTOR_DIMENSION
+    if pgvector_version >= (0, 7) and (settings.VECTOR_INDEX_HALFVEC or dimension > MAX_INDEX_DIMENSIONS["vector"]):
+        return "halfvec" if dimension <= MAX_INDEX_DIMENSIONS["halfvec"] else None
+    return "vector" if dimension <= MAX_INDEX_DIMENSIONS["vector"] else None
+
+
+def vector_expression(vtype: str) -> str:
+    return f"(embedding::{vtype}({settings.VECTOR_DIMENSION}))"
+
+
+def metadata_filter_sql(filters: Optional[Dict[str, str]], params: Dict[str, str]) -> str:
+    """``AND cmetadata->>'key' = :fN`` clauses; keys are inlined so expression indexes match"""
+    clauses = []
+    for i, (key, value) in enumerate((filters or {}).items()):
+        if not _METADATA_KEY.match(key):
+            raise ValueError(f"Invalid metadata filter key: {key}")
+        params[f"f{i}"] = str(value)
+        clauses.append(f"AND cmetadata->>'{key}' = :f{i} ")
+    return "".join(clauses)
+
+
+def collection_predicate(collection_id: str) -> str:
+    """Literal collection predicate (validated) so partial per-collection indexes can be used"""
+    return f"collection_id = '{UUID(str(collection_id))}'::uuid"
+
+
+def partition_index_name(collection_id: str) -> str:
+    return f"{PARTITION_INDEX_PREFIX}{UUID(str(collection_id)).hex}"
+
+
+def search_settings(pgvector_version: Tuple[int, ...]) -> List[str]:
+    """SET LOCAL statements for a filtered ANN query"""
+    if settings.VECTOR_INDEX_METHOD == "ivfflat":
+        statements = [f"SET LOCAL ivfflat.probes = {int(settings.VECTOR_IVFFLAT_PROBES)}"]
+        if pgvector_version >= (0, 8):
+            statements.append("SET LOCAL ivfflat.iterative_scan = relaxed_order")
+        return statements
+    statements = [f"SET LOCAL hnsw.ef_search = {int(settings.VECTOR_HNSW_EF_SEARCH)}"]
+    if pgvector_version >= (0, 8):
+        # Keep scanning the graph until enough rows pass the collection/metadata filter
+        statements.append("SET LOCAL hnsw.iterative_scan = relaxed_order")
+    return statements
+
+
+def ann_index_statement(vtype: str, concurrently: bool = True, collection_id: Optional[str] = None) -> Tuple[str, str]:
+    """(index name, CREATE INDEX statement) for the global or a per-collection ANN index"""
+    method = settings.VECTOR_INDEX_METHOD
+    if method == "ivfflat":
+        options = f"lists = {int(settings.VECTOR_IVFFLAT_LISTS)}"
+    else:
+        method = "hnsw"
+        options = f"m = {int(settings.VECTOR_HNSW_M)}, ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)}"
+    name = partition_index_name(collection_id) if collection_id else f"{INDEX_PREFIX}embedding_{method}"
+    where = f" WHERE {collection_predicate(collection_id)}" if collection_id else ""
+    statement = (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+        f"ON {EMBEDDING_TABLE} USING {method} ({vector_expression(vtype)} {vtype}_cosine_ops) "
+        f"WITH ({options}){where}"
+    )
+    return name, statement
+
+
+def metadata_index_statements(concurrently: bool = True) -> List[Tuple[str, str]]:
+    return [
+        (
+            name,
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+            f"ON {EMBEDDING_TABLE} ({expression})"
+        )
+        for name, expression in METADATA_INDEXES.items()
+    ]
+
+
+# --- Synchronous helpers for the migration and the management script -----------------------
+
+
+def table_exists(conn: Connection) -> bool:
+    return conn.execute(text(f"SELECT to_regclass('{EMBEDDING_TABLE}')")).scalar() is not None
+
+
+def get_pgvector_version(conn: Connection) -> Tuple[int, ...]:
+    return parse_version(conn.execute(
+        text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    ).scalar())
+
+
+def drop_invalid_index(conn: Connection, name: str) -> None:
+    """A failed CREATE INDEX CONCURRENTLY leaves an INVALID index that IF NOT EXISTS would keep"""
+    invalid = conn.execute(
+        text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name}
+    ).first()
+    if invalid:
+        logger.warning(f"Dropping invalid index {name} before rebuilding it")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def has_search_column(conn: Connection) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = :column"),
+        {"table": EMBEDDING_TABLE, "column": SEARCH_COLUMN}
+    ).first() is not None
+
+
+def ensure_search_schema(conn: Connection) -> List[str]:
+    """
+    Add the search_tsv column, its trigger and GIN index, and the pg_trgm substring index.
+    Existing rows keep a NULL search_tsv until ``backfill_search_column`` runs.
+    """
+    for statement in SEARCH_SCHEMA_STATEMENTS:
+        conn.execute(text(statement))
+    drop_invalid_index(conn, SEARCH_INDEX)
+    conn.execute(text(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {SEARCH_INDEX} ON {EMBEDDING_TABLE} USING GIN ({SEARCH_COLUMN})"
+    ))
+    ensured = [SEARCH_INDEX]
+
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        logger.warning(f"pg_trgm unavailable, substring fallback stays unindexed: {e}")
+    else:
+        drop_invalid_index(conn, TRGM_INDEX)
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {TRGM_INDEX} ON {EMBEDDING_TABLE} "
+            f"USING GIN (document gin_trgm_ops)"
+        ))
+        ensured.append(TRGM_INDEX)
+
+    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {LEGACY_TSV_INDEX}"))
+    return ensured
+
+
+def unsegmented_rows(conn: Connection) -> int:
+    """Rows whose search_tsv is NULL and that the keyword route therefore only finds via ILIKE"""
+    return int(conn.execute(text(f"SELECT count(*) FROM {EMBEDDING_TABLE} WHERE {SEARCH_COLUMN} IS NULL")).scalar() or 0)
+
+
+def backfill_search_column(conn: Connection, batch_size: int = 500, all_rows: bool = False) -> int:
+    """
+    Fill search_tsv with segmented tokens for rows that have none (or every row with
+    ``all_rows``, e.g. after installing jieba). Runs in id order, one batch per statement.
+    """
+    updated = 0
+    last_id = ""
+    while True:
+        condition = "" if all_rows else f"AND {SEARCH_COLUMN} IS NULL "
+        rows = conn.execute(
+            text(
+                f"SELECT id, document FROM {EMBEDDING_TABLE} WHERE id > :last_id {condition}"
+                f"ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": batch_size}
+        ).fetchall()
+        if not rows:
+            return updated
+        conn.execute(
+            text(f"UPDATE {EMBEDDING_TABLE} SET {SEARCH_COLUMN} = to_tsvector('simple', :search_text) WHERE id = :id"),
+            [{"id": row[0], "search_text": search_text(row[1] or "")} for row in rows]
+        )
+        updated += len(rows)
+        last_id = str(rows[-1][0])
+        logger.info(f"search_tsv backfilled for {updated} rows")
+
+
+def ensure_indexes(conn: Connection, with_ann: bool = True) -> List[str]:
+    """
+    Create missing metadata and global ANN indexes. ``conn`` must be in autocommit mode.
+    Returns the names of the indexes ensured.
+    """
+    ensured = []
+    for name, statement in metadata_index_statements():
+        drop_invalid_index(conn, name)
+        conn.execute(text(statement))
+        ensured.append(name)
+    if not with_ann:
+        return ensured
+
+    version = get_pgvector_version(conn)
+    vtype = vector_type(version)
+    if vtype is None:
+        logger.warning(
+            f"No ANN index built: VECTOR_DIMENSION={settings.VECTOR_DIMENSION} exceeds what pgvector "
+            f"{'.'.join(map(str, version)) or '(not installed)'} can index (halfvec needs >= 0.7)"
+        )
+        return ensured
+    name, statement = ann_index_statement(vtype)
+    drop_invalid_index(conn, name)
+    conn.execute(text(statement))
+    ensured.append(name)
+    return ensured
+
+
+def collection_sizes(conn: Connection) -> List[Tuple[str, str, int]]:
+    """(collection uuid, name, row count) ordered by size"""
+    rows = conn.execute(text(
+        f"SELECT c.uuid, c.name, count(e.id) AS n FROM langchain_pg_collection c "
+        f"LEFT JOIN {EMBEDDING_TABLE} e ON e.collection_id = c.uuid "
+        f"GROUP BY c.uuid, c.name ORDER BY n DESC"
+    )).fetchall()
+    return [(str(r[0]), r[1], int(r[2])) for r in rows]
+
+
+def existing_indexes(conn: Connection) -> Dict[str, Dict[str, object]]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname, i.indisvalid, pg_relation_size(c.oid), pg_get_indexdef(c.oid) "
+            "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_class t ON t.oid = i.indrelid "
+            "WHERE t.relname = :table AND c.relname LIKE :prefix"
+        ),
+        {"table": EMBEDDING_TABLE, "prefix": f"{INDEX_PREFIX}%"}
+    ).fetchall()
+    return {r[0]: {"valid": r[1], "bytes": int(r[2]), "definition": r[3]} for r in rows}
+
+
+def sync_partitions(conn: Connection, min_rows: Optional[int] = None) -> Dict[str, List[str]]:
+    """
+    Give every collection with at least ``min_rows`` chunks its own partial ANN index and drop
+    partial indexes of collections that shrank below half the threshold or no longer exist.
+    """
+    threshold = settings.VECTOR_PARTITION_MIN_ROWS if min_rows is None else min_rows
+    vtype = vector_type(get_pgvector_version(conn))
+    ensured: List[str] = []
+    dropped: List[str] = []
+    if vtype is None or threshold <= 0:
+        return {"ensured": ensured, "dropped": dropped}
+
+    sizes = collection_sizes(conn)
+    wanted = {partition_index_name(cid): cid for cid, _, n in sizes if n >= threshold}
+    # Hysteresis: keep an existing partition until the collection drops well below the threshold
+    keep = {partition_index_name(cid) for cid, _, n in sizes if n >= threshold // 2}
+
+    for name, cid in wanted.items():
+        drop_invalid_index(conn, name)
+        conn.execute(text(ann_index_statement(vtype, collection_id=cid)[1]))
+        ensured.append(name)
+    for name in existing_indexes(conn):
+        if name.startswith(PARTITION_INDEX_PREFIX) and name not in keep:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            dropped.append(name)
+    return {"ensured": ensured, "dropped": dropped}
@@ -0,0 +1,283 @@
+"""
+Process-wide PGVector store registry.
+
+All vector-store handles share one bounded, pre-warmed async engine, and handles are
+cached per collection name so the collection lookup runs once per process instead of
+once per request. Similarity search is issued here rather than through PGVector so the
+query uses the typed cast expression of the managed ANN index (see vector_index.py).
+"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from langchain_core.documents import Document as LangChainDocument
+from langchain_postgres import PGVector
+
+from app.core.config import settings
+from app.services.embedding_service import get_embedding_service
+from app.services.vector_index import (
+    EMBEDDING_TABLE,
+    SEARCH_COLUMN,
+    collection_predicate,
+    metadata_filter_sql,
+    parse_version,
+    search_settings,
+    search_text,
+    vector_expression,
+    vector_type,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def to_psycopg_async_url(url: str) -> str:
+    """langchain_postgres only supports the psycopg (v3) driver"""
+    for prefix in ("postgresql+asyncpg://", "postgresql+psycopg2://", "postgresql+psycopg://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+class VectorStoreRegistry:
+    """Caches async PGVector handles per collection on a shared connection pool"""
+
+    def __init__(self):
+        self._engine: Optional[AsyncEngine] = None
+        self._stores: "OrderedDict[str, PGVector]" = OrderedDict()
+        self._collection_ids: Dict[str, str] = {}
+        self._pgvector_version: Optional[Tuple[int, ...]] = None
+        self._has_search_column: Optional[bool] = None
+        self._tables_ready = False
+        self._lock = asyncio.Lock()
+
+    def get_engine(self) -> AsyncEngine:
+        """Get (or lazily create) the shared async engine for vector operations"""
+        if self._engine is None:
+            self._engine = create_async_engine(
+                to_psycopg_async_url(settings.DATABASE_URL),
+                pool_size=settings.VECTOR_STORE_POOL_SIZE,
+                max_overflow=settings.VECTOR_STORE_MAX_OVERFLOW,
+                pool_timeout=settings.VECTOR_STORE_POOL_TIMEOUT,
+                pool_pre_ping=True,
+                pool_recycle=1800,
+            )
+            logger.info(
+                f"Vector store engine created (pool_size={settings.VECTOR_STORE_POOL_SIZE}, "
+                f"max_overflow={settings.VECTOR_STORE_MAX_OVERFLOW})"
+            )
+        return self._engine
+
+    async def get_store(self, collection_name: str) -> PGVector:
+        """Get the cached async PGVector handle for a collection"""
+        store = self._stores.get(collection_name)
+        if store is not None:
+            self._stores.move_to_end(collection_name)
+            return store
+
+        async with self._lock:
+            store = self._stores.get(collection_name)
+            if store is None:
+                store = PGVector(
+                    connection=self.get_engine(),
+                    embeddings=get_embedding_service().get_embeddings(),
+                    collection_name=collection_name,
+                    use_jsonb=True,
+                    async_mode=True,
+                    create_extension=False,
+                )
+                self._stores[collection_name] = store
+                while len(self._stores) > settings.VECTOR_STORE_CACHE_SIZE:
+                    self._stores.popitem(last=False)
+            return store
+
+    async def get_collection_id(self, collection_name: str) -> str:
+        """Get (or create) the langchain_pg_collection row id for a collection"""
+        collection_id = self._collection_ids.get(collection_name)
+        if collection_id is not None:
+            return collection_id
+        async with self.get_engine().begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO langchain_pg_collection (uuid, name, cmetadata) "
+                    "VALUES (:uuid, :name, NULL) ON CONFLICT (name) DO NOTHING"
+                ),
+                {"uuid": str(uuid.uuid4()), "name": collection_name}
+            )
+            result = await conn.execute(
+                text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"),
+                {"name": collection_name}
+            )
+            collection_id = str(result.scalar_one())
+        self._collection_ids[collection_name] = collection_id
+        return collection_id
+
+    async def _get_existing_collection_id(self, collection_name: str) -> Optional[str]:
+        collection_id = self._collection_ids.get(collection_name)
+        if collection_id is not None:
+            return collection_id
+        async with self.get_engine().connect() as conn:
+            result = await conn.execute(
+                text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"),
+                {"name": collection_name}
+            )
+            row = result.first()
+        if row is None:
+            return None
+        self._collection_ids[collection_name] = str(row[0])
+        return self._collection_ids[collection_name]
+
+    async def get_pgvector_version(self) -> Tuple[int, ...]:
+        if self._pgvector_version is None:
+            async with self.get_engine().connect() as conn:
+                result = await conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+                self._pgvector_version = parse_version(result.scalar())
+        return self._pgvector_version
+
+    async def has_search_column(self) -> bool:
+        """Whether the search_tsv column exists (added by migration / manage_vector_indexes.py)"""
+        if self._has_search_column is None:
+            async with self.get_engine().connect() as conn:
+                result = await conn.execute(
+                    text(
+                        "SELECT 1 FROM information_schema.columns "
+                        "WHERE table_name = :table AND column_name = :column"
+                    ),
+                    {"table": EMBEDDING_TABLE, "column": SEARCH_COLUMN}
+                )
+                self._has_search_column = result.first() is not None
+        return self._has_search_column
+
+    async def similarity_search(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[LangChainDocument, float]]:
+        """
+        Cosine kNN within one collection; returns (document, cosine distance), closest first.
+        Metadata filters are equality matches on cmetadata keys.
+        """
+        collection_id = await self._get_existing_collection_id(collection_name)
+        if collection_id is None:
+            return []
+        version = await self.get_pgvector_version()
+        indexed_type = vector_type(version)
+        if indexed_type:
+            # Must repeat the ANN index expression exactly for the planner to use it
+            expression = vector_expression(indexed_type)
+            query_type = f"{indexed_type}({settings.VECTOR_DIMENSION})"
+        else:
+            expression, query_type = "embedding", "vector"
+        params: Dict[str, Any] = {
+            "embedding": "[" + ",".join(repr(float(x)) for x in query_embedding) + "]",
+            "k": k
+        }
+        sql = (
+            f"SELECT document, cmetadata, {expression} <=> CAST(:embedding AS {query_type}) AS distance "
+            f"FROM {EMBEDDING_TABLE} "
+            f"WHERE {collection_predicate(collection_id)} "
+            f"{metadata_filter_sql(filter, params)}"
+            f"ORDER BY distance LIMIT :k"
+        )
+        async with self.get_engine().begin() as conn:
+            if indexed_type:
+                for statement in search_settings(version):
+                    await conn.execute(text(statement))
+            rows = (await conn.execute(text(sql), params)).fetchall()
+        return [
+            (LangChainDocument(page_content=row[0], metadata=row[1] or {}), float(row[2]))
+            for row in rows
+        ]
+
+    async def _ensure_tables(self, collection_name: str) -> None:
+        """langchain_postgres creates its tables on first store use, which bulk_insert bypasses"""
+        if not self._tables_ready:
+            store = await self.get_store(collection_name)
+            await store.acreate_tables_if_not_exists()
+            self._tables_ready = True
+
+    async def bulk_insert(
+        self,
+        collection_name: str,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> int:
+        """Insert many chunks in one executemany round-trip, bypassing per-row ORM work"""
+        if not texts:
+            return 0
+        await self._ensure_tables(collection_name)
+        collection_id = await self.get_collection_id(collection_name)
+        with_search = await self.has_search_column()
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        rows = [
+            {
+                "id": row_id,
+                "collection_id": collection_id,
+                "embedding": "[" + ",".join(repr(float(x)) for x in vector) + "]",
+                "document": content,
+                "cmetadata": json.dumps(metadata, ensure_ascii=False)
+            }
+            for row_id, content, vector, metadata in zip(ids, texts, embeddings, metadatas)
+        ]
+        if with_search:
+            # Segmentation is CPU-bound (jieba); keep it off the event loop
+            search_texts = await asyncio.to_thread(lambda: [search_text(content) for content in texts])
+            for row, tokens in zip(rows, search_texts):
+                row["search_text"] = tokens
+            sql = (
+                f"INSERT INTO {EMBEDDING_TABLE} (id, collection_id, embedding, document, cmetadata, {SEARCH_COLUMN}) "
+                "VALUES (:id, CAST(:collection_id AS uuid), CAST(:embedding AS vector), :document, "
+                "CAST(:cmetadata AS jsonb), to_tsvector('simple', :search_text))"
+            )
+        else:
+            sql = (
+                f"INSERT INTO {EMBEDDING_TABLE} (id, collection_id, embedding, document, cmetadata) "
+                "VALUES (:id, CAST(:collection_id AS uuid), CAST(:embedding AS vector), :document, CAST(:cmetadata AS jsonb))"
+            )
+        async with self.get_engine().begin() as conn:
+            await conn.execute(text(sql), rows)
+        return len(rows)
+
+    async def warmup(self) -> None:
+        """Open the configured number of pooled connections ahead of the first request"""
+        count = max(0, min(settings.VECTOR_STORE_WARMUP_CONNECTIONS, settings.VECTOR_STORE_POOL_SIZE))
+        if count == 0:
+            return
+        engine = self.get_engine()
+
+        async def _ping():
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        await asyncio.gather(*(_ping() for _ in range(count)))
+        logger.info(f"Vector store pool warmed with {count} connections")
+
+    async def close(self) -> None:
+        """Dispose the shared engine and drop cached handles"""
+        self._stores.clear()
+        self._collection_ids.clear()
+        self._pgvector_version = None
+        self._has_search_column = None
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+# Global registry instance
+_vector_store_registry: Optional[VectorStoreRegistry] = None
+
+
+def get_vector_store_registry() -> VectorStoreRegistry:
+    """Get global vector store registry instance"""
+    global _vector_store_registry
+    if _vector_store_registry is None:
+        _vector_store_registry = VectorStoreRegistry()
+    return _vector_store_registry
@@ -6,12 +6,17 @@ from .file_utils import *
 from .text_utils import *
 from .validation_utils import *
 from .date_utils import *
+from .ranking_metrics import *
 
 __all__ = [
     # File utilities
     "get_file_hash",
     "get_file_mime_type",
     "save_uploaded_file",
+    "save_upload_stream",
+    "store_file_object",
+    "StoredFile",
+    "FileTooLargeError",
     "delete_file_safe",
     "ensure_directory",
     
@@ -22,6 +27,7 @@ __all__ = [
     "truncate_text",
     "normalize_text",
     "remove_html_tags",
+    "search_tokens",
     
     # Validation utilities
     "validate_email",
@@ -36,4 +42,9 @@ __all__ = [
     "parse_datetime",
     "get_timezone",
     "days_between",
+    
+    # Ranking metrics
+    "recall_at_k",
+    "reciprocal_rank",
+    "ndcg_at_k",
 ]
\ No newline at end of file
@@ -2,11 +2,13 @@
 File utility functions
 """
 import hashlib
+import inspect
 import mimetypes
 import os
 import shutil
+import uuid
 from pathlib import Path
-from typing import Optional, BinaryIO
+from typing import Optional, BinaryIO, Union
 import logging
 
 from fastapi import UploadFile
@@ -30,38 +32,166 @@ def ensure_directory(directory: Path) -> None:
     directory.mkdir(parents=True, exist_ok=True)
 
 
+# Uploads are copied in chunks of this size, so memory per upload stays constant
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class FileTooLargeError(ValueError):
+    """Raised while streaming an upload as soon as it exceeds the size limit"""
+
+
+class StoredFile:
+    """An upload written to its final location by the streaming save path"""
+
+    def __init__(self, path: str, filename: str, file_hash: str, file_size: int):
+        self.path = path
+        self.filename = filename
+        self.file_hash = file_hash
+        self.file_size = file_size
+        self.discarded = False
+
+    @property
+    def mime_type(self) -> str:
+        return get_file_mime_type(self.filename)
+
+    def discard(self) -> None:
+        """Delete the stored file (e.g. when it turns out to be a duplicate); safe to call twice"""
+        if not self.discarded:
+            self.discarded = True
+            delete_file_safe(Path(self.path))
+
+
+class _AtomicFileWriter:
+    """Writes to a hidden .part file while hashing, then renames it into place"""
+
+    def __init__(self, directory: Path, filename: str, max_size: Optional[int]):
+        ensure_directory(directory)
+        self.directory = directory
+        self.filename = sanitize_filename(filename)
+        self.max_size = max_size
+        self.size = 0
+        self.part_path = directory / f".{uuid.uuid4().hex}.part"
+        self._hash = hashlib.sha256()
+        self._file = open(self.part_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise FileTooLargeError(f"File size exceeds maximum {self.max_size}")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self, destination: Optional[Path] = None) -> StoredFile:
+        self._file.close()
+        if destination is None:
+            destination = self._link_unique()
+        else:
+            os.replace(self.part_path, destination)
+        return StoredFile(str(destination), self.filename, self._hash.hexdigest(), self.size)
+
+    def _link_unique(self) -> Path:
+        """Move the .part file to a free name; os.link refuses an existing name atomically"""
+        while True:
+            destination = self.directory / get_unique_filename(self.directory, self.filename)
+            try:
+                os.link(self.part_path, destination)
+            except FileExistsError:
+                # Taken by a concurrent upload between the check and the link
+                continue
+            except OSError:
+                # Filesystem without hard links: a random suffix cannot collide
+                name, ext = os.path.splitext(self.filename)
+                destination = self.directory / f"{name}_{uuid.uuid4().hex[:8]}{ext}"
+                os.replace(self.part_path, destination)
+                return destination
+            self.part_path.unlink()
+            return destination
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            self.part_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+async def _copy_to_writer(source: Union[UploadFile, BinaryIO], writer: _AtomicFileWriter) -> None:
+    read = source.read
+    is_async = inspect.iscoroutinefunction(read)
+    while True:
+        chunk = await read(UPLOAD_CHUNK_SIZE) if is_async else read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        writer.write(chunk)
+
+
+async def save_upload_stream(
+    source: Union[UploadFile, BinaryIO],
+    directory: Union[str, Path],
+    filename: Optional[str] = None,
+    max_size: Optional[int] = None
+) -> StoredFile:
+    """
+    Stream an upload to ``directory`` without holding it in memory.
+
+    The SHA-256 hash is computed and ``max_size`` enforced while copying; the data is written
+    once to a temporary .part file that is atomically renamed to a unique final name.
+    Raises FileTooLargeError (a ValueError) if the upload exceeds ``max_size``.
+    """
+    filename = filename or getattr(source, "filename", None) or "unnamed_file"
+    writer = _AtomicFileWriter(Path(directory), filename, max_size)
+    try:
+        await _copy_to_writer(source, writer)
+        stored = writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+    logger.info(f"File saved: {stored.path} (size: {stored.file_size}, hash: {stored.file_hash})")
+    return stored
+
+
+def store_file_object(
+    source: BinaryIO,
+    directory: Union[str, Path],
+    filename: str,
+    max_size: Optional[int] = None
+) -> StoredFile:
+    """Synchronous variant of save_upload_stream for file objects such as zip archive members"""
+    writer = _AtomicFileWriter(Path(directory), filename, max_size)
+    try:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+        return writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+
 async def save_uploaded_file(
     upload_file: UploadFile,
     destination: Path,
     max_size: int = 10 * 1024 * 1024  # 10MB default
 ) -> tuple[str, int]:
     """
-    Save uploaded file to destination
+    Save uploaded file to destination, streaming it in chunks
     
     Returns:
         tuple: (file_hash, file_size)
     """
-    # Ensure destination directory exists
-    ensure_directory(destination.parent)
-    
-    # Read file content
-    content = await upload_file.read()
-    file_size = len(content)
-    
-    # Check file size
-    if file_size > max_size:
-        raise ValueError(f"File size {file_size} exceeds maximum {max_size}")
-    
-    # Calculate hash
-    file_hash = get_file_hash(content)
-    
-    # Save file
-    with open(destination, "wb") as f:
-        f.write(content)
+    writer = _AtomicFileWriter(destination.parent, destination.name, max_size)
+    try:
+        await _copy_to_writer(upload_file, writer)
+        stored = writer.commit(destination)
+    except BaseException:
+        writer.abort()
+        raise
     
-    logger.info(f"File saved: {destination} (size: {file_size}, hash: {file_hash})")
+    logger.info(f"File saved: {destination} (size: {stored.file_size}, hash: {stored.file_hash})")
     
-    return file_hash, file_size
+    return stored.file_hash, stored.file_size
 
 
 def delete_file_safe(file_path: Path) -> bool:
@@ -0,0 +1,37 @@
+"""
+Ranking quality metrics for retrieval evaluation
+"""
+import math
+from typing import Hashable, Iterable, Sequence
+
+
+def recall_at_k(ranked: Sequence[Hashable], relevant: Iterable[Hashable], k: int) -> float:
+    """Share of the relevant items found in the first k results"""
+    relevant = set(relevant)
+    if not relevant:
+        return 0.0
+    return len(relevant.intersection(ranked[:k])) / len(relevant)
+
+
+def reciprocal_rank(ranked: Sequence[Hashable], relevant: Iterable[Hashable], k: int = 0) -> float:
+    """1 / rank of the first relevant result (within the first k results if k > 0)"""
+    relevant = set(relevant)
+    for position, item in enumerate(ranked[:k] if k > 0 else ranked, start=1):
+        if item in relevant:
+            return 1.0 / position
+    return 0.0
+
+
+def ndcg_at_k(ranked: Sequence[Hashable], relevant: Iterable[Hashable], k: int) -> float:
+    """Binary-relevance nDCG of the first k results (each relevant item counted once)"""
+    relevant = set(relevant)
+    if not relevant:
+        return 0.0
+    seen = set()
+    dcg = 0.0
+    for position, item in enumerate(ranked[:k]):
+        if item in relevant and item not in seen:
+            seen.add(item)
+            dcg += 1.0 / math.log2(position + 2)
+    ideal = sum(1.0 / math.log2(position + 2) for position in range(min(len(relevant), k)))
+    return dcg / ideal
@@ -1,9 +1,10 @@
 """
 Text utility functions
 """
+import io
 import re
 import html
-from typing import List, Optional
+from typing import List, Optional, Union
 import unicodedata
 import logging
 
@@ -126,6 +127,46 @@ def extract_keywords(text: str, max_keywords: int = 10) -> List[str]:
     return [word for word, freq in sorted_words[:max_keywords]]
 
 
+# ASCII words/numbers and runs of CJK characters
+_SEARCH_TOKEN_RUN = re.compile(r"[A-Za-z0-9]+|[\u4e00-\u9fff]+")
+_jieba = None
+
+
+def _get_jieba():
+    """jieba is optional: without it Chinese runs are indexed as character bigrams"""
+    global _jieba
+    if _jieba is None:
+        try:
+            import jieba
+            jieba.setLogLevel(logging.WARNING)
+            _jieba = jieba
+        except ImportError:
+            logger.warning("jieba not installed; Chinese text is tokenized as character bigrams")
+            _jieba = False
+    return _jieba or None
+
+
+def search_tokens(text: str) -> List[str]:
+    """
+    Lowercased tokens for full-text indexing and queries.
+
+    Chinese is segmented with jieba in search mode (long words also yield their sub-words), so
+    the same function must be used on both the indexed text and the query.
+    """
+    tokens: List[str] = []
+    jieba = _get_jieba()
+    for run in _SEARCH_TOKEN_RUN.findall(text or ""):
+        if run.isascii():
+            tokens.append(run.lower())
+        elif jieba is not None:
+            tokens.extend(word for word in jieba.cut_for_search(run) if word.strip())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
 def split_text_into_chunks(
     text: str,
     chunk_size: int = 1000,
@@ -286,47 +327,104 @@ async def extract_text_content(file_path: str, mime_type: str) -> str:
     """Extract text content from a file path using robust handlers.
 
     This mirrors the enhanced document service's extraction logic so it can be reused
-    across knowledge base ingestion and resume screening.
+    across knowledge base ingestion and resume screening. The work runs in the
+    extraction process pool so it never blocks the event loop.
     """
+    from app.services.extraction_service import get_extraction_engine
+    return await get_extraction_engine().extract(mime_type, file_path=file_path)
+
+
+ExtractionSource = Union[str, bytes]
+
+
+class ExtractionLimitExceeded(Exception):
+    """Raised inside an extraction worker when the per-file CPU time or memory cap is hit"""
+
+XLSX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+def _open_binary(source: ExtractionSource):
+    """File-like object for a path or in-memory bytes"""
+    return open(source, 'rb') if isinstance(source, str) else io.BytesIO(source)
+
+
+def _decode_text(data: bytes) -> str:
+    # Almost any even-length byte string "decodes" as UTF-16, so only trust it with a BOM
+    if data.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return data.decode('utf-16', errors='replace')
+    # gb18030 is a superset of gbk and gb2312
+    for encoding in ('utf-8-sig', 'gb18030', 'big5'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='ignore')
+
+
+def count_pdf_pages(source: ExtractionSource) -> int:
+    """Number of pages in a PDF (path or bytes)"""
+    import PyPDF2  # type: ignore
+    with _open_binary(source) as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def extract_pdf_pages(source: ExtractionSource, start: int = 0, end: Optional[int] = None) -> str:
+    """Extract text of pages [start, end) of a PDF (path or bytes)"""
+    import PyPDF2  # type: ignore
+    parts = []
+    with _open_binary(source) as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        pages = pdf_reader.pages
+        end = len(pages) if end is None else min(end, len(pages))
+        for index in range(start, end):
+            page_text = pages[index].extract_text() or ""
+            if page_text:
+                parts.append(page_text)
+    return "\n".join(parts)
+
+
+def extract_text_content_sync(source: ExtractionSource, mime_type: str) -> str:
+    """Synchronous extraction from a file path or in-memory bytes.
+
+    Module-level so it can run in a worker process.
+    """
+    label = source if isinstance(source, str) else f"<{len(source)} bytes>"
     try:
         if mime_type in ('text/plain', 'text/markdown'):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            with _open_binary(source) as f:
+                return _decode_text(f.read())
 
         elif mime_type == 'application/pdf':
-            text = ""
             try:
-                import PyPDF2  # type: ignore
+                import PyPDF2  # type: ignore  # noqa: F401
             except Exception as e:
                 logger.error(f"PyPDF2 not available for PDF extraction: {e}")
                 return ""
+            return extract_pdf_pages(source).strip()
 
-            with open(file_path, 'rb') as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text() or ""
-                    if page_text:
-                        text += page_text + "\n"
-            return text.strip()
-
-        elif mime_type in ('application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'):
-            if mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        elif mime_type in ('application/msword', DOCX_MIME_TYPE):
+            if mime_type == DOCX_MIME_TYPE:
                 # Prefer docx2txt for robust extraction
                 try:
                     import docx2txt  # type: ignore
-                    extracted = docx2txt.process(file_path) or ""
+                    with _open_binary(source) as f:
+                        extracted = docx2txt.process(f) or ""
                     if extracted.strip():
                         logger.info("Extracted DOCX content using docx2txt")
                         return extracted.strip()
                     else:
                         logger.info("docx2txt returned empty; falling back to python-docx")
+                except (ExtractionLimitExceeded, MemoryError):
+                    raise
                 except Exception as e:
                     logger.info(f"docx2txt not available or failed ({e}); falling back to python-docx")
 
                 # Fallback to python-docx
                 try:
                     from docx import Document as DocxDocument  # type: ignore
-                    doc = DocxDocument(file_path)
+                    with _open_binary(source) as f:
+                        doc = DocxDocument(f)
                     parts = []
                     for p in doc.paragraphs:
                         if p.text and p.text.strip():
@@ -337,6 +435,8 @@ async def extract_text_content(file_path: str, mime_type: str) -> str:
                                 if cell.text and cell.text.strip():
                                     parts.append(cell.text)
                     return "\n".join(parts).strip()
+                except (ExtractionLimitExceeded, MemoryError):
+                    raise
                 except Exception as e:
                     logger.error(f"python-docx failed to extract DOCX content: {e}")
                     return ""
@@ -345,10 +445,31 @@ async def extract_text_content(file_path: str, mime_type: str) -> str:
             logger.warning(f"Unsupported .doc format for direct extraction: {mime_type}")
             return ""
 
+        elif mime_type == XLSX_MIME_TYPE:
+            try:
+                from openpyxl import load_workbook  # type: ignore
+            except Exception as e:
+                logger.error(f"openpyxl not available for XLSX extraction: {e}")
+                return ""
+            with _open_binary(source) as f:
+                workbook = load_workbook(f, read_only=True, data_only=True)
+                parts = []
+                for sheet in workbook.worksheets:
+                    parts.append(f"# {sheet.title}")
+                    for row in sheet.iter_rows(values_only=True):
+                        cells = [str(c).strip() for c in row if c is not None and str(c).strip()]
+                        if cells:
+                            parts.append("\t".join(cells))
+                workbook.close()
+            return "\n".join(parts).strip()
+
         else:
             logger.warning(f"Unsupported file type: {mime_type}")
             return ""
 
+    except (ExtractionLimitExceeded, MemoryError):
+        # Resource caps must reach the extraction engine instead of looking like an empty file
+        raise
     except Exception as e:
-        logger.error(f"Error extracting text from {file_path}: {e}")
-        return ""
\ No newline at end of file
+        logger.error(f"Error extracting text from {label}: {e}")
+        return ""
@@ -0,0 +1,3 @@
+"""
+Retrieval quality and latency benchmarks for the RAG pipeline (see benchmarks/README.md)
+"""
@@ -0,0 +1,123 @@
+"""
+Deterministic synthetic HR corpus with labeled questions.
+
+Each policy template becomes one document whose chunks differ only in the entity they are
+about (department, city or job level) and in the numbers, so every labeled question has
+exactly one relevant chunk plus several near-duplicate distractors. ``scale`` adds filler
+documents of generic policy sentences to grow the collection for latency runs.
+"""
+import random
+import uuid
+from typing import Any, Dict, List, Tuple
+
+DEPARTMENTS = ["研发中心", "销售部", "市场部", "财务部", "人力资源部", "客服中心", "供应链部", "法务部"]
+CITIES = ["北京", "上海", "深圳", "杭州", "成都", "武汉", "西安", "南京"]
+LEVELS = ["P3", "P4", "P5", "P6", "P7", "M1", "M2", "M3"]
+
+# (document title, entities, chunk template, question template, value ranges)
+TEMPLATES: List[Tuple[str, List[str], str, str, Tuple[Tuple[int, int], Tuple[int, int]]]] = [
+    (
+        "员工休假管理制度.docx", LEVELS,
+        "{e}职级员工每年享有{a}天带薪年假，未休完的年假可顺延至次年{b}月底前使用。",
+        "{e}职级员工每年有几天带薪年假？",
+        ((5, 20), (3, 6)),
+    ),
+    (
+        "差旅费用报销办法.pdf", CITIES,
+        "员工出差至{e}，住宿费报销标准为每晚不超过{a}元，餐补为每天{b}元。",
+        "去{e}出差住宿费报销标准是多少？",
+        ((300, 900), (60, 150)),
+    ),
+    (
+        "加班与调休管理规定.docx", DEPARTMENTS,
+        "{e}员工工作日加班按小时工资的{a}%支付加班费，周末加班优先安排{b}天内调休。",
+        "{e}员工工作日加班费如何计算？",
+        ((150, 200), (7, 30)),
+    ),
+    (
+        "试用期管理办法.docx", LEVELS,
+        "{e}职级新员工试用期为{a}个月，试用期工资为转正工资的{b}%。",
+        "{e}职级新员工的试用期多长？",
+        ((1, 6), (80, 100)),
+    ),
+    (
+        "年终奖金发放方案.pdf", DEPARTMENTS,
+        "{e}年终奖根据绩效等级发放，绩效为A的员工可获得{a}个月工资的年终奖，发放时间为次年{b}月。",
+        "{e}绩效为A的员工年终奖有几个月？",
+        ((2, 6), (1, 3)),
+    ),
+    (
+        "住房补贴管理细则.docx", CITIES,
+        "在{e}工作的员工每月可领取{a}元住房补贴，入职满{b}个月后开始发放。",
+        "在{e}工作的员工住房补贴是多少？",
+        ((500, 3000), (1, 12)),
+    ),
+    (
+        "员工培训管理制度.docx", DEPARTMENTS,
+        "{e}每位员工每年须完成不少于{a}学时的专业培训，培训费用在{b}元以内由公司承担。",
+        "{e}员工每年需要完成多少学时培训？",
+        ((20, 80), (2000, 10000)),
+    ),
+    (
+        "离职管理规定.pdf", LEVELS,
+        "{e}职级员工主动离职需提前{a}天提交书面申请，并在{b}个工作日内完成工作交接。",
+        "{e}职级员工离职需要提前多少天申请？",
+        ((30, 90), (3, 15)),
+    ),
+]
+
+FILLER_SENTENCES = [
+    "公司坚持以人为本的管理理念，持续完善员工福利体系。",
+    "各部门负责人应当定期组织团队沟通会，及时了解员工诉求。",
+    "员工应遵守公司信息安全规定，不得私自外传内部资料。",
+    "绩效考核结果将作为晋升、调薪及培训安排的重要依据。",
+    "公司鼓励员工参与内部推荐，推荐成功可获得相应奖励。",
+    "办公区域禁止吸烟，请员工共同维护整洁舒适的工作环境。",
+    "员工个人信息发生变更时，应在五个工作日内通知人力资源部。",
+    "公司每年组织一次健康体检，体检费用由公司统一承担。",
+    "跨部门协作项目应明确责任人和交付时间，确保按期完成。",
+    "本制度由人力资源部负责解释，自发布之日起施行。",
+]
+
+_NAMESPACE = uuid.UUID("6f1d3c52-8a0e-4d2b-9b61-4c7e2f9a1b30")
+
+
+def benchmark_id(name: str) -> uuid.UUID:
+    """Stable UUID for benchmark users, knowledge bases and documents"""
+    return uuid.uuid5(_NAMESPACE, name)
+
+
+def build_corpus(scale: int = 0, seed: int = 42, chunks_per_filler: int = 20) -> Dict[str, Any]:
+    """
+    Returns {"documents": [{"id", "filename", "chunks": [str]}],
+             "questions": [{"question", "relevant": [(document_id, chunk_index)]}]}
+    """
+    rng = random.Random(seed)
+    documents: List[Dict[str, Any]] = []
+    questions: List[Dict[str, Any]] = []
+
+    for title, entities, chunk_template, question_template, ((a_low, a_high), (b_low, b_high)) in TEMPLATES:
+        document_id = str(benchmark_id(f"document:{title}"))
+        chunks = []
+        for chunk_index, entity in enumerate(entities):
+            chunks.append(chunk_template.format(
+                e=entity, a=rng.randint(a_low, a_high), b=rng.randint(b_low, b_high)
+            ))
+            questions.append({
+                "question": question_template.format(e=entity),
+                "relevant": [(document_id, chunk_index)]
+            })
+        documents.append({"id": document_id, "filename": title, "chunks": chunks})
+
+    for i in range(scale):
+        chunks = [
+            "".join(rng.sample(FILLER_SENTENCES, 3)) + f"（第{i + 1}号通知第{j + 1}条）"
+            for j in range(chunks_per_filler)
+        ]
+        documents.append({
+            "id": str(benchmark_id(f"filler:{i}")),
+            "filename": f"综合管理通知_{i + 1:04d}.docx",
+            "chunks": chunks
+        })
+
+    return {"documents": documents, "questions": questions}
@@ -0,0 +1,133 @@
+"""
+Deterministic stand-ins for the external model APIs.
+
+- ``HashingEmbeddings``: feature-hashed bag of search tokens, L2-normalized, so embeddings
+  are reproducible, cost no network round-trip and still rank lexically similar text close
+- ``StubLLMServer``: a local OpenAI-compatible /v1/chat/completions endpoint (plain and
+  streaming) with a fixed, configurable latency, so generation and query analysis time is
+  a known constant instead of provider noise
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.utils.text_utils import search_tokens
+
+ANSWER = "根据公司制度，相关规定已在参考资料中列出，请以最新发布的制度文件为准。"
+
+
+class HashingEmbeddings(Embeddings):
+    """Signed feature hashing of jieba search tokens into ``dimensions`` buckets"""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in search_tokens(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+def _stub_reply(messages: List[dict]) -> str:
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if "检索查询分析器" in system:
+        # Query analysis: keep the original question so retrieval quality is the retriever's
+        original = question.split("原始查询：", 1)[-1].split("\n", 1)[0].strip()
+        return json.dumps({"intent": "KB", "rewritten_query": original, "expanded_keywords": []}, ensure_ascii=False)
+    return ANSWER
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "StubLLM/1.0"
+
+    def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler signature
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.latency)
+        reply = _stub_reply(body.get("messages", []))
+        model = body.get("model", "stub")
+        created = int(time.time())
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for piece in [reply[i:i + 8] for i in range(0, len(reply), 8)] + [None]:
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": piece} if piece is not None else {},
+                        "finish_reason": None if piece is not None else "stop"
+                    }]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        payload = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubLLMServer:
+    """OpenAI-compatible chat server on 127.0.0.1 running in a daemon thread"""
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.latency = latency
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
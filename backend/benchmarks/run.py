@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality and latency benchmark for the RAG pipeline.
+
+Seeds the synthetic HR corpus (benchmarks/corpus.py) into the configured Postgres+pgvector
+database under a dedicated benchmark user, swaps the embedding API for a deterministic
+hashing embedder and the LLM for a local stub server, then:
+
+1. replays every labeled question once through RAGService.ask_question and
+   search_documents and reports recall@k, nDCG@k and MRR
+2. replays the questions at each concurrency level and reports throughput and
+   p50/p95/p99 per stage: query_analysis (intent + rewrite, one LLM call), vector,
+   tsvector/bm25, fusion, rerank, generation and total
+
+Example:
+    python benchmarks/run.py --concurrency 1,8,32 --output bench.json
+"""
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.utils.ranking_metrics import ndcg_at_k, recall_at_k, reciprocal_rank
+from benchmarks.corpus import benchmark_id, build_corpus
+from benchmarks.fakes import HashingEmbeddings, StubLLMServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGES = ("query_analysis", "vector", "text", "fusion", "rerank", "generation", "total")
+
+BENCH_USER_ID = benchmark_id("user")
+BENCH_KB_ID = benchmark_id("knowledge_base")
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Linearly interpolated percentile (p in 0-100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (position - low), 2)
+
+
+def configure(stub_url: str, args) -> None:
+    """Point the services at the fakes before any of them is created"""
+    settings.LLM_BASE_URL = stub_url
+    settings.LLM_API_KEY = "benchmark"
+    settings.EMBEDDING_API_KEY = settings.EMBEDDING_API_KEY or "benchmark"
+    # Caches would turn the repeated load passes into cache hits
+    settings.SEMANTIC_CACHE_ENABLED = False
+    settings.EMBEDDING_CACHE_ENABLED = False
+    settings.RAG_TEXT_ROUTE_ENGINE = args.text_engine
+    settings.RAG_BM25_INDEX_DIR = ""
+    if args.no_rerank:
+        settings.RERANK_ENABLED = False
+
+    from app.services.embedding_service import get_embedding_service
+    get_embedding_service().embeddings = HashingEmbeddings(settings.VECTOR_DIMENSION)
+
+
+class _TimedChain:
+    """Generation chain proxy recording how long ainvoke takes"""
+
+    def __init__(self, chain, stages: Dict[str, float]):
+        self._chain = chain
+        self._stages = stages
+
+    async def ainvoke(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._chain.ainvoke(*args, **kwargs)
+        finally:
+            self._stages["generation"] = (time.perf_counter() - started) * 1000
+
+
+class _TimedRerank:
+    """Rerank service proxy recording how long rerank_documents takes"""
+
+    def __init__(self, service, stages: Dict[str, float]):
+        self._service = service
+        self._stages = stages
+
+    def __getattr__(self, name):
+        return getattr(self._service, name)
+
+    async def rerank_documents(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._service.rerank_documents(*args, **kwargs)
+        finally:
+            self._stages["rerank"] = (time.perf_counter() - started) * 1000
+
+
+def instrument(rag, stages: Dict[str, float]) -> None:
+    """Wrap one RAGService instance's pipeline steps to record per-stage milliseconds"""
+    analyze_query = rag._analyze_query
+    run_retrieval_routes = rag._run_retrieval_routes
+    merge_docs_with_scores = rag._merge_docs_with_scores
+    create_rag_chain_with_docs = rag._create_rag_chain_with_docs
+
+    async def timed_analyze_query(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await analyze_query(*args, **kwargs)
+        finally:
+            stages["query_analysis"] = (time.perf_counter() - started) * 1000
+
+    async def timed_run_retrieval_routes(*args, **kwargs):
+        outcome = await run_retrieval_routes(*args, **kwargs)
+        if "content" in outcome.timings_ms:
+            stages["vector"] = outcome.timings_ms["content"]
+        if "text" in outcome.timings_ms:
+            stages["text"] = outcome.timings_ms["text"]
+        return outcome
+
+    async def timed_merge_docs_with_scores(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await merge_docs_with_scores(*args, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            stages["fusion"] = elapsed - stages.get("rerank", 0.0)
+
+    rag._analyze_query = timed_analyze_query
+    rag._run_retrieval_routes = timed_run_retrieval_routes
+    rag._merge_docs_with_scores = timed_merge_docs_with_scores
+    rag._create_rag_chain_with_docs = lambda *a, **kw: _TimedChain(create_rag_chain_with_docs(*a, **kw), stages)
+    rag.rerank_service = _TimedRerank(rag.rerank_service, stages)
+
+
+async def seed(corpus: Dict[str, Any]) -> str:
+    """Replace the benchmark collection's chunks with the corpus; returns the collection name"""
+    from sqlalchemy import text
+    from app.services.vector_store_registry import get_vector_store_registry
+
+    registry = get_vector_store_registry()
+    collection_name = f"document_chunks_{BENCH_USER_ID}".replace("-", "_")
+    await clear(collection_name)
+
+    embedder = HashingEmbeddings(settings.VECTOR_DIMENSION)
+    inserted = 0
+    for document in corpus["documents"]:
+        metadatas = [
+            {
+                "document_id": document["id"],
+                "knowledge_base_id": str(BENCH_KB_ID),
+                "chunk_index": chunk_index,
+                "filename": document["filename"],
+                "collection_name": collection_name,
+                "source_type": "benchmark"
+            }
+            for chunk_index in range(len(document["chunks"]))
+        ]
+        inserted += await registry.bulk_insert(
+            collection_name,
+            document["chunks"],
+            await embedder.aembed_documents(document["chunks"]),
+            metadatas
+        )
+    async with registry.get_engine().begin() as conn:
+        await conn.execute(text("ANALYZE langchain_pg_embedding"))
+    logger.info(f"🌱 Seeded {inserted} chunks from {len(corpus['documents'])} documents into {collection_name}")
+    return collection_name
+
+
+async def clear(collection_name: str) -> None:
+    from sqlalchemy import text
+    from app.services.vector_store_registry import get_vector_store_registry
+
+    async with get_vector_store_registry().get_engine().begin() as conn:
+        await conn.execute(
+            text("DELETE FROM langchain_pg_embedding WHERE cmetadata->>'collection_name' = :name"),
+            {"name": collection_name}
+        )
+
+
+async def wait_for_sparse_index(collection_name: str, timeout: float = 120.0) -> None:
+    """The BM25 route falls back to tsvector until its index is built; build it before measuring"""
+    from app.services.sparse_index import get_sparse_index_manager
+
+    manager = get_sparse_index_manager()
+    deadline = time.monotonic() + timeout
+    while manager.get_index(collection_name) is None:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"BM25 index for {collection_name} not ready after {timeout}s")
+        await asyncio.sleep(0.2)
+
+
+async def wait_for_rerank_model(timeout: float = 300.0) -> None:
+    from app.services.rerank_service import MODEL_LOADING, MODEL_NOT_LOADED, get_rerank_service
+
+    service = get_rerank_service()
+    service.start_loading()
+    deadline = time.monotonic() + timeout
+    while service.state in (MODEL_NOT_LOADED, MODEL_LOADING):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Rerank model not loaded after {timeout}s")
+        await asyncio.sleep(0.5)
+    logger.info(f"Rerank model state: {service.state}")
+
+
+async def ask(question: str, context_limit: int) -> Dict[str, Any]:
+    """One instrumented ask_question call on its own session, as an API request would run it"""
+    from app.services.rag_service import RAGService
+
+    stages: Dict[str, float] = {}
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        rag = RAGService(db)
+        instrument(rag, stages)
+        response = await rag.ask_question(question, BENCH_USER_ID, knowledge_base_id=BENCH_KB_ID, context_limit=context_limit)
+    stages["total"] = (time.perf_counter() - started) * 1000
+    return {"response": response, "stages": stages}
+
+
+async def evaluate_quality(questions: List[Dict[str, Any]], ks: List[int]) -> Dict[str, Any]:
+    """recall@k, nDCG@k and MRR for the full pipeline and for the plain vector search"""
+    from app.services.rag_service import RAGService
+
+    depth = max(ks)
+    totals: Dict[str, Dict[str, float]] = {"ask_question": {}, "search_documents": {}}
+    for i, item in enumerate(questions, start=1):
+        relevant = {(document_id, chunk_index) for document_id, chunk_index in item["relevant"]}
+        result = await ask(item["question"], depth)
+        ranked = {
+            "ask_question": [(str(s.get("document_id")), s.get("chunk_index")) for s in result["response"]["sources"]]
+        }
+        async with AsyncSessionLocal() as db:
+            hits = await RAGService(db).search_documents(
+                item["question"], BENCH_USER_ID, knowledge_base_id=BENCH_KB_ID, limit=depth, similarity_threshold=2.0
+            )
+        ranked["search_documents"] = [(str(h.get("document_id")), h.get("chunk_index")) for h in hits]
+
+        for pipeline, keys in ranked.items():
+            metrics = totals[pipeline]
+            for k in ks:
+                metrics[f"recall@{k}"] = metrics.get(f"recall@{k}", 0.0) + recall_at_k(keys, relevant, k)
+                metrics[f"ndcg@{k}"] = metrics.get(f"ndcg@{k}", 0.0) + ndcg_at_k(keys, relevant, k)
+            metrics["mrr"] = metrics.get("mrr", 0.0) + reciprocal_rank(keys, relevant, depth)
+        if i % 16 == 0:
+            logger.info(f"Quality pass: {i}/{len(questions)} questions")
+
+    count = max(len(questions), 1)
+    return {
+        pipeline: {name: round(value / count, 4) for name, value in metrics.items()}
+        for pipeline, metrics in totals.items()
+    }
+
+
+async def run_load(questions: List[Dict[str, Any]], concurrency: int, requests: int, context_limit: int) -> Dict[str, Any]:
+    """``requests`` questions (cycled) through ``concurrency`` concurrent users"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(questions[i % len(questions)]["question"])
+    samples: List[Dict[str, float]] = []
+    errors = 0
+
+    async def user():
+        nonlocal errors
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                samples.append((await ask(question, context_limit))["stages"])
+            except Exception as e:
+                errors += 1
+                logger.warning(f"Request failed: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stages = {}
+    for stage in STAGES:
+        values = [sample[stage] for sample in samples if stage in sample]
+        if values:
+            stages[stage] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99)
+            }
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "qps": round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages_ms": stages
+    }
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    from app.services.vector_store_registry import get_vector_store_registry
+
+    corpus = build_corpus(scale=args.scale, seed=args.seed)
+    questions = corpus["questions"]
+    ks = sorted({int(k) for k in args.k.split(",")})
+    levels = sorted({int(c) for c in args.concurrency.split(",")})
+
+    collection_name = await seed(corpus)
+    try:
+        if settings.RAG_TEXT_ROUTE_ENGINE == "bm25":
+            await wait_for_sparse_index(collection_name)
+        if settings.RERANK_ENABLED:
+            await wait_for_rerank_model()
+
+        quality = await evaluate_quality(questions, ks)
+        logger.info(f"📊 Quality: {json.dumps(quality, ensure_ascii=False)}")
+
+        load = []
+        for concurrency in levels:
+            result = await run_load(questions, concurrency, args.requests or len(questions), max(ks))
+            logger.info(
+                f"⏱️ concurrency={concurrency}: {result['qps']} req/s, "
+                f"total p50={result['stages_ms'].get('total', {}).get('p50')} ms"
+            )
+            load.append(result)
+    finally:
+        if not args.keep_data:
+            await clear(collection_name)
+        await get_vector_store_registry().close()
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "documents": len(corpus["documents"]),
+            "chunks": sum(len(d["chunks"]) for d in corpus["documents"]),
+            "questions": len(questions),
+            "scale": args.scale,
+            "seed": args.seed,
+            "llm_latency_ms": args.llm_latency_ms,
+            "text_engine": settings.RAG_TEXT_ROUTE_ENGINE,
+            "fusion_method": settings.RAG_FUSION_METHOD,
+            "fusion_weights": settings.RAG_FUSION_WEIGHTS,
+            "fusion_normalization": settings.RAG_FUSION_NORMALIZATION,
+            "route_candidates": settings.RAG_ROUTE_CANDIDATES,
+            "rerank_enabled": settings.RERANK_ENABLED,
+            "rerank_model": settings.RERANK_MODEL if settings.RERANK_ENABLED else None
+        },
+        "quality": quality,
+        "load": load
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\nRetrieval quality")
+    for pipeline, metrics in report["quality"].items():
+        print(f"  {pipeline:<18} " + "  ".join(f"{name}={value:.4f}" for name, value in metrics.items()))
+    print("\nLatency (ms)")
+    for result in report["load"]:
+        print(f"  concurrency={result['concurrency']}  {result['qps']} req/s  errors={result['errors']}")
+        for stage, summary in result["stages_ms"].items():
+            print(f"    {stage:<15} p50={summary['p50']:>9}  p95={summary['p95']:>9}  p99={summary['p99']:>9}")
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RAG retrieval quality and latency benchmark")
+    parser.add_argument("--k", default="1,3,5", help="Cut-offs for recall@k / nDCG@k (comma separated)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Concurrent users per load pass")
+    parser.add_argument("--requests", type=int, default=0, help="Requests per load pass (default: one per question)")
+    parser.add_argument("--scale", type=int, default=0, help="Filler documents (20 chunks each) added to the corpus")
+    parser.add_argument("--seed", type=int, default=42, help="Corpus random seed")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Stub LLM latency per call")
+    parser.add_argument("--text-engine", choices=["tsvector", "bm25"], default=settings.RAG_TEXT_ROUTE_ENGINE)
+    parser.add_argument("--no-rerank", action="store_true", help="Disable cross-encoder reranking")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the seeded chunks after the run")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    stub = StubLLMServer(latency=args.llm_latency_ms / 1000).start()
+    try:
+        configure(stub.base_url, args)
+        report = asyncio.run(run_benchmark(args))
+    except Exception as e:
+        logger.error(f"❌ Benchmark failed: {e}")
+        sys.exit(1)
+    finally:
+        stub.stop()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
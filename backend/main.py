@@ -13,6 +13,13 @@ from app.api.v1.api import api_router
 from app.core.middleware import setup_middleware
 from app.core.logging import setup_logging
 from app.core.exception_handlers import setup_exception_handlers
+from app.services.vector_store_registry import get_vector_store_registry
+from app.services.llm_clients import close_chat_models
+from app.services.dify_client import close_dify_client
+from app.services.ingestion_service import get_ingestion_worker
+from app.services.extraction_service import get_extraction_engine
+from app.core.security import get_password_hasher
+from app.services.rerank_service import get_rerank_service
 
 logger = logging.getLogger(__name__)
 
@@ -32,12 +39,34 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to initialize database: {e}")
         raise
     
+    try:
+        await get_vector_store_registry().warmup()
+    except Exception as e:
+        # Not fatal: the pool connects lazily on first use
+        logger.warning(f"Vector store pool warmup failed: {e}")
+    
+    try:
+        await get_ingestion_worker().start()
+    except Exception as e:
+        logger.error(f"Failed to start ingestion worker: {e}")
+    
+    if settings.RERANK_WARMUP_ON_STARTUP and get_rerank_service().start_loading():
+        # Does not block startup; retrieval skips rerank until the model is ready
+        logger.info("Rerank model loading in the background")
+    
     logger.info("HR Agent Backend started successfully")
     yield
     
     # Shutdown
     logger.info("Shutting down HR Agent Backend...")
     try:
+        await get_ingestion_worker().stop()
+        get_extraction_engine().shutdown()
+        get_password_hasher().shutdown()
+        get_rerank_service().shutdown()
+        await get_vector_store_registry().close()
+        await close_chat_models()
+        await close_dify_client()
         await close_db()
         logger.info("Database connections closed")
     except Exception as e:
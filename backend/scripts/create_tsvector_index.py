@@ -27,12 +27,9 @@ def load_database_url() -> str:
         db_url = db_url.replace("postgresql+asyncpg://", "postgresql://", 1)
     return db_url
 
+# Full-text search now uses the search_tsv column and its indexes
+# (scripts/manage_vector_indexes.py build / backfill-search)
 SQL_STATEMENTS = [
-    """
-    CREATE INDEX IF NOT EXISTS idx_lc_embedding_document_tsv
-      ON langchain_pg_embedding
-      USING GIN (to_tsvector('simple', document));
-    """,
     """
     CREATE INDEX IF NOT EXISTS idx_lc_embedding_cmetadata_gin
       ON langchain_pg_embedding
@@ -46,7 +43,7 @@ def main():
     with engine.begin() as conn:
         for sql in SQL_STATEMENTS:
             conn.execute(text(sql))
-    print("TSVector and JSONB indices ensured on langchain_pg_embedding")
+    print("JSONB index ensured on langchain_pg_embedding")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
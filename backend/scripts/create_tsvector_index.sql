@@ -1,8 +1,5 @@
--- Create GIN index for full-text search on langchain_pg_embedding.document
--- Uses 'simple' configuration to avoid language-specific dependencies
-CREATE INDEX IF NOT EXISTS idx_lc_embedding_document_tsv
-  ON langchain_pg_embedding
-  USING GIN (to_tsvector('simple', document));
+-- Full-text search uses the search_tsv column (jieba-segmented at insert time) and its
+-- GIN / pg_trgm indexes, managed by scripts/manage_vector_indexes.py build / backfill-search
 
 -- Optional: JSONB index to accelerate metadata filtering by knowledge_base_id
 CREATE INDEX IF NOT EXISTS idx_lc_embedding_cmetadata_gin
@@ -10,5 +7,5 @@ CREATE INDEX IF NOT EXISTS idx_lc_embedding_cmetadata_gin
   USING GIN (cmetadata);
 
 -- Note:
--- For Chinese segmentation, consider installing zhparser or pg_jieba and
--- switching to to_tsvector('zhparser', document). This requires DB extensions.
\ No newline at end of file
+-- Chinese segmentation happens in the application (jieba), so no zhparser / pg_jieba
+-- extension is required.
\ No newline at end of file
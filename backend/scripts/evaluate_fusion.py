@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of retrieval fusion methods.
+
+Replays a labeled query set through the content (vector) and text (tsvector/BM25) routes once,
+then fuses the recorded route results with every fusion method, normalization, weight set and
+per-route candidate count, and reports recall@k and MRR for each combination. Use it to pick
+RAG_FUSION_* / RAG_ROUTE_CANDIDATES (or a knowledge base's meta_data["retrieval"]) and to see
+how few candidates reach the same quality, which is what the reranker pays for.
+
+Query set (JSON Lines, one query per line):
+    {"question": "年假有几天？", "user_id": "<uuid>", "knowledge_base_id": "<uuid, optional>",
+     "relevant": [{"document_id": "<uuid>", "chunk_index": 3}, {"document_id": "<uuid>"}]}
+A relevant entry without chunk_index matches any chunk of that document.
+
+Example:
+    python scripts/evaluate_fusion.py queries.jsonl --candidates 5,10,20 --weights 0.7,0.3 0.5,0.5
+"""
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.fusion import FUSION_METHODS, NORMALIZATIONS, FusionConfig, fuse
+from app.services.rag_service import RAGService
+from app.utils.ranking_metrics import recall_at_k, reciprocal_rank
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ChunkKey = Tuple[Optional[str], Any]
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            query = json.loads(line)
+            if not query.get("question") or not query.get("user_id") or not query.get("relevant"):
+                raise ValueError(f"line {line_number}: question, user_id and relevant are required")
+            queries.append(query)
+    return queries
+
+
+def relevant_keys(query: Dict[str, Any]) -> set:
+    return {(str(item["document_id"]), item.get("chunk_index")) for item in query["relevant"]}
+
+
+def label(ranked: List[ChunkKey], relevant: set) -> List[ChunkKey]:
+    """Map chunk keys onto the relevance labels (document-level labels match any chunk)"""
+    return [key if key in relevant else (key[0], None) for key in ranked]
+
+
+async def collect_routes(queries: List[Dict[str, Any]], max_candidates: int, rewrite: bool) -> List[Dict[str, Any]]:
+    """Run both retrieval routes once per query; keeps (chunk key, score) lists per route"""
+    recorded = []
+    async with AsyncSessionLocal() as db:
+        rag = RAGService(db)
+        for i, query in enumerate(queries, start=1):
+            question = query["question"]
+            rewritten, keywords = question, []
+            if rewrite:
+                analysis = await rag._analyze_query(question)
+                rewritten, keywords = analysis["rewritten_query"], analysis["expanded_keywords"]
+            kb_id = query.get("knowledge_base_id")
+            outcome = await rag._run_retrieval_routes(
+                question,
+                rewritten,
+                keywords,
+                UUID(query["user_id"]),
+                knowledge_base_id=UUID(kb_id) if kb_id else None,
+                k=max_candidates
+            )
+            routes = [
+                [((doc.metadata.get("document_id"), doc.metadata.get("chunk_index")), score)
+                 for doc, score in outcome.get(name)]
+                for name in ("content", "text")
+            ]
+            recorded.append({"query": query, "routes": routes, "timings": outcome.to_dict()})
+            logger.info(f"[{i}/{len(queries)}] {question[:40]}: "
+                        f"{len(routes[0])} content / {len(routes[1])} text hits")
+    return recorded
+
+
+def evaluate(
+    recorded: List[Dict[str, Any]],
+    configs: List[Tuple[str, Optional[FusionConfig]]],
+    candidates: List[int],
+    ks: List[int]
+) -> List[Dict[str, Any]]:
+    rows = []
+    for name, config in configs:
+        for candidate_count in candidates:
+            totals = {f"recall@{k}": 0.0 for k in ks}
+            totals["mrr"] = 0.0
+            for item in recorded:
+                relevant = relevant_keys(item["query"])
+                routes = [route[:candidate_count] for route in item["routes"]]
+                if config is None:
+                    # Single-route baseline
+                    ranked = [key for key, _ in routes[0 if name == "content only" else 1]]
+                else:
+                    ranked = [key for key, _, _ in fuse(routes, config)]
+                labels = label(ranked, relevant)
+                for k in ks:
+                    totals[f"recall@{k}"] += recall_at_k(labels, relevant, k)
+                totals["mrr"] += reciprocal_rank(labels, relevant, max(ks))
+            count = max(len(recorded), 1)
+            rows.append({
+                "config": name,
+                "candidates": candidate_count,
+                **{metric: round(value / count, 4) for metric, value in totals.items()}
+            })
+    return rows
+
+
+def build_configs(methods: List[str], normalizations: List[str], weight_sets: List[str]) -> List[Tuple[str, Optional[FusionConfig]]]:
+    configs: List[Tuple[str, Optional[FusionConfig]]] = [("content only", None), ("text only", None)]
+    for method in methods:
+        for weights in weight_sets:
+            parsed = [float(w) for w in weights.split(",")]
+            for normalization in (["none"] if method == "rrf" else normalizations):
+                config = FusionConfig(method, parsed, settings.RAG_FUSION_RRF_K, normalization)
+                suffix = "" if method == "rrf" else f"/{normalization}"
+                configs.append((f"{method}{suffix} w={weights}", config))
+    return configs
+
+
+def print_report(rows: List[Dict[str, Any]], ks: List[int]) -> None:
+    metrics = [f"recall@{k}" for k in ks] + ["mrr"]
+    header = f"{'config':<36} {'cand':>5} " + " ".join(f"{m:>10}" for m in metrics)
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['config']:<36} {row['candidates']:>5} " + " ".join(f"{row[m]:>10.4f}" for m in metrics))
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate retrieval fusion methods on a labeled query set")
+    parser.add_argument("queries", help="JSON Lines query set")
+    parser.add_argument("--k", default="1,3,5,10", help="Cut-offs for recall@k (comma separated)")
+    parser.add_argument("--candidates", default="5,10,20", help="Per-route candidate counts to compare")
+    parser.add_argument("--methods", default=",".join(FUSION_METHODS), help="Fusion methods to compare")
+    parser.add_argument("--normalizations", default="minmax,zscore", help=f"Any of {','.join(NORMALIZATIONS)}")
+    parser.add_argument("--weights", nargs="+", default=[settings.RAG_FUSION_WEIGHTS],
+                        help="content,text weight sets, e.g. 0.7,0.3 0.5,0.5")
+    parser.add_argument("--rewrite", action="store_true", help="Rewrite queries with the LLM analyzer first")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        ks = sorted({int(k) for k in args.k.split(",")})
+        candidates = sorted({int(c) for c in args.candidates.split(",")})
+        configs = build_configs(
+            [m.strip() for m in args.methods.split(",")],
+            [n.strip() for n in args.normalizations.split(",")],
+            args.weights
+        )
+        queries = load_queries(args.queries)
+        recorded = asyncio.run(collect_routes(queries, max(candidates), args.rewrite))
+        rows = evaluate(recorded, configs, candidates, ks)
+    except Exception as e:
+        logger.error(f"❌ Evaluation failed: {e}")
+        sys.exit(1)
+
+    print_report(rows, ks)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"queries": len(recorded), "results": rows}, f, ensure_ascii=False, indent=2)
+        logger.info(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Manage the ANN, metadata and full-text indexes on langchain_pg_embedding.
+
+Commands (all index DDL runs CONCURRENTLY, so searches and inserts keep working):
+- status     List managed indexes, their size/validity and the largest collections
+- build      Create missing metadata indexes, the search_tsv schema and the global ANN index
+- rebuild    REINDEX managed indexes (or one with --index) after bulk loads or parameter changes
+- partition  Create per-collection partial ANN indexes for large collections and drop stale ones
+- backfill-search  Fill the jieba-segmented search_tsv column for existing rows (--all re-segments every row)
+
+Index parameters come from the VECTOR_INDEX_* / VECTOR_HNSW_* / VECTOR_IVFFLAT_* settings.
+Changing the method or HNSW build parameters requires `rebuild --recreate`.
+"""
+import logging
+import re
+import sys
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import create_engine, text
+
+from app.core.config import settings
+from app.services.vector_index import (
+    INDEX_PREFIX,
+    PARTITION_INDEX_PREFIX,
+    backfill_search_column,
+    collection_sizes,
+    ensure_indexes,
+    ensure_search_schema,
+    existing_indexes,
+    get_pgvector_version,
+    has_search_column,
+    sync_partitions,
+    table_exists,
+    unsegmented_rows,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def get_sync_url() -> str:
+    url = settings.DATABASE_URL
+    for prefix in ("postgresql+asyncpg://", "postgresql+psycopg://"):
+        if url.startswith(prefix):
+            return "postgresql://" + url[len(prefix):]
+    return url
+
+
+def status(conn) -> None:
+    version = get_pgvector_version(conn)
+    logger.info(f"pgvector {'.'.join(map(str, version)) or '(not installed)'}, "
+                f"VECTOR_DIMENSION={settings.VECTOR_DIMENSION}, method={settings.VECTOR_INDEX_METHOD}")
+    for name, info in sorted(existing_indexes(conn).items()):
+        state = "valid" if info["valid"] else "INVALID"
+        logger.info(f"  {name}: {state}, {info['bytes'] / 1024 / 1024:.1f} MB")
+    if has_search_column(conn):
+        missing = unsegmented_rows(conn)
+        if missing:
+            logger.warning(f"  {missing} chunks have no search_tsv; run backfill-search")
+    for collection_id, name, rows in collection_sizes(conn)[:20]:
+        logger.info(f"  collection {name} ({collection_id}): {rows} chunks")
+
+
+def is_ann_index(name: str) -> bool:
+    return name.startswith((f"{INDEX_PREFIX}embedding_", PARTITION_INDEX_PREFIX))
+
+
+def rebuild(conn, index: str = None, recreate: bool = False) -> None:
+    names = [index] if index else sorted(existing_indexes(conn))
+    if recreate:
+        # Parameters (method, m, ef_construction, lists) only change by building a new ANN index
+        for name in filter(is_ann_index, names):
+            logger.info(f"Dropping {name}")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        ensure_indexes(conn)
+        sync_partitions(conn)
+        return
+    for name in names:
+        logger.info(f"Reindexing {name}")
+        conn.execute(text(f"REINDEX INDEX CONCURRENTLY {name}"))
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="langchain_pg_embedding index management")
+    parser.add_argument("command", choices=["status", "build", "rebuild", "partition", "backfill-search"], help="Command to execute")
+    parser.add_argument("--no-ann", action="store_true", help="build: skip the global ANN index")
+    parser.add_argument("--index", help="rebuild: a single index name")
+    parser.add_argument("--recreate", action="store_true", help="rebuild: drop and create with current settings")
+    parser.add_argument("--min-rows", type=int, default=None,
+                        help="partition: row threshold (default VECTOR_PARTITION_MIN_ROWS)")
+    parser.add_argument("--all", action="store_true", help="backfill-search: re-segment rows that already have search_tsv")
+    args = parser.parse_args()
+
+    engine = create_engine(get_sync_url(), isolation_level="AUTOCOMMIT")
+    try:
+        with engine.connect() as conn:
+            if not table_exists(conn):
+                logger.error("langchain_pg_embedding does not exist yet (created on first document upload)")
+                sys.exit(1)
+            if args.command == "status":
+                status(conn)
+            elif args.command == "build":
+                for name in ensure_indexes(conn, with_ann=not args.no_ann) + ensure_search_schema(conn):
+                    logger.info(f"✅ {name}")
+            elif args.command == "rebuild":
+                if args.index and not re.match(rf"^{INDEX_PREFIX}[a-z0-9_]+$", args.index):
+                    logger.error("Only idx_lc_embedding_* indexes are managed by this script")
+                    sys.exit(1)
+                rebuild(conn, args.index, args.recreate)
+            elif args.command == "partition":
+                result = sync_partitions(conn, args.min_rows)
+                for name in result["ensured"]:
+                    logger.info(f"✅ {name}")
+                for name in result["dropped"]:
+                    logger.info(f"🗑️ {name}")
+                if not result["ensured"]:
+                    logger.info("No collection is large enough for its own index")
+            elif args.command == "backfill-search":
+                if not has_search_column(conn):
+                    logger.error("search_tsv column missing; run `alembic upgrade head` or the build command first")
+                    sys.exit(1)
+                updated = backfill_search_column(conn, all_rows=args.all)
+                logger.info(f"✅ search_tsv filled for {updated} rows")
+    except Exception as e:
+        logger.error(f"❌ Command failed: {e}")
+        sys.exit(1)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Circuit breaker behaviour of the shared Dify client"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services.dify_client import CircuitBreaker, DifyClient
+
+
+async def _hang(*args, **kwargs):
+    await asyncio.Event().wait()
+
+
+@asynccontextmanager
+async def _hanging_stream(*args, **kwargs):
+    await asyncio.Event().wait()
+    yield
+
+
+def _half_open_client() -> DifyClient:
+    client = DifyClient()
+    client.breaker.state = CircuitBreaker.OPEN
+    client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout - 1
+    return client
+
+
+def test_release_frees_probe_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_blocking_probe_is_released(monkeypatch):
+    client = _half_open_client()
+    monkeypatch.setattr(client._client, "post", _hang)
+    task = asyncio.create_task(client.post_blocking(6, {}, retry=False))
+    await asyncio.sleep(0)
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert not client.breaker.allow()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert client.in_flight == 0
+    assert client.breaker.allow()
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stream_probe_is_released(monkeypatch):
+    client = _half_open_client()
+    monkeypatch.setattr(client._client, "stream", _hanging_stream)
+
+    async def consume():
+        async with client.stream(6, {}):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    assert not client.breaker.allow()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert client.breaker.allow()
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_closed_call_keeps_probe_taken(monkeypatch):
+    client = DifyClient()
+    monkeypatch.setattr(client._client, "post", _hang)
+    task = asyncio.create_task(client.post_blocking(6, {}, retry=False))
+    await asyncio.sleep(0)
+
+    # The breaker opens and admits a probe while the older call is still in flight
+    client.breaker.record_failure()
+    client.breaker.state = CircuitBreaker.OPEN
+    client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout - 1
+    assert client.breaker.allow()
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not client.breaker.allow()
+    await client.aclose()
@@ -0,0 +1,43 @@
+"""Streaming upload storage"""
+import io
+from pathlib import Path
+
+from app.utils.file_utils import _AtomicFileWriter, store_file_object
+
+
+def test_same_name_uploads_never_overwrite(tmp_path):
+    first = store_file_object(io.BytesIO(b"first"), tmp_path, "resume.pdf")
+    second = store_file_object(io.BytesIO(b"second"), tmp_path, "resume.pdf")
+    assert first.path != second.path
+    assert Path(first.path).read_bytes() == b"first"
+    assert Path(second.path).read_bytes() == b"second"
+    assert not list(tmp_path.glob(".*.part"))
+
+
+def test_name_taken_after_check_is_skipped(tmp_path, monkeypatch):
+    writer = _AtomicFileWriter(tmp_path, "resume.pdf", None)
+    writer.write(b"mine")
+
+    # Another upload claims the free name between the existence check and the link
+    import app.utils.file_utils as file_utils
+    original = file_utils.get_unique_filename
+    raced = []
+
+    def racing_unique_filename(directory, filename):
+        name = original(directory, filename)
+        if not raced:
+            raced.append(name)
+            (directory / name).write_bytes(b"theirs")
+        return name
+
+    monkeypatch.setattr(file_utils, "get_unique_filename", racing_unique_filename)
+    stored = writer.commit()
+    assert Path(stored.path).read_bytes() == b"mine"
+    assert (tmp_path / "resume.pdf").read_bytes() == b"theirs"
+
+
+def test_discard_is_idempotent(tmp_path):
+    stored = store_file_object(io.BytesIO(b"data"), tmp_path, "a.txt")
+    stored.discard()
+    stored.discard()
+    assert not Path(stored.path).exists()
@@ -0,0 +1,28 @@
+"""Plain-text decoding used by the extraction workers"""
+from app.utils.text_utils import _decode_text
+
+SAMPLE = "公司薪资、合同、加班和员工福利制度"
+
+
+def test_decodes_gbk():
+    assert _decode_text(SAMPLE.encode("gbk")) == SAMPLE
+
+
+def test_decodes_gb18030():
+    assert _decode_text(SAMPLE.encode("gb18030")) == SAMPLE
+
+
+def test_decodes_utf8_with_and_without_bom():
+    assert _decode_text(SAMPLE.encode("utf-8")) == SAMPLE
+    assert _decode_text(SAMPLE.encode("utf-8-sig")) == SAMPLE
+
+
+def test_decodes_utf16_with_bom():
+    assert _decode_text(SAMPLE.encode("utf-16")) == SAMPLE
+    assert _decode_text(b"\xfe\xff" + SAMPLE.encode("utf-16-be")) == SAMPLE
+
+
+def test_even_length_gbk_is_not_read_as_utf16():
+    data = "公司".encode("gbk")
+    assert len(data) % 2 == 0
+    assert _decode_text(data) == "公司"